@@ -12,4 +12,7 @@ pip install -r requirements.txt
 python manage.py collectstatic --no-input
 
 # Apply any outstanding database migrations
-python manage.py migrate
\ No newline at end of file
+python manage.py migrate
+
+# Backfill the spending rollups and repair any drift (a no-op when they already match)
+python manage.py rebuild_rollups
\ No newline at end of file
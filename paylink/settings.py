@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     
     # Third party apps
     'rest_framework',
+    'adrf',
     'corsheaders',
     'rest_framework_simplejwt',
     'drf_spectacular',
@@ -165,14 +166,26 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # simplejwt's JWTAuthentication, loading the user's wallet instead of the full profile
+        'users.authentication.WalletJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson in place of DRF's JSON renderer and parser; Decimals render as strings ("1000.00")
+    'DEFAULT_RENDERER_CLASSES': ['users.renderers.ORJSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': [
+        'users.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# The browsable API is for development only; production answers JSON
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('rest_framework.renderers.BrowsableAPIRenderer')
+
 # Spectacular settings
 SPECTACULAR_SETTINGS = {
     'TITLE': 'PayLink API',
@@ -188,6 +201,24 @@ SPECTACULAR_SETTINGS = {
     'SCHEMA_PATH_PREFIX': '/api/',
 }
 
+# Cache settings
+# Use Redis when REDIS_URL is set so cached data is shared across workers,
+# otherwise fall back to a per-process in-memory cache
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -233,3 +264,135 @@ VTPASS_API_KEY = os.environ.get('VTPASS_API_KEY')
 VTPASS_PUBLIC_KEY = os.environ.get('VTPASS_PUBLIC_KEY')
 VTPASS_SECRET_KEY = os.environ.get('VTPASS_SECRET_KEY')
 VTPASS_BASE_URL = os.environ.get('VTPASS_BASE_URL', 'https://sandbox.vtpass.com/api')  # Default to sandbox URL
+
+
+# VTPass HTTP transport: a pooled keep-alive session per worker process
+VTPASS_POOL_CONNECTIONS = int(os.environ.get('VTPASS_POOL_CONNECTIONS', '4'))  # Number of host pools to cache
+VTPASS_POOL_MAXSIZE = int(os.environ.get('VTPASS_POOL_MAXSIZE', '20'))  # Max keep-alive connections per host
+VTPASS_CONNECT_TIMEOUT = float(os.environ.get('VTPASS_CONNECT_TIMEOUT', '3.05'))  # Seconds to establish a connection
+VTPASS_READ_TIMEOUT = float(os.environ.get('VTPASS_READ_TIMEOUT', '30'))  # Seconds to wait for a VTPass response
+VTPASS_PREWARM_CONNECTIONS = int(os.environ.get('VTPASS_PREWARM_CONNECTIONS', '0'))  # Connections to open when a worker boots
+VTPASS_ASYNC_MAX_CONNECTIONS = int(os.environ.get('VTPASS_ASYNC_MAX_CONNECTIONS', '200'))  # Max concurrent connections for the async client
+
+# VTPass service catalog cache (service listings and variations)
+VTPASS_CATALOG_TTL = int(os.environ.get('VTPASS_CATALOG_TTL', '900'))  # Seconds an entry is served as fresh
+VTPASS_CATALOG_STALE_TTL = int(os.environ.get('VTPASS_CATALOG_STALE_TTL', '86400'))  # Seconds a stale entry may be served while refreshing
+VTPASS_CATALOG_REFRESH_LOCK_TTL = int(os.environ.get('VTPASS_CATALOG_REFRESH_LOCK_TTL', '30'))  # Max seconds one background refresh may hold its lock
+catalog_warmup_str = os.environ.get('VTPASS_CATALOG_WARMUP', '')
+VTPASS_CATALOG_WARMUP = catalog_warmup_str.split(',') if catalog_warmup_str else []  # Service types to load when a worker boots
+
+# VTPass platform balance snapshot
+VTPASS_BALANCE_TTL = int(os.environ.get('VTPASS_BALANCE_TTL', '15'))  # Seconds a balance snapshot is reused
+VTPASS_BALANCE_LOCK_TTL = int(os.environ.get('VTPASS_BALANCE_LOCK_TTL', '10'))  # Max seconds callers wait on another worker's fetch
+
+# Background retries for VTPass code 016 purchase failures
+VTPASS_RETRY_MAX_RETRIES = int(os.environ.get('VTPASS_RETRY_MAX_RETRIES', '2'))  # Retries after the first attempt
+VTPASS_RETRY_BASE_DELAY = float(os.environ.get('VTPASS_RETRY_BASE_DELAY', '2'))  # Backoff base in seconds
+VTPASS_RETRY_MAX_DELAY = float(os.environ.get('VTPASS_RETRY_MAX_DELAY', '60'))  # Backoff cap in seconds
+
+# VTPass circuit breakers and adaptive concurrency limits (per endpoint and per serviceID)
+VTPASS_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('VTPASS_BREAKER_FAILURE_THRESHOLD', '5'))  # Consecutive failures that open a breaker
+VTPASS_BREAKER_RESET_TIMEOUT = float(os.environ.get('VTPASS_BREAKER_RESET_TIMEOUT', '30'))  # Seconds a breaker stays open before probing
+VTPASS_CONCURRENCY_INITIAL = int(os.environ.get('VTPASS_CONCURRENCY_INITIAL', '20'))  # Starting in-flight call limit
+VTPASS_CONCURRENCY_MIN = int(os.environ.get('VTPASS_CONCURRENCY_MIN', '2'))  # Floor for the in-flight call limit
+VTPASS_CONCURRENCY_MAX = int(os.environ.get('VTPASS_CONCURRENCY_MAX', '200'))  # Ceiling for the in-flight call limit
+VTPASS_CONCURRENCY_SLOW_CALL = float(os.environ.get('VTPASS_CONCURRENCY_SLOW_CALL', '10'))  # Calls slower than this shrink the limit
+
+# Logging: records are formatted and written on a background thread.
+# VTPass request/response bodies go to the 'users.vtpass.payloads' logger,
+# redacted and sampled per level (e.g. "DEBUG=0.01,INFO=0.05"; unlisted levels are always kept)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')  # Level for the app's own loggers
+payload_sample_rates_str = os.environ.get('VTPASS_PAYLOAD_SAMPLE_RATES', 'DEBUG=0.01,INFO=0.05')
+VTPASS_PAYLOAD_SAMPLE_RATES = dict(
+    item.split('=') for item in payload_sample_rates_str.split(',') if '=' in item
+)  # Share of payload records kept per level
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '{asctime} {levelname} {name} {message}',
+            'style': '{',
+        },
+    },
+    'filters': {
+        'payload_sampler': {
+            '()': 'users.vtpass_logging.PayloadSampler',
+            'rates': VTPASS_PAYLOAD_SAMPLE_RATES,
+        },
+    },
+    'handlers': {
+        'queued_console': {
+            '()': 'users.vtpass_logging.QueuedStreamHandler',
+            'formatter': 'verbose',
+        },
+    },
+    'root': {
+        'handlers': ['queued_console'],
+        'level': 'WARNING',
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['queued_console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'users': {
+            'handlers': ['queued_console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'users.vtpass.payloads': {
+            'handlers': ['queued_console'],
+            'level': LOG_LEVEL,
+            'filters': ['payload_sampler'],
+            'propagate': False,
+        },
+    },
+}
+
+# Background tasks stored in the database and run by `manage.py run_tasks`
+TASK_CONCURRENCY = int(os.environ.get('TASK_CONCURRENCY', '8'))  # Tasks run at once per worker process
+TASK_BATCH_SIZE = int(os.environ.get('TASK_BATCH_SIZE', '20'))  # Max tasks claimed per poll
+TASK_POLL_INTERVAL = float(os.environ.get('TASK_POLL_INTERVAL', '1'))  # Seconds between polls when idle
+TASK_VISIBILITY_TIMEOUT = int(os.environ.get('TASK_VISIBILITY_TIMEOUT', '120'))  # Seconds before a running task may be claimed again
+TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', '5'))  # Claims before a failing task is marked failed
+TASK_RETRY_BASE_DELAY = float(os.environ.get('TASK_RETRY_BASE_DELAY', '2'))  # Backoff base in seconds for failing tasks
+TASK_RETRY_MAX_DELAY = float(os.environ.get('TASK_RETRY_MAX_DELAY', '300'))  # Backoff cap in seconds for failing tasks
+TASK_RETENTION_DAYS = int(os.environ.get('TASK_RETENTION_DAYS', '7'))  # Days finished tasks are kept
+
+# Reconciler for pending VTPass transactions (`manage.py reconcile_transactions`)
+VTPASS_RECONCILE_MIN_AGE = int(os.environ.get('VTPASS_RECONCILE_MIN_AGE', '60'))  # Seconds before a pending transaction is requeried
+VTPASS_RECONCILE_RECHECK_INTERVAL = int(os.environ.get('VTPASS_RECONCILE_RECHECK_INTERVAL', '120'))  # Seconds between requeries of one transaction (its lease)
+VTPASS_RECONCILE_BATCH_SIZE = int(os.environ.get('VTPASS_RECONCILE_BATCH_SIZE', '100'))  # Transactions leased per batch
+VTPASS_RECONCILE_CONCURRENCY = int(os.environ.get('VTPASS_RECONCILE_CONCURRENCY', '5'))  # Concurrent requeries
+VTPASS_RECONCILE_RATE_LIMIT = float(os.environ.get('VTPASS_RECONCILE_RATE_LIMIT', '5'))  # Max requeries per second per reconciler
+VTPASS_RECONCILE_INTERVAL = float(os.environ.get('VTPASS_RECONCILE_INTERVAL', '30'))  # Seconds between passes when looping
+VTPASS_RECONCILE_GIVE_UP_AFTER = int(os.environ.get('VTPASS_RECONCILE_GIVE_UP_AFTER', '86400'))  # Seconds after which a pending purchase VTPass doesn't know is failed
+
+# Transaction status reads: terminal rows are served locally, pending ones requeried at most this often
+VTPASS_STATUS_REQUERY_AGE = int(os.environ.get('VTPASS_STATUS_REQUERY_AGE', '30'))  # Seconds before a status read may requery a pending transaction again
+
+# VTPass transaction-update callbacks (webhook)
+VTPASS_WEBHOOK_SECRET = os.environ.get('VTPASS_WEBHOOK_SECRET')  # Shared secret for the X-VTPass-Signature HMAC; callbacks are rejected when unset
+VTPASS_WEBHOOK_BATCH_SIZE = int(os.environ.get('VTPASS_WEBHOOK_BATCH_SIZE', '200'))  # Callbacks applied per batch
+VTPASS_WEBHOOK_BATCH_DELAY = float(os.environ.get('VTPASS_WEBHOOK_BATCH_DELAY', '1'))  # Seconds callbacks are collected before a batch is applied
+
+# Transaction status stream (SSE) and long-poll
+TRANSACTION_EVENTS_POLL_INTERVAL = float(os.environ.get('TRANSACTION_EVENTS_POLL_INTERVAL', '0.5'))  # Seconds between checks of a user's change version in the cache
+TRANSACTION_EVENTS_RECHECK_INTERVAL = float(os.environ.get('TRANSACTION_EVENTS_RECHECK_INTERVAL', '5'))  # Seconds between database checks when the cache shows no change (safety net for per-process caches)
+TRANSACTION_EVENTS_OVERLAP = float(os.environ.get('TRANSACTION_EVENTS_OVERLAP', '15'))  # Seconds re-read behind the newest change sent, for changes that commit after later-stamped ones; keep above the longest write transaction
+TRANSACTION_EVENTS_HEARTBEAT = float(os.environ.get('TRANSACTION_EVENTS_HEARTBEAT', '15'))  # Seconds between keep-alive comments on an idle stream
+TRANSACTION_EVENTS_STREAM_MAX_AGE = int(os.environ.get('TRANSACTION_EVENTS_STREAM_MAX_AGE', '300'))  # Seconds before a stream is closed so the client reconnects with Last-Event-ID
+TRANSACTION_EVENTS_LONG_POLL_TIMEOUT = float(os.environ.get('TRANSACTION_EVENTS_LONG_POLL_TIMEOUT', '25'))  # Longest a long-poll request is held without changes
+
+# Idempotency-Key support for purchases and wallet funding
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', '86400'))  # Seconds a key and its stored response are kept
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', '30'))  # Seconds a duplicate waits (async views) for the first request to finish before getting 409
+IDEMPOTENCY_SYNC_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_SYNC_WAIT_TIMEOUT', '3'))  # The same wait on sync views, where it ties up a worker
+IDEMPOTENCY_LEASE_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LEASE_TIMEOUT', '120'))  # Seconds a request may hold its key before a retry takes it over; keep above the longest request
+
+# Wallet ledger snapshots
+LEDGER_SNAPSHOT_LAG = int(os.environ.get('LEDGER_SNAPSHOT_LAG', '60'))  # Seconds an entry must be old before a snapshot covers it, so in-flight transactions can commit
+LEDGER_SNAPSHOT_INTERVAL = int(os.environ.get('LEDGER_SNAPSHOT_INTERVAL', '3600'))  # Seconds between snapshot passes of `snapshot_ledger`
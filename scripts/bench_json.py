@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Benchmark the API's JSON renderer and parser against DRF's.
+
+Renders payloads shaped like real responses (a /transactions/ page, the
+/dashboard/stats/ body and a transaction with its VTPass response), checks
+that both renderers produce the same JSON, and reports the time per
+render and parse.
+
+Run from the repository root (needs only settings, no database):
+    DEBUG=1 SECRET_KEY=x python scripts/bench_json.py --rows 100 --repeat 2000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'paylink.settings')
+import django
+django.setup()
+
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+from users.ids import new_request_id, uuid7
+from users.parsers import ORJSONParser
+from users.renderers import ORJSONRenderer, money
+from users.serializers import TransactionListSerializer
+
+SERVICES = {'mtn': 'airtime', 'glo': 'airtime', 'mtn-data': 'data', 'dstv': 'tv', 'ikeja-electric': 'electricity'}
+
+# A successful VTPass purchase response, as stored in response_data
+VTPASS_RESPONSE = {
+    'code': '000',
+    'content': {'transactions': {
+        'status': 'delivered', 'product_name': 'MTN Airtime VTU', 'unique_element': '08011111111',
+        'unit_price': 100, 'quantity': 1, 'service_verification': None, 'channel': 'api',
+        'commission': 3.0, 'total_amount': 97.0, 'discount': None, 'type': 'Airtime Recharge',
+        'email': 'user@example.com', 'phone': '08011111111', 'name': None, 'convinience_fee': 0,
+        'amount': 100, 'platform': 'api', 'method': 'api', 'transactionId': '17415980564672211596777904',
+    }},
+    'response_description': 'TRANSACTION SUCCESSFUL',
+    'requestId': '202503101014abcdef',
+    'amount': 100,
+    'transaction_date': '2025-03-10T09:14:16.000000Z',
+    'purchased_code': '',
+}
+
+
+def transaction_rows(count, rng):
+    """Rows as `.values(*TransactionListSerializer.FIELDS)` returns them"""
+    now = timezone.now()
+    rows = []
+    for number in range(count):
+        service_id = rng.choice(list(SERVICES))
+        rows.append({
+            'id': uuid7(), 'transaction_type': SERVICES[service_id], 'service_id': service_id,
+            'amount': money(rng.randrange(50, 5000)), 'phone_number': '08011111111', 'email': None,
+            'request_id': new_request_id(), 'vtpass_reference': str(rng.getrandbits(64)),
+            'status': 'successful', 'next_retry_at': None, 'created_at': now - timedelta(minutes=number),
+        })
+    return rows
+
+
+def payloads(rows, rng):
+    page = TransactionListSerializer(transaction_rows(rows, rng), many=True).data
+    detail = dict(page[0], response_data=VTPASS_RESPONSE)
+    return {
+        f'transactions page ({rows} rows)': {'next': 'http://localhost/api/users/transactions/?cursor=x', 'results': page},
+        'dashboard stats': {
+            'balance': money('120000.5'), 'balance_age': 3.2, 'this_month_spent': money('45200'),
+            'total_spent': money('981250.75'), 'recent_transactions': page[:5],
+        },
+        'transaction detail (?expand=response)': {'transaction': detail, 'attempts': [], 'source': 'local'},
+    }
+
+
+class FixedPointEncoder(encoders.JSONEncoder):
+    """DRF's encoder, writing Decimals as ORJSONRenderer does, to compare the two"""
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return format(obj, 'f')
+        return super().default(obj)
+
+
+class FixedPointJSONRenderer(JSONRenderer):
+    encoder_class = FixedPointEncoder
+
+
+def per_call(fn, repeat):
+    return min(timeit.repeat(fn, number=repeat, repeat=3)) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100, help="Rows in the transactions page (default 100)")
+    parser.add_argument('--repeat', type=int, default=2000, help="Renders per timing (default 2000)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for the payloads (default 0)")
+    args = parser.parse_args()
+
+    drf_renderer, fast_renderer = JSONRenderer(), ORJSONRenderer()
+    drf_parser, fast_parser = JSONParser(), ORJSONParser()
+
+    print(f"{'payload':<40} {'bytes':>8} {'DRF render':>11} {'orjson':>9} {'DRF parse':>10} {'orjson':>9}")
+    for name, data in payloads(args.rows, random.Random(args.seed)).items():
+        body = fast_renderer.render(data)
+        # DRF writes Decimals as floats; everything else must come out the same
+        if json.loads(body) != json.loads(FixedPointJSONRenderer().render(data)):
+            sys.exit(f"{name}: the renderers disagree")
+
+        timings = [
+            per_call(lambda: drf_renderer.render(data), args.repeat),
+            per_call(lambda: fast_renderer.render(data), args.repeat),
+            per_call(lambda: drf_parser.parse(io.BytesIO(body)), args.repeat),
+            per_call(lambda: fast_parser.parse(io.BytesIO(body)), args.repeat),
+        ]
+        print(f"{name:<40} {len(body):>8} " + ' '.join(f"{t:>8.1f}us" for t in timings))
+
+
+if __name__ == '__main__':
+    main()
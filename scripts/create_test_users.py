@@ -14,7 +14,7 @@ from faker import Faker
 fake = Faker()
 
 # API Configuration
-API_BASE_URL = "http://localhost:8000/api"
+API_BASE_URL = os.environ.get("PAYLINK_API_URL", "http://localhost:8000/api")  # Override to target another deployment
 REGISTER_ENDPOINT = f"{API_BASE_URL}/users/register/"
 
 # Nigerian bank options for realistic data
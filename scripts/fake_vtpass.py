@@ -0,0 +1,538 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the VTPass API, for load testing without the sandbox.
+
+Speaks the endpoints PayLink uses (pay, requery, balance, service-variations
+and the service listings) with configurable latency distributions, error-code
+injection (016/014/009), transactions that stay pending before they are
+delivered, and per-serviceID behavior.
+
+Run it and point PayLink at it:
+    python scripts/fake_vtpass.py --port 8001 --latency lognormal:120:0.5 --errors 016=0.05
+    VTPASS_BASE_URL=http://127.0.0.1:8001/api python manage.py runserver
+
+Per-serviceID behavior comes from a JSON profile passed with --profile:
+    {
+        "default": {"latency": "uniform:50:150", "errors": {"016": 0.02}},
+        "services": {
+            "mtn": {"latency": "lognormal:400:0.8", "errors": {"016": 0.3}},
+            "ikeja-electric": {"pending_rate": 0.5, "pending_seconds": 60}
+        }
+    }
+
+With --callback-url the stand-in also pushes transaction-update callbacks,
+signed with --webhook-secret, whenever a purchase is delivered:
+    python scripts/fake_vtpass.py --callback-url http://127.0.0.1:8000/api/users/webhooks/vtpass/ \
+        --webhook-secret dev-secret --pending-rate 0.3 --duplicate-callback-rate 0.1
+
+GET /__stats returns request counts, POST /__reset clears all state and
+POST /__replay-callbacks resends the callback of every finished transaction.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import math
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Catalog served by the listing and service-variations endpoints
+SERVICES = {
+    "airtime": [
+        {"serviceID": "mtn", "name": "MTN Airtime VTU", "minimium_amount": "50", "maximum_amount": 50000},
+        {"serviceID": "airtel", "name": "Airtel Airtime VTU", "minimium_amount": "50", "maximum_amount": 50000},
+        {"serviceID": "glo", "name": "GLO Airtime VTU", "minimium_amount": "50", "maximum_amount": 50000},
+        {"serviceID": "etisalat", "name": "9mobile Airtime VTU", "minimium_amount": "50", "maximum_amount": 50000},
+    ],
+    "data": [
+        {"serviceID": "mtn-data", "name": "MTN Data"},
+        {"serviceID": "airtel-data", "name": "Airtel Data"},
+        {"serviceID": "glo-data", "name": "GLO Data"},
+        {"serviceID": "etisalat-data", "name": "9mobile Data"},
+    ],
+    "electricity": [
+        {"serviceID": "ikeja-electric", "name": "Ikeja Electric Payment - IKEDC"},
+        {"serviceID": "eko-electric", "name": "Eko Electric Payment - EKEDC"},
+    ],
+    "education": [
+        {"serviceID": "waec", "name": "WAEC Result Checker PIN"},
+        {"serviceID": "jamb", "name": "JAMB PIN VENDING (UTME & Direct Entry)"},
+    ],
+}
+
+VARIATIONS = {
+    "mtn-data": [
+        {"variation_code": "mtn-10mb-100", "name": "N100 100MB - 24 hrs", "variation_amount": "100.00", "fixedPrice": "Yes"},
+        {"variation_code": "mtn-1gb-1000", "name": "N1000 1GB - 30 days", "variation_amount": "1000.00", "fixedPrice": "Yes"},
+    ],
+    "airtel-data": [
+        {"variation_code": "airt-100", "name": "Airtel 75MB - 1 Day", "variation_amount": "99.00", "fixedPrice": "Yes"},
+        {"variation_code": "airt-1000", "name": "Airtel 1.5GB - 30 Days", "variation_amount": "999.00", "fixedPrice": "Yes"},
+    ],
+    "jamb": [
+        {"variation_code": "utme", "name": "UTME", "variation_amount": "4700.00", "fixedPrice": "Yes"},
+        {"variation_code": "de", "name": "Direct Entry (DE)", "variation_amount": "4700.00", "fixedPrice": "Yes"},
+    ],
+}
+
+ERROR_RESPONSES = {
+    "016": "TRANSACTION FAILED",
+    "014": "REQUEST ID ALREADY EXIST",
+    "009": "TRANSACTION PROCESSING - PLEASE REQUERY",
+}
+
+
+def parse_latency(spec):
+    """
+    Parse a latency spec into a function returning seconds.
+    Supported: fixed:MS, uniform:MIN_MS:MAX_MS, normal:MEAN_MS:STDDEV_MS,
+    lognormal:MEDIAN_MS:SIGMA
+    """
+    if not spec:
+        return lambda: 0.0
+    kind, *params = spec.split(':')
+    params = [float(p) for p in params]
+    if kind == 'fixed':
+        return lambda: params[0] / 1000
+    if kind == 'uniform':
+        return lambda: random.uniform(params[0], params[1]) / 1000
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(params[0], params[1])) / 1000
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(math.log(params[0]), params[1]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def parse_errors(spec):
+    """Parse '016=0.05,014=0.01' into {'016': 0.05, '014': 0.01}"""
+    errors = {}
+    for item in filter(None, (spec or '').split(',')):
+        code, rate = item.split('=')
+        errors[code.strip()] = float(rate)
+    return errors
+
+
+class Behavior:
+    """How the stand-in responds for one serviceID (or by default)"""
+
+    def __init__(self, latency=None, errors=None, pending_rate=0.0, pending_seconds=30, http_error_rate=0.0):
+        self.latency_spec = latency
+        self.latency = parse_latency(latency)
+        self.errors = errors if isinstance(errors, dict) else parse_errors(errors)
+        self.pending_rate = float(pending_rate)
+        self.pending_seconds = float(pending_seconds)
+        self.http_error_rate = float(http_error_rate)
+
+    def merged(self, overrides):
+        """Return a copy with the given profile keys overridden"""
+        return Behavior(
+            latency=overrides.get('latency', self.latency_spec),
+            errors=overrides.get('errors', self.errors),
+            pending_rate=overrides.get('pending_rate', self.pending_rate),
+            pending_seconds=overrides.get('pending_seconds', self.pending_seconds),
+            http_error_rate=overrides.get('http_error_rate', self.http_error_rate),
+        )
+
+    def pick_error(self):
+        roll = random.random()
+        for code, rate in self.errors.items():
+            if roll < rate:
+                return code
+            roll -= rate
+        return None
+
+
+class FakeVTPassState:
+    """Transactions, balance and counters shared by all handler threads"""
+
+    def __init__(self, default_behavior, service_behaviors, balance):
+        self.default_behavior = default_behavior
+        self.service_behaviors = service_behaviors
+        self.initial_balance = balance
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.balance = self.initial_balance
+            self.transactions = {}
+            self.stats = {}
+
+    def behavior_for(self, service_id):
+        return self.service_behaviors.get(service_id, self.default_behavior)
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+
+class CallbackSender:
+    """Posts signed transaction-update callbacks from a background thread"""
+
+    def __init__(self, state, url, secret, duplicate_rate=0.0, verbose=False):
+        self.state = state
+        self.url = url
+        self.secret = secret
+        self.duplicate_rate = duplicate_rate
+        self.verbose = verbose
+        self.queue = []
+        self.condition = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._deliver_pending, daemon=True).start()
+        threading.Thread(target=self._send_loop, daemon=True).start()
+
+    def push(self, transaction):
+        """Queue the callback for a finished transaction"""
+        payload = {"type": "transaction-update", "data": pay_response(transaction)}
+        copies = 2 if random.random() < self.duplicate_rate else 1
+        with self.condition:
+            self.queue.extend([payload] * copies)
+            self.condition.notify()
+
+    def replay(self):
+        """Resend callbacks for every finished transaction"""
+        with self.state.lock:
+            finished = [t for t in self.state.transactions.values() if t['status'] != 'pending']
+        for transaction in finished:
+            self.push(transaction)
+        return len(finished)
+
+    def _deliver_pending(self):
+        # Pending purchases are delivered on time even if nobody requeries them
+        while True:
+            time.sleep(0.5)
+            with self.state.lock:
+                due = [t for t in self.state.transactions.values()
+                       if t['status'] == 'pending' and time.time() >= t['deliver_at']]
+                for transaction in due:
+                    transaction['status'] = 'delivered'
+            for transaction in due:
+                self.push(transaction)
+
+    def _send_loop(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                payload = self.queue.pop(0)
+            self._post(payload)
+
+    def _post(self, payload):
+        body = json.dumps(payload).encode()
+        request = urllib.request.Request(self.url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'X-VTPass-Signature': hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest(),
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                status = response.status
+        except Exception as e:
+            status = getattr(e, 'code', None)
+            if self.verbose:
+                print(f"Callback for {payload['data']['requestId']} failed: {e}")
+        self.state.count(f"callback {status or 'error'}")
+
+
+def transaction_content(transaction):
+    """The `content.transactions` block VTPass returns for pay and requery"""
+    status = transaction['status']
+    if status == 'pending' and time.time() >= transaction['deliver_at']:
+        status = transaction['status'] = 'delivered'
+    return {
+        "transactions": {
+            "status": status,
+            "product_name": transaction['product_name'],
+            "unique_element": transaction['phone'],
+            "unit_price": transaction['amount'],
+            "quantity": 1,
+            "service_verification": None,
+            "channel": "api",
+            "commission": round(transaction['amount'] * 0.03, 2),
+            "total_amount": round(transaction['amount'] * 0.97, 2),
+            "discount": None,
+            "type": "Airtime Recharge",
+            "email": transaction['email'],
+            "phone": transaction['phone'],
+            "name": None,
+            "convinience_fee": 0,
+            "amount": transaction['amount'],
+            "platform": "api",
+            "method": "api",
+            "transactionId": transaction['transaction_id'],
+        }
+    }
+
+
+def pay_response(transaction):
+    """Body VTPass returns for an accepted purchase, its requery and its callback"""
+    content = transaction_content(transaction)
+    status = content['transactions']['status']
+    return {
+        # VTPass answers 000 for accepted purchases; the status says whether it was delivered
+        "code": "000",
+        "content": content,
+        "response_description": "TRANSACTION SUCCESSFUL" if status == 'delivered' else "TRANSACTION IS PROCESSING",
+        "requestId": transaction['request_id'],
+        "amount": transaction['amount'],
+        "transaction_date": transaction['created_at'],
+        "purchased_code": "",
+    }
+
+
+class FakeVTPassHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeVTPass/1.0'
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _route(self):
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip('/')
+        if path.startswith('/api'):
+            path = path[len('/api'):]
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        return path.lstrip('/'), params
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self, behavior):
+        """Apply latency and HTTP-level failures. Returns False if a 500 was sent"""
+        time.sleep(behavior.latency())
+        if behavior.http_error_rate and random.random() < behavior.http_error_rate:
+            self._send({"code": "error", "response_description": "Internal Server Error"}, status=500)
+            return False
+        return True
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except json.JSONDecodeError:
+            return {}
+
+    def _authorized(self, key_header):
+        if not self.server.require_auth:
+            return True
+        return bool(self.headers.get('api-key') and self.headers.get(key_header))
+
+    def do_GET(self):
+        endpoint, params = self._route()
+        self.state.count(f"GET {endpoint}")
+
+        if endpoint == '__stats':
+            with self.state.lock:
+                return self._send({"stats": self.state.stats, "transactions": len(self.state.transactions),
+                                   "balance": self.state.balance})
+
+        if not self._authorized('public-key'):
+            return self._send({"code": "error", "response_description": "INVALID CREDENTIALS"}, status=401)
+
+        if endpoint == 'balance':
+            if not self._simulate(self.state.default_behavior):
+                return
+            with self.state.lock:
+                return self._send({"code": 1, "contents": {"balance": round(self.state.balance, 2)}})
+
+        if endpoint == 'requery':
+            if not self._simulate(self.state.default_behavior):
+                return
+            request_id = params.get('request_id')
+            with self.state.lock:
+                transaction = self.state.transactions.get(request_id)
+                if transaction is None:
+                    return self._send({"code": "015", "response_description": "INVALID REQUEST ID"})
+                return self._send(pay_response(transaction))
+
+        if endpoint == 'service-variations':
+            service_id = params.get('serviceID', '')
+            if not self._simulate(self.state.behavior_for(service_id)):
+                return
+            return self._send({
+                "response_description": "000",
+                "content": {
+                    "ServiceName": service_id,
+                    "serviceID": service_id,
+                    "convinience_fee": "0 %",
+                    "variations": VARIATIONS.get(service_id, []),
+                }
+            })
+
+        # Service listings: /services?identifier=airtime or /airtime
+        service_type = params.get('identifier') if endpoint == 'services' else endpoint
+        if service_type in SERVICES:
+            if not self._simulate(self.state.default_behavior):
+                return
+            return self._send({"response_description": "000", "content": SERVICES[service_type]})
+
+        self._send({"code": "error", "response_description": "NOT FOUND"}, status=404)
+
+    def do_POST(self):
+        endpoint, _ = self._route()
+        self.state.count(f"POST {endpoint}")
+
+        if endpoint == '__reset':
+            self.state.reset()
+            return self._send({"reset": True})
+
+        if endpoint == '__replay-callbacks':
+            if not self.server.callbacks:
+                return self._send({"code": "error", "response_description": "CALLBACKS DISABLED"}, status=400)
+            return self._send({"replayed": self.server.callbacks.replay()})
+
+        if not self._authorized('secret-key'):
+            return self._send({"code": "error", "response_description": "INVALID CREDENTIALS"}, status=401)
+
+        if endpoint != 'pay':
+            return self._send({"code": "error", "response_description": "NOT FOUND"}, status=404)
+
+        data = self._read_json()
+        service_id = data.get('serviceID', '')
+        request_id = data.get('request_id')
+        behavior = self.state.behavior_for(service_id)
+        if not self._simulate(behavior):
+            return
+
+        if not request_id or not service_id:
+            return self._send({"code": "011", "response_description": "INVALID ARGUMENTS"})
+
+        try:
+            amount = float(data.get('amount') or 0)
+        except (TypeError, ValueError):
+            amount = 0.0
+
+        error_code = behavior.pick_error()
+        with self.state.lock:
+            if request_id in self.state.transactions:
+                error_code = '014'
+            elif error_code is None and amount > self.state.balance:
+                error_code = '018'
+
+            if error_code:
+                self.state.stats[f"error {error_code}"] = self.state.stats.get(f"error {error_code}", 0) + 1
+                return self._send({
+                    "code": error_code,
+                    "response_description": ERROR_RESPONSES.get(error_code, "LOW WALLET BALANCE"),
+                    "requestId": request_id,
+                    "content": {"transactions": {"status": "failed"}},
+                })
+
+            pending = random.random() < behavior.pending_rate
+            transaction = {
+                'request_id': request_id,
+                'service_id': service_id,
+                'amount': amount,
+                'phone': data.get('phone'),
+                'email': data.get('email'),
+                'product_name': service_id.upper(),
+                'transaction_id': str(uuid.uuid4().int)[:17],
+                'status': 'pending' if pending else 'delivered',
+                'deliver_at': time.time() + (behavior.pending_seconds if pending else 0),
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self.state.transactions[request_id] = transaction
+            self.state.balance -= amount
+            self._send(pay_response(transaction))
+
+        if self.server.callbacks and transaction['status'] == 'delivered':
+            self.server.callbacks.push(transaction)
+
+
+def load_profile(path, default_behavior):
+    """Build per-serviceID behaviors from a JSON profile file"""
+    if not path:
+        return default_behavior, {}
+    with open(path) as f:
+        profile = json.load(f)
+    default_behavior = default_behavior.merged(profile.get('default', {}))
+    services = {
+        service_id: default_behavior.merged(overrides)
+        for service_id, overrides in profile.get('services', {}).items()
+    }
+    return default_behavior, services
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local VTPass stand-in server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', default='uniform:50:150',
+                        help="fixed:MS, uniform:MIN:MAX, normal:MEAN:STDDEV or lognormal:MEDIAN:SIGMA (milliseconds)")
+    parser.add_argument('--errors', default='', help="Error-code rates, e.g. 016=0.05,014=0.01,009=0.01")
+    parser.add_argument('--pending-rate', type=float, default=0.0,
+                        help="Share of purchases that stay pending before they are delivered")
+    parser.add_argument('--pending-seconds', type=float, default=30,
+                        help="Seconds a pending purchase takes to become delivered")
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument('--balance', type=float, default=1_000_000.0, help="Starting platform balance")
+    parser.add_argument('--profile', help="JSON file with default and per-serviceID behavior")
+    parser.add_argument('--require-auth', action='store_true', help="Reject requests without VTPass key headers")
+    parser.add_argument('--callback-url', help="PayLink webhook URL to push transaction-update callbacks to")
+    parser.add_argument('--webhook-secret', default='', help="Shared secret used to sign callbacks")
+    parser.add_argument('--duplicate-callback-rate', type=float, default=0.0,
+                        help="Share of callbacks that are sent twice")
+    parser.add_argument('--seed', type=int, help="Random seed for reproducible runs")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    default_behavior = Behavior(
+        latency=args.latency,
+        errors=args.errors,
+        pending_rate=args.pending_rate,
+        pending_seconds=args.pending_seconds,
+        http_error_rate=args.http_error_rate,
+    )
+    default_behavior, service_behaviors = load_profile(args.profile, default_behavior)
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeVTPassHandler)
+    server.daemon_threads = True
+    server.state = FakeVTPassState(default_behavior, service_behaviors, args.balance)
+    server.require_auth = args.require_auth
+    server.verbose = args.verbose
+    server.callbacks = None
+    if args.callback_url:
+        server.callbacks = CallbackSender(server.state, args.callback_url, args.webhook_secret,
+                                          args.duplicate_callback_rate, args.verbose)
+        server.callbacks.start()
+
+    print("=" * 50)
+    print(f"Fake VTPass listening on http://{args.host}:{args.port}/api")
+    print(f"Latency: {args.latency}  Errors: {args.errors or 'none'}")
+    if service_behaviors:
+        print(f"Per-service profiles: {', '.join(sorted(service_behaviors))}")
+    if args.callback_url:
+        print(f"Callbacks: {args.callback_url}")
+    print("=" * 50)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
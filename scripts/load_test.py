@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+"""
+End-to-end load generator for the PayLink API.
+
+Starts full user journeys at a target rate (register, login, set PIN, fund
+wallet, list services, purchase, transaction status, dashboard) and reports
+latency percentiles per endpoint, error breakdowns and throughput. Results
+can be saved as a JSON baseline and compared against a later run.
+
+Journeys are started on a fixed schedule (open loop), so a slow server does
+not lower the offered load and hide tail latency.
+
+Examples:
+    python scripts/load_test.py --rps 5 --duration 60 --save baseline.json
+    python scripts/load_test.py --rps 5 --duration 60 --compare baseline.json
+
+Point PayLink at scripts/fake_vtpass.py to load test without the VTPass sandbox.
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from create_test_users import API_BASE_URL, generate_random_user
+
+PERCENTILES = (50, 90, 95, 99)
+TEST_PIN = "1234"
+
+# Airtime services used for the purchase step
+AIRTIME_SERVICES = ["mtn", "airtel", "glo", "etisalat"]
+
+_local = threading.local()
+
+
+def get_session(pool_size):
+    """One keep-alive session per worker thread"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+    return session
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    """Collects per-endpoint latencies and errors from all worker threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.journeys_started = 0
+        self.journeys_completed = 0
+        self.max_start_lag = 0.0
+
+    def record(self, endpoint, elapsed, error=None):
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            if error:
+                self.errors[endpoint][error] += 1
+
+    def summary(self, wall_time):
+        """Results as a JSON-serializable dict"""
+        endpoints = {}
+        total_requests = 0
+        total_errors = 0
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            error_count = sum(self.errors[endpoint].values())
+            total_requests += len(values)
+            total_errors += error_count
+            stats = {
+                'count': len(values),
+                'errors': error_count,
+                'error_rate': round(error_count / len(values), 4),
+                'mean_ms': round(sum(values) / len(values) * 1000, 1),
+                'max_ms': round(values[-1] * 1000, 1),
+                'error_breakdown': dict(self.errors[endpoint]),
+            }
+            for pct in PERCENTILES:
+                stats[f'p{pct}_ms'] = round(percentile(values, pct) * 1000, 1)
+            endpoints[endpoint] = stats
+
+        return {
+            'endpoints': endpoints,
+            'totals': {
+                'requests': total_requests,
+                'errors': total_errors,
+                'error_rate': round(total_errors / total_requests, 4) if total_requests else 0,
+                'throughput_rps': round(total_requests / wall_time, 2) if wall_time else 0,
+                'journeys_started': self.journeys_started,
+                'journeys_completed': self.journeys_completed,
+                'journeys_per_second': round(self.journeys_completed / wall_time, 2) if wall_time else 0,
+                'max_start_lag_ms': round(self.max_start_lag * 1000, 1),
+                'wall_time_s': round(wall_time, 2),
+            },
+        }
+
+
+def classify_error(response):
+    """Short label for a failed response, including VTPass error codes"""
+    label = f"HTTP {response.status_code}"
+    try:
+        body = response.json()
+    except ValueError:
+        return label
+    if isinstance(body, dict):
+        vtpass_response = body.get('response')
+        if isinstance(vtpass_response, dict):
+            code = vtpass_response.get('error_type') or vtpass_response.get('code')
+            if code and code not in ('000', 'success'):
+                return f"{label} vtpass:{code}"
+    return label
+
+
+class Journey:
+    """One simulated user going through the app from registration to dashboard"""
+
+    def __init__(self, base_url, recorder, options):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.options = options
+        self.session = get_session(options.pool_size)
+        self.headers = {}
+
+    def call(self, endpoint, method, path, expected=(200,), **kwargs):
+        """Make one request and record it. Returns the response or None"""
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", headers=self.headers,
+                                            timeout=self.options.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.record(endpoint, time.perf_counter() - start, type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - start
+
+        error = None
+        if response.status_code not in expected:
+            error = classify_error(response)
+        elif endpoint == 'purchase':
+            # A 200 can still carry a failed VTPass purchase
+            status = (response.json().get('transaction') or {}).get('status')
+            if status == 'failed':
+                error = classify_error(response)
+        self.recorder.record(endpoint, elapsed, error)
+        return response if response.status_code in expected else None
+
+    def run(self):
+        user_data = generate_random_user()
+        # Faker emails repeat under load; keep them unique per journey
+        user_data['email'] = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        user_data['username'] = f"load{uuid.uuid4().hex[:10]}"
+
+        if not self.call('register', 'POST', '/users/register/', expected=(201,), json=user_data):
+            return False
+
+        response = self.call('login', 'POST', '/users/login/',
+                             json={'email': user_data['email'], 'password': user_data['password']})
+        if not response:
+            return False
+        self.headers = {'Authorization': f"Bearer {response.json()['access']}"}
+
+        if not self.call('set-pin', 'PUT', '/users/set-pin/', json={'pin': TEST_PIN, 'pin_confirm': TEST_PIN}):
+            return False
+
+        if not self.call('fund-wallet', 'POST', '/users/fund-wallet/',
+                         json={'amount': self.options.fund_amount, 'payment_method': 'bank_transfer'}):
+            return False
+
+        self.call('services', 'GET', '/users/services/airtime/', expected=(200, 304))
+
+        response = self.call('purchase', 'POST', self.options.purchase_path, json={
+            'service_id': random.choice(AIRTIME_SERVICES),
+            'amount': self.options.purchase_amount,
+            'phone': user_data['phone_number'],
+            'email': user_data['email'],
+            'pin': TEST_PIN,
+        })
+        if response:
+            request_id = (response.json().get('transaction') or {}).get('request_id')
+            if request_id:
+                self.call('transaction-status', 'GET', f"/users/transaction-status/{request_id}/")
+
+        self.call('dashboard', 'GET', self.options.dashboard_path)
+        return True
+
+
+def run_load(options):
+    """Start journeys at the target rate for the configured duration"""
+    recorder = Recorder()
+    interval = 1.0 / options.rps
+    total_journeys = int(options.rps * options.duration)
+
+    def run_journey():
+        try:
+            completed = Journey(options.base_url, recorder, options).run()
+        except Exception as e:
+            recorder.record('journey', 0.0, type(e).__name__)
+            completed = False
+        if completed:
+            with recorder.lock:
+                recorder.journeys_completed += 1
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.workers, thread_name_prefix='journey') as executor:
+        for i in range(total_journeys):
+            scheduled = started_at + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            recorder.max_start_lag = max(recorder.max_start_lag, time.perf_counter() - scheduled)
+            recorder.journeys_started += 1
+            executor.submit(run_journey)
+    wall_time = time.perf_counter() - started_at
+    return recorder.summary(wall_time)
+
+
+def git_commit():
+    """Current commit hash, so baselines can be tied to a release"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results):
+    print("\n" + "=" * 96)
+    print(f"{'Endpoint':<20}{'Count':>7}{'Errors':>8}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}{'mean':>9}")
+    print("-" * 96)
+    for endpoint, stats in results['endpoints'].items():
+        print(f"{endpoint:<20}{stats['count']:>7}{stats['errors']:>8}"
+              f"{stats['p50_ms']:>9}{stats['p90_ms']:>9}{stats['p95_ms']:>9}"
+              f"{stats['p99_ms']:>9}{stats['max_ms']:>9}{stats['mean_ms']:>9}")
+    print("=" * 96)
+    print("Latencies in milliseconds")
+
+    totals = results['totals']
+    print(f"\nRequests: {totals['requests']}  Errors: {totals['errors']} ({totals['error_rate']:.2%})")
+    print(f"Throughput: {totals['throughput_rps']} req/s, {totals['journeys_per_second']} journeys/s")
+    print(f"Journeys: {totals['journeys_completed']} of {totals['journeys_started']} completed")
+    if totals['max_start_lag_ms'] > 100:
+        print(f"⚠️  Journeys started up to {totals['max_start_lag_ms']}ms late; "
+              f"raise --workers to hold the target rate")
+
+    breakdown = [(endpoint, error, count)
+                 for endpoint, stats in results['endpoints'].items()
+                 for error, count in stats['error_breakdown'].items()]
+    if breakdown:
+        print("\nError breakdown:")
+        for endpoint, error, count in sorted(breakdown, key=lambda item: -item[2]):
+            print(f"   {endpoint:<20}{error:<40}{count:>6}")
+
+
+def compare(results, baseline, threshold):
+    """Print p50/p99/error-rate changes against a baseline. Returns True on regression"""
+    print("\n" + "=" * 80)
+    print(f"Comparison with baseline from {baseline.get('started_at')} (commit {baseline.get('commit')})")
+    print("-" * 80)
+    print(f"{'Endpoint':<20}{'p50 ms':>18}{'p99 ms':>22}{'error rate':>20}")
+
+    regressed = False
+    for endpoint, stats in results['endpoints'].items():
+        before = baseline['results']['endpoints'].get(endpoint)
+        if not before:
+            print(f"{endpoint:<20}{'(not in baseline)':>18}")
+            continue
+
+        cells = []
+        for key in ('p50_ms', 'p99_ms'):
+            change = (stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            flag = ''
+            if change > threshold:
+                flag = ' ⚠️'
+                regressed = True
+            cells.append(f"{before[key]:>7} → {stats[key]:<7} {change:+.0f}%{flag}")
+        error_change = stats['error_rate'] - before['error_rate']
+        if error_change > 0.01:
+            regressed = True
+        cells.append(f"{before['error_rate']:.2%} → {stats['error_rate']:.2%}")
+        print(f"{endpoint:<20}" + "  ".join(cells))
+
+    print("=" * 80)
+    print("❌ Regression beyond threshold" if regressed else "✅ No regression beyond threshold")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run end-to-end load against the PayLink API")
+    parser.add_argument('--base-url', default=API_BASE_URL, help=f"API base URL (default {API_BASE_URL})")
+    parser.add_argument('--rps', type=float, default=2.0, help="Journeys started per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to keep starting journeys")
+    parser.add_argument('--workers', type=int, default=50, help="Maximum concurrent journeys")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument('--fund-amount', type=float, default=5000)
+    parser.add_argument('--purchase-amount', type=float, default=100)
+    parser.add_argument('--async-views', action='store_true',
+                        help="Use the async purchase, transaction-status and dashboard endpoints")
+    parser.add_argument('--save', metavar='FILE', help="Write results to a JSON baseline file")
+    parser.add_argument('--compare', metavar='FILE', help="Compare results with a saved baseline")
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help="Percent latency increase counted as a regression (default 20)")
+    parser.add_argument('--seed', type=int, help="Random seed for reproducible journeys")
+    options = parser.parse_args()
+    options.base_url = options.base_url.rstrip('/')
+    options.pool_size = 4
+    prefix = '/users/async' if options.async_views else '/users'
+    options.purchase_path = f"{prefix}/purchase/"
+    options.dashboard_path = f"{prefix}/dashboard/stats/"
+
+    if options.seed is not None:
+        random.seed(options.seed)
+
+    # Make sure the server is running
+    try:
+        requests.get(options.base_url, timeout=options.timeout)
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to the API server.")
+        print(f"   Please make sure the server is running at {options.base_url}")
+        return 1
+
+    print("=" * 50)
+    print(f"Load testing {options.base_url}")
+    print(f"{options.rps} journeys/s for {options.duration}s, up to {options.workers} concurrent")
+    print("=" * 50)
+
+    started_at = datetime.now().isoformat(timespec='seconds')
+    results = run_load(options)
+    print_report(results)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({
+                'started_at': started_at,
+                'commit': git_commit(),
+                'config': {key: getattr(options, key)
+                           for key in ('base_url', 'rps', 'duration', 'workers', 'async_views')},
+                'results': results,
+            }, f, indent=2)
+        print(f"\nResults saved to {options.save}")
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, options.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
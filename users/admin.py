@@ -1,21 +1,39 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, VTPassTransaction
+from .models import User, Wallet, VTPassTransaction, BackgroundTask, VTPassCallback, IdempotencyKey, LedgerEntry
+
+
+class WalletInline(admin.StackedInline):
+    """The user's wallet; balances only change through wallet movements, so they are read-only"""
+    model = Wallet
+    can_delete = False
+    fields = ('balance', 'held_balance', 'account_status', 'has_pin', 'pin')
+    readonly_fields = ('balance', 'held_balance')
 
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
     """Admin configuration for custom User model"""
     list_display = ('email', 'username', 'first_name', 'last_name', 'is_staff', 'vtpass_account_id', 'vtpass_balance')
+    list_select_related = ('wallet',)
+    inlines = (WalletInline,)
     list_filter = ('is_staff', 'is_superuser', 'is_active')
     search_fields = ('email', 'username', 'first_name', 'last_name', 'vtpass_account_id')
     
     # Add custom fields to the admin form
     fieldsets = UserAdmin.fieldsets + (
-        ('VTPass Information', {'fields': ('vtpass_account_id', 'vtpass_balance', 'preferred_network')}),
-        ('Additional Information', {'fields': ('phone_number', 'date_of_birth', 'address', 'state', 'pin')}),
+        ('VTPass Information', {'fields': ('vtpass_account_id', 'preferred_network')}),
+        ('Additional Information', {'fields': ('phone_number', 'date_of_birth', 'address', 'state')}),
         ('Banking Information', {'fields': ('bank_name', 'account_number', 'account_name', 'bvn')}),
     )
+    
+    @admin.display(description='VTPass balance', ordering='wallet__balance')
+    def vtpass_balance(self, obj):
+        return obj.wallet.balance
+    
+    def get_inlines(self, request, obj):
+        # New users get their wallet when saved, so it is only shown once it exists
+        return self.inlines if obj else ()
 
 
 @admin.register(VTPassTransaction)
@@ -27,3 +45,50 @@ class VTPassTransactionAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     readonly_fields = ('id', 'user', 'transaction_type', 'service_id', 'amount', 'phone_number', 
                       'email', 'request_id', 'vtpass_reference', 'response_data', 'created_at', 'updated_at')
+
+
+@admin.register(BackgroundTask)
+class BackgroundTaskAdmin(admin.ModelAdmin):
+    """Admin configuration for background tasks"""
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'created_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'locked_by')
+    readonly_fields = ('name', 'payload', 'attempts', 'locked_until', 'locked_by', 'last_error',
+                       'created_at', 'finished_at')
+
+
+@admin.register(VTPassCallback)
+class VTPassCallbackAdmin(admin.ModelAdmin):
+    """Admin configuration for VTPass callbacks"""
+    list_display = ('request_id', 'status', 'received_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('request_id',)
+    readonly_fields = ('request_id', 'status', 'payload', 'received_at', 'batch_id', 'processed_at')
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    """Admin configuration for idempotency keys"""
+    list_display = ('key', 'user', 'endpoint', 'status', 'response_status', 'created_at', 'expires_at')
+    list_filter = ('endpoint', 'status')
+    search_fields = ('key', 'user__email')
+    readonly_fields = ('user', 'key', 'endpoint', 'request_hash', 'status', 'response_status',
+                       'response_headers', 'created_at', 'expires_at')
+    exclude = ('response_body',)
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    """Read-only admin for the append-only wallet ledger"""
+    list_display = ('id', 'user', 'account', 'entry_type', 'amount', 'transaction', 'created_at')
+    list_filter = ('account', 'entry_type')
+    search_fields = ('user__email', 'journal_id')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
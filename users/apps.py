@@ -0,0 +1,30 @@
+from django.apps import AppConfig
+from django.conf import settings
+import threading
+
+
+class UsersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'users'
+
+    def ready(self):
+        # Wake clients waiting on the transaction status stream when a transaction changes
+        from django.db.models.signals import post_save
+        from .models import VTPassTransaction
+        from .transaction_events import transaction_saved
+        post_save.connect(transaction_saved, sender=VTPassTransaction, dispatch_uid='transaction_events')
+        
+        # Every user has a wallet row holding their balances, status and PIN
+        from .wallet import create_wallet
+        post_save.connect(create_wallet, sender=settings.AUTH_USER_MODEL, dispatch_uid='create_wallet')
+        
+        # Open pooled VTPass connections in the background when a worker boots,
+        # so the first purchases don't pay the TCP/TLS handshake.
+        if settings.VTPASS_PREWARM_CONNECTIONS > 0:
+            from .vtpass import prewarm_connections
+            threading.Thread(target=prewarm_connections, name='vtpass-prewarm', daemon=True).start()
+        
+        # Load the configured service catalogs so the first services screen is a cache hit
+        if settings.VTPASS_CATALOG_WARMUP:
+            from .catalog import service_catalog
+            threading.Thread(target=service_catalog.warm, name='vtpass-catalog-warmup', daemon=True).start()
@@ -0,0 +1,50 @@
+"""
+JWT authentication that loads a narrow user.
+
+simplejwt loads the whole User row on every authenticated request. Requests
+only need the login columns and the user's Wallet (balances, status and
+PIN), so this loads those in one query and leaves the profile columns
+deferred. Views that return the profile load the full row themselves.
+"""
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Profile columns no view reads from request.user
+PROFILE_FIELDS = (
+    'first_name', 'last_name', 'phone_number', 'date_of_birth', 'address', 'state',
+    'preferred_network', 'bank_name', 'account_number', 'account_name', 'bvn', 'occupation',
+)
+
+
+class WalletJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication whose request.user carries its wallet but not its profile"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        users = self.user_model.objects.select_related('wallet').defer(*PROFILE_FIELDS)
+        try:
+            user = users.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class WalletJWTScheme(SimpleJWTScheme):
+    """Documents WalletJWTAuthentication as the same bearer scheme as simplejwt's"""
+    target_class = 'users.authentication.WalletJWTAuthentication'
@@ -0,0 +1,150 @@
+"""
+Shared, single-flight cache for the VTPass platform balance.
+
+The balance snapshot lives in the Django cache (shared across workers when
+Redis is configured) for VTPASS_BALANCE_TTL seconds. When it expires only one
+caller fetches a new snapshot: threads in the same worker queue on a local
+lock, and other workers wait on a cache lock for the leader's result instead
+of calling VTPass themselves.
+"""
+from django.conf import settings
+from django.core.cache import cache
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PlatformBalanceCache:
+    """Single-flight cache in front of VTPassService.get_user_balance"""
+    key = 'vtpass:balance:snapshot'
+    lock_key = 'vtpass:balance:snapshot:lock'
+    poll_interval = 0.05
+
+    def __init__(self):
+        self._thread_lock = threading.Lock()
+        self._async_locks = {}
+
+    def get(self):
+        """
+        Return the current balance snapshot as a dict with `response`
+        (the VTPass balance response) and `fetched_at` keys.
+        """
+        entry = cache.get(self.key)
+        if self._is_fresh(entry):
+            return entry
+
+        # Coalesce concurrent callers in this worker behind one fetch
+        with self._thread_lock:
+            entry = cache.get(self.key)
+            if self._is_fresh(entry):
+                return entry
+
+            if cache.add(self.lock_key, True, timeout=settings.VTPASS_BALANCE_LOCK_TTL):
+                try:
+                    from .vtpass import VTPassService
+                    return self._store(VTPassService().get_user_balance())
+                finally:
+                    cache.delete(self.lock_key)
+
+            # Another worker is fetching: wait for its snapshot
+            deadline = time.monotonic() + settings.VTPASS_BALANCE_LOCK_TTL
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                fresh_entry = cache.get(self.key)
+                if self._is_fresh(fresh_entry):
+                    return fresh_entry
+                if not cache.get(self.lock_key):
+                    break
+
+            return self._fallback(entry)
+
+    async def aget(self):
+        """Async variant of get() for the ASGI views"""
+        entry = await cache.aget(self.key)
+        if self._is_fresh(entry):
+            return entry
+
+        async with self._async_lock():
+            entry = await cache.aget(self.key)
+            if self._is_fresh(entry):
+                return entry
+
+            if await cache.aadd(self.lock_key, True, timeout=settings.VTPASS_BALANCE_LOCK_TTL):
+                try:
+                    from .vtpass_async import AsyncVTPassService
+                    return await self._astore(await AsyncVTPassService().get_user_balance())
+                finally:
+                    await cache.adelete(self.lock_key)
+
+            deadline = time.monotonic() + settings.VTPASS_BALANCE_LOCK_TTL
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                fresh_entry = await cache.aget(self.key)
+                if self._is_fresh(fresh_entry):
+                    return fresh_entry
+                if not await cache.aget(self.lock_key):
+                    break
+
+            return entry if entry is not None else await self._afetch_direct()
+
+    def invalidate(self):
+        """Drop the snapshot, e.g. after a purchase moved the platform balance"""
+        cache.delete(self.key)
+
+    async def ainvalidate(self):
+        """Async variant of invalidate()"""
+        await cache.adelete(self.key)
+
+    @staticmethod
+    def age(entry):
+        """Seconds since the snapshot was fetched from VTPass"""
+        return max(0.0, time.time() - entry['fetched_at'])
+
+    def _fallback(self, stale_entry):
+        # The leader gave up or died: serve the stale snapshot if we have one
+        if stale_entry is not None:
+            return stale_entry
+        logger.warning("Timed out waiting for the VTPass balance snapshot, fetching directly")
+        from .vtpass import VTPassService
+        return self._store(VTPassService().get_user_balance())
+
+    async def _afetch_direct(self):
+        logger.warning("Timed out waiting for the VTPass balance snapshot, fetching directly")
+        from .vtpass_async import AsyncVTPassService
+        return await self._astore(await AsyncVTPassService().get_user_balance())
+
+    def _async_lock(self):
+        loop = asyncio.get_running_loop()
+        lock = self._async_locks.get(loop)
+        if lock is None:
+            # Drop locks whose loops have gone away
+            for stale_loop in [l for l in self._async_locks if l.is_closed()]:
+                self._async_locks.pop(stale_loop, None)
+            lock = self._async_locks[loop] = asyncio.Lock()
+        return lock
+
+    def _is_fresh(self, entry):
+        return entry is not None and self.age(entry) < settings.VTPASS_BALANCE_TTL
+
+    def _make_entry(self, response):
+        return {'response': response, 'fetched_at': time.time()}
+
+    def _cache_timeout(self):
+        # Keep expired snapshots around long enough to serve while refetching
+        return settings.VTPASS_BALANCE_TTL + settings.VTPASS_BALANCE_LOCK_TTL
+
+    def _store(self, response):
+        entry = self._make_entry(response)
+        cache.set(self.key, entry, timeout=self._cache_timeout())
+        return entry
+
+    async def _astore(self, response):
+        entry = self._make_entry(response)
+        await cache.aset(self.key, entry, timeout=self._cache_timeout())
+        return entry
+
+
+platform_balance = PlatformBalanceCache()
@@ -0,0 +1,131 @@
+"""
+Cache layer for the VTPass service catalog.
+
+Service listings (per service type) and service variations (per serviceID)
+change only a few times a day, so they are served from the Django cache.
+Entries are fresh for VTPASS_CATALOG_TTL seconds; after that they are still
+served for up to VTPASS_CATALOG_STALE_TTL seconds while a single background
+refresh fetches the new version (stale-while-revalidate). Each entry carries
+a strong ETag computed from its content.
+"""
+from django.conf import settings
+from django.core.cache import cache
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def make_etag(data):
+    """Return a strong ETag for a JSON-serializable payload"""
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str).encode()
+    return f'"{hashlib.sha256(encoded).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+class ServiceCatalog:
+    """Stale-while-revalidate cache in front of VTPass catalog endpoints"""
+
+    def __init__(self, vtpass_service=None):
+        self._vtpass_service = vtpass_service
+
+    @property
+    def vtpass_service(self):
+        if self._vtpass_service is None:
+            from .vtpass import VTPassService
+            self._vtpass_service = VTPassService()
+        return self._vtpass_service
+
+    def get_services(self, service_type):
+        """
+        Return the catalog entry for a service type.
+        The entry is a dict with `data`, `etag` and `fetched_at` keys.
+        """
+        return self._get(
+            f"vtpass:catalog:services:{service_type}",
+            lambda: self.vtpass_service._make_get_request(service_type),
+            fallback=lambda: self.vtpass_service._mock_services_response(service_type),
+        )
+
+    def get_variations(self, service_id):
+        """Return the catalog entry for the variations of a serviceID"""
+        return self._get(
+            f"vtpass:catalog:variations:{service_id}",
+            lambda: self.vtpass_service._make_get_request('service-variations', params={'serviceID': service_id}),
+        )
+
+    def refresh_services(self, service_type):
+        """Fetch a service type from VTPass and store it, ignoring freshness"""
+        return self._refresh(
+            f"vtpass:catalog:services:{service_type}",
+            lambda: self.vtpass_service._make_get_request(service_type),
+        )
+
+    def warm(self, service_types=None):
+        """Load the catalog for the given (or configured) service types"""
+        service_types = service_types or settings.VTPASS_CATALOG_WARMUP
+        for service_type in service_types:
+            try:
+                self.refresh_services(service_type)
+            except Exception as e:
+                logger.warning("Failed to warm %s service catalog: %s", service_type, e)
+        logger.info("Warmed VTPass service catalog for %d service types", len(service_types))
+
+    def _get(self, key, fetch, fallback=None):
+        entry = cache.get(key)
+        if entry is not None:
+            age = time.time() - entry['fetched_at']
+            if age >= settings.VTPASS_CATALOG_TTL:
+                self._refresh_in_background(key, fetch)
+            return entry
+
+        entry = self._refresh(key, fetch)
+        if entry['data'].get('code') == 'error' and fallback:
+            # Upstream failed and nothing is cached: serve an uncached fallback
+            return self._make_entry(fallback())
+        return entry
+
+    def _refresh(self, key, fetch):
+        """Fetch an entry from VTPass and store it unless VTPass returned an error"""
+        entry = self._make_entry(fetch())
+        if entry['data'].get('code') == 'error':
+            logger.warning("Not caching VTPass catalog error for %s: %s", key, entry['data'].get('response_description'))
+            return entry
+
+        cache.set(key, entry, timeout=settings.VTPASS_CATALOG_TTL + settings.VTPASS_CATALOG_STALE_TTL)
+        return entry
+
+    def _refresh_in_background(self, key, fetch):
+        # Only one worker refreshes a stale key at a time
+        if not cache.add(f"{key}:refreshing", True, timeout=settings.VTPASS_CATALOG_REFRESH_LOCK_TTL):
+            return
+
+        def _run():
+            try:
+                self._refresh(key, fetch)
+            except Exception as e:
+                logger.warning("Background refresh of %s failed: %s", key, e)
+            finally:
+                cache.delete(f"{key}:refreshing")
+
+        threading.Thread(target=_run, name='vtpass-catalog-refresh', daemon=True).start()
+
+    def _make_entry(self, data):
+        return {
+            'data': data,
+            'etag': make_etag(data),
+            'fetched_at': time.time(),
+        }
+
+
+service_catalog = ServiceCatalog()
@@ -0,0 +1,35 @@
+"""
+Server-side filters for a user's transaction list.
+
+Each filter narrows a query the composite indexes on VTPassTransaction
+already serve: status, transaction_type and service_id each have a
+(user, <field>, created_at, id) index, and the date range bounds
+created_at on whichever index is used.
+"""
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+# Query parameters matched exactly against a column
+EXACT_FILTERS = ('transaction_type', 'status', 'service_id')
+
+
+def _start_of_day(value, name):
+    day = parse_date(value) if value else None
+    if day is None:
+        raise ValidationError({name: 'Enter a date as YYYY-MM-DD.'})
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_transactions(queryset, params):
+    """
+    Apply the transaction_type, status, service_id, date_from and date_to
+    query parameters. Dates are inclusive days in the server's time zone.
+    """
+    filters = {field: params[field] for field in EXACT_FILTERS if params.get(field)}
+    if params.get('date_from'):
+        filters['created_at__gte'] = _start_of_day(params['date_from'], 'date_from')
+    if params.get('date_to'):
+        filters['created_at__lt'] = _start_of_day(params['date_to'], 'date_to') + timedelta(days=1)
+    return queryset.filter(**filters)
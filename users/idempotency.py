@@ -0,0 +1,297 @@
+"""
+Idempotency-Key support for endpoints that move money.
+
+The first request with a given key claims it by inserting an IdempotencyKey
+row (unique per user and key) and runs the view. Its rendered response is
+stored on the row and in the Django cache, and every later request with the
+same key gets exactly those bytes back without running the view again.
+
+A duplicate that arrives while the first request is still running waits for
+its result instead of making a second VTPass call, for up to
+IDEMPOTENCY_WAIT_TIMEOUT seconds (IDEMPOTENCY_SYNC_WAIT_TIMEOUT on sync
+views, where waiting ties up a worker). Reusing a key with a different body
+gets 422. Server errors (5xx) and exceptions release the key so the client
+can retry.
+
+A claim is a lease starting at `claimed_at`. If its holder dies without
+finishing or releasing the key (OOM, SIGKILL, a deploy), a duplicate that
+finds the lease older than IDEMPOTENCY_LEASE_TIMEOUT takes the key over
+with a conditional UPDATE and runs the request itself. Finishing or
+releasing only applies while the request still holds its lease.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction as db_transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.response import Response
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.1
+
+# Headers Django sets on every response; everything else is replayed as sent
+UNSTORED_HEADERS = {'content-type', 'content-length', 'vary', 'allow'}
+
+
+def cache_key(user_id, key):
+    return f'idempotency:{user_id}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def request_fingerprint(request):
+    """SHA-256 of the request body, independent of key order"""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _error(message, status_code, **extra):
+    return Response({'success': False, 'message': message, **extra}, status=status_code)
+
+
+def _replay(entry):
+    """HttpResponse with the stored status, headers and body bytes"""
+    response = HttpResponse(bytes(entry['body']), status=entry['status'], content_type=entry['content_type'])
+    for name, value in entry['headers'].items():
+        response[name] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _entry(record):
+    headers = dict(record.response_headers or {})
+    return {
+        'endpoint': record.endpoint,
+        'request_hash': record.request_hash,
+        'status': record.response_status,
+        'content_type': headers.pop('Content-Type', 'application/json'),
+        'headers': headers,
+        'body': bytes(record.response_body),
+    }
+
+
+def _check(entry_or_record, endpoint, fingerprint):
+    """422 response if the key was used for a different request"""
+    if isinstance(entry_or_record, dict):
+        used_endpoint, used_hash = entry_or_record['endpoint'], entry_or_record['request_hash']
+    else:
+        used_endpoint, used_hash = entry_or_record.endpoint, entry_or_record.request_hash
+    if used_endpoint != endpoint or used_hash != fingerprint:
+        return _error('Idempotency-Key was already used for a different request',
+                      status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return None
+
+
+def _conflict():
+    return _error('A request with this Idempotency-Key is still in progress', status.HTTP_409_CONFLICT,
+                  retry_recommended=True)
+
+
+def begin(request, endpoint):
+    """
+    Look up or claim the request's key. Returns (response, record, waiting_pk):
+    a response to answer with right away, the record this request claimed,
+    or the pk of the key another request holds.
+    """
+    from .models import IdempotencyKey
+
+    key = request.headers.get(HEADER, '').strip()
+    if len(key) > MAX_KEY_LENGTH:
+        return _error(f'{HEADER} must be at most {MAX_KEY_LENGTH} characters',
+                      status.HTTP_400_BAD_REQUEST), None, None
+    fingerprint = request_fingerprint(request)
+
+    entry = cache.get(cache_key(request.user.pk, key))
+    if entry is not None:
+        return _check(entry, endpoint, fingerprint) or _replay(entry), None, None
+
+    now = timezone.now()
+    # Expired keys can be reused
+    IdempotencyKey.objects.filter(user=request.user, key=key, expires_at__lte=now).delete()
+    try:
+        with db_transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=request.user, key=key, endpoint=endpoint, request_hash=fingerprint,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+            )
+        return None, record, None
+    except IntegrityError:
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is None:
+            # Released between our insert and read: let the client retry
+            return _conflict(), None, None
+
+    mismatch = _check(record, endpoint, fingerprint)
+    if mismatch:
+        return mismatch, None, None
+    if record.status == 'completed':
+        return _replay(_entry(record)), None, None
+    claim = _take_over(record)
+    if claim is not None:
+        return None, claim, None
+    return None, None, record.pk
+
+
+def _take_over(record):
+    """Claim an in-progress key whose holder's lease has run out. Returns the record, or None"""
+    from .models import IdempotencyKey
+
+    now = timezone.now()
+    if record.claimed_at > now - timedelta(seconds=settings.IDEMPOTENCY_LEASE_TIMEOUT):
+        return None
+    # Only one waiter wins: the UPDATE matches the lease it saw
+    taken = IdempotencyKey.objects.filter(
+        pk=record.pk, status='in_progress', claimed_at=record.claimed_at
+    ).update(claimed_at=now)
+    if not taken:
+        return None
+    logger.warning("Taking over Idempotency-Key %s for %s, held since %s", record.key, record.endpoint,
+                   record.claimed_at)
+    record.claimed_at = now
+    return record
+
+
+def poll(pk):
+    """
+    Check on a key another request holds. Returns (response, claim): the
+    replay once it finishes, or the key itself if its lease ran out; both
+    None while it is still running.
+    """
+    from .models import IdempotencyKey
+
+    record = IdempotencyKey.objects.filter(pk=pk).first()
+    if record is None:
+        # The first request failed and released the key
+        return _conflict(), None
+    if record.status == 'completed':
+        return _replay(_entry(record)), None
+    return None, _take_over(record)
+
+
+def wait(pk, timeout):
+    """poll() until it has an answer or `timeout` seconds pass"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        response, claim = poll(pk)
+        if response is not None or claim is not None:
+            return response, claim
+    return _conflict(), None
+
+
+def finish(view, record, response):
+    """Store the view's response under the key and return it as the bytes replays will get"""
+    if response.status_code >= 500:
+        release(record)
+        return response
+
+    if isinstance(response, Response):
+        renderer = view.renderer_classes[0]()
+        body = renderer.render(response.data)
+        content_type = f'{renderer.media_type}; charset={renderer.charset}' if renderer.charset else renderer.media_type
+    else:
+        body = response.content
+        content_type = response['Content-Type']
+    headers = {name: value for name, value in response.items() if name.lower() not in UNSTORED_HEADERS}
+
+    record.status = 'completed'
+    record.response_status = response.status_code
+    record.response_headers = {**headers, 'Content-Type': content_type}
+    record.response_body = body
+    entry = _entry(record)
+    if _held(record).update(status=record.status, response_status=record.response_status,
+                            response_headers=record.response_headers, response_body=body):
+        cache.set(cache_key(record.user_id, record.key), entry, timeout=settings.IDEMPOTENCY_KEY_TTL)
+    else:
+        logger.warning("Idempotency-Key %s was taken over before its %s request finished", record.key, record.endpoint)
+    replay = _replay(entry)
+    del replay['Idempotent-Replayed']
+    return replay
+
+
+def _held(record):
+    """The key's row, while `record`'s lease on it is still the current one"""
+    from .models import IdempotencyKey
+
+    return IdempotencyKey.objects.filter(pk=record.pk, status='in_progress', claimed_at=record.claimed_at)
+
+
+def release(record):
+    """Forget a key whose request failed, so a retry runs again"""
+    logger.info("Releasing Idempotency-Key %s after a failed %s request", record.key, record.endpoint)
+    _held(record).delete()
+
+
+def purge_expired_keys():
+    """Delete keys past their expiry"""
+    from .models import IdempotencyKey
+
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def idempotent(endpoint):
+    """
+    Decorator for a view's post() method. Requests without an
+    Idempotency-Key header are handled as before.
+    """
+    def decorator(handler):
+        if asyncio.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_wrapper(view, request, *args, **kwargs):
+                if not request.headers.get(HEADER):
+                    return await handler(view, request, *args, **kwargs)
+
+                response, claim, waiting_pk = await sync_to_async(begin)(request, endpoint)
+                if response is not None:
+                    return response
+                if claim is None:
+                    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+                    while claim is None:
+                        if time.monotonic() >= deadline:
+                            return _conflict()
+                        await asyncio.sleep(POLL_INTERVAL)
+                        response, claim = await sync_to_async(poll)(waiting_pk)
+                        if response is not None:
+                            return response
+
+                try:
+                    response = await handler(view, request, *args, **kwargs)
+                except BaseException:
+                    await sync_to_async(release)(claim)
+                    raise
+                return await sync_to_async(finish)(view, claim, response)
+            return async_wrapper
+
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            if not request.headers.get(HEADER):
+                return handler(view, request, *args, **kwargs)
+
+            response, claim, waiting_pk = begin(request, endpoint)
+            if response is not None:
+                return response
+            if claim is None:
+                # Another request holds the key: wait briefly, as the wait holds this worker
+                response, claim = wait(waiting_pk, settings.IDEMPOTENCY_SYNC_WAIT_TIMEOUT)
+                if response is not None:
+                    return response
+
+            try:
+                response = handler(view, request, *args, **kwargs)
+            except BaseException:
+                release(claim)
+                raise
+            return finish(view, claim, response)
+        return wrapper
+    return decorator
@@ -0,0 +1,51 @@
+"""
+Time-ordered identifiers.
+
+`uuid7()` makes RFC 9562 version 7 UUIDs: a 48-bit Unix timestamp in
+milliseconds, a 12-bit counter and 62 random bits. Ids made later sort
+later, so new rows are appended at the right edge of the primary key index
+instead of landing on random pages of it. Their string form is an ordinary
+UUID, so rows keyed by uuid4 before the switch keep their ids.
+
+`new_request_id()` makes VTPass request_ids, which VTPass requires to start
+with the current Africa/Lagos date and time as YYYYMMDDHHII.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+import secrets
+import threading
+import time
+import uuid
+
+# Africa/Lagos is UTC+1 all year round
+LAGOS = dt_timezone(timedelta(hours=1), 'Africa/Lagos')
+
+_COUNTER_MAX = 0xFFF
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """A UUIDv7; ids made in the same process never go backwards"""
+    global _last_ms, _counter
+
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            # Start each millisecond low in the counter's range, leaving room to count up
+            _last_ms, _counter = ms, secrets.randbits(11)
+        elif _counter < _COUNTER_MAX:
+            # Same millisecond, or the clock stepped back: count up from the last id
+            _counter += 1
+        else:
+            # Counter exhausted: borrow the next millisecond
+            _last_ms, _counter = _last_ms + 1, secrets.randbits(11)
+        ms, counter = _last_ms, _counter
+
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | secrets.randbits(62)
+    return uuid.UUID(int=value)
+
+
+def new_request_id():
+    """A VTPass request_id: YYYYMMDDHHII in Lagos time, then a UUIDv7's hex digits"""
+    return datetime.now(LAGOS).strftime('%Y%m%d%H%M') + uuid7().hex
@@ -0,0 +1,159 @@
+"""
+Append-only, double-entry ledger of wallet movements.
+
+Every change to a wallet balance (see users.wallet) also writes a movement:
+two LedgerEntry legs with a shared journal_id, taking `amount` from one
+account and adding it to another. Each user has an `available` and a `held`
+account; `funding` and `purchases` are the counter accounts for money
+coming in and going out:
+
+    funding   funding   -> available
+    hold      available -> held
+    release   held      -> available
+    capture   held      -> purchases
+    debit     available -> purchases   (purchases made without a hold)
+    reversal  purchases -> available
+
+So a Wallet's `balance` = available + held and its `held_balance` = held.
+
+LedgerSnapshot rows record each account's balance as of an entry id, so a
+balance is the latest snapshot plus the entries after it. Snapshots only
+cover entries older than LEDGER_SNAPSHOT_LAG, so a transaction that
+committed late with a lower id is never skipped.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+WALLET_ACCOUNTS = ('available', 'held')
+
+# (source, destination) account of each movement type
+MOVEMENTS = {
+    'opening': ('funding', 'available'),
+    'funding': ('funding', 'available'),
+    'hold': ('available', 'held'),
+    'release': ('held', 'available'),
+    'capture': ('held', 'purchases'),
+    'debit': ('available', 'purchases'),
+    'reversal': ('purchases', 'available'),
+}
+
+
+def movement(entry_type, user_id, amount, transaction_id=None):
+    """The two unsaved legs of one movement"""
+    from .models import LedgerEntry
+
+    source, destination = MOVEMENTS[entry_type]
+    amount = Decimal(str(amount))
+    journal_id = uuid.uuid4()
+    return [
+        LedgerEntry(journal_id=journal_id, user_id=user_id, transaction_id=transaction_id,
+                    account=account, entry_type=entry_type, amount=signed)
+        for account, signed in ((source, -amount), (destination, amount))
+    ]
+
+
+def record(entries):
+    """Append movements' legs in one bulk INSERT"""
+    from .models import LedgerEntry
+
+    if entries:
+        LedgerEntry.objects.bulk_create(entries)
+
+
+def account_balance(user_id, account):
+    """Balance of a user's ledger account: latest snapshot plus later entries"""
+    from .models import LedgerEntry, LedgerSnapshot
+
+    snapshot = (LedgerSnapshot.objects.filter(user_id=user_id, account=account)
+                .order_by('-last_entry_id').first())
+    base, after = (snapshot.balance, snapshot.last_entry_id) if snapshot else (Decimal('0'), 0)
+    since = LedgerEntry.objects.filter(
+        user_id=user_id, account=account, id__gt=after
+    ).aggregate(total=Sum('amount'))['total']
+    return base + (since or Decimal('0'))
+
+
+def wallet_balances(user_id):
+    """{'available': ..., 'held': ...} for a user, from the ledger"""
+    return {account: account_balance(user_id, account) for account in WALLET_ACCOUNTS}
+
+
+def take_snapshots():
+    """
+    Snapshot every wallet account with entries since the last pass.
+    Returns the number of snapshots written.
+    """
+    from .models import LedgerEntry, LedgerSnapshot
+
+    cutoff = timezone.now() - timedelta(seconds=settings.LEDGER_SNAPSHOT_LAG)
+    mark = LedgerEntry.objects.filter(created_at__lt=cutoff).aggregate(mark=Max('id'))['mark']
+    previous_mark = LedgerSnapshot.objects.aggregate(mark=Max('last_entry_id'))['mark'] or 0
+    if mark is None or mark <= previous_mark:
+        return 0
+
+    # One grouped query for everything that moved since the last pass
+    changes = (
+        LedgerEntry.objects
+        .filter(id__gt=previous_mark, id__lte=mark, account__in=WALLET_ACCOUNTS)
+        .values('user_id', 'account').annotate(total=Sum('amount')).order_by()
+    )
+    deltas = {(row['user_id'], row['account']): row['total'] for row in changes}
+    if not deltas:
+        return 0
+
+    latest = defaultdict(lambda: Decimal('0'))
+    for snapshot in (LedgerSnapshot.objects
+                     .filter(user_id__in={user_id for user_id, _ in deltas})
+                     .order_by('user_id', 'account', 'last_entry_id')):
+        # Ordered oldest first, so the newest snapshot of each account wins
+        latest[(snapshot.user_id, snapshot.account)] = snapshot.balance
+
+    with db_transaction.atomic():
+        LedgerSnapshot.objects.bulk_create([
+            LedgerSnapshot(user_id=user_id, account=account,
+                           balance=latest[(user_id, account)] + total, last_entry_id=mark)
+            for (user_id, account), total in deltas.items()
+        ], batch_size=1000)
+    logger.info("Wrote %d ledger snapshots up to entry %d", len(deltas), mark)
+    return len(deltas)
+
+
+def run_snapshots(interval=None, once=False):
+    """Take snapshots every `interval` seconds until interrupted"""
+    interval = interval if interval is not None else settings.LEDGER_SNAPSHOT_INTERVAL
+    while True:
+        written = take_snapshots()
+        if once:
+            return written
+        time.sleep(interval)
+
+
+def find_mismatches(user_ids=None):
+    """(user_id, column, stored, ledger) for wallets whose balance columns disagree with the ledger"""
+    from .models import Wallet
+
+    wallets = Wallet.objects.all()
+    if user_ids is not None:
+        wallets = wallets.filter(user_id__in=user_ids)
+    mismatches = []
+    for wallet in wallets.iterator():
+        balances = wallet_balances(wallet.user_id)
+        expected = {
+            'balance': balances['available'] + balances['held'],
+            'held_balance': balances['held'],
+        }
+        for column, ledger_value in expected.items():
+            stored = Decimal(str(getattr(wallet, column)))
+            if stored != ledger_value:
+                mismatches.append((wallet.user_id, column, stored, ledger_value))
+    return mismatches
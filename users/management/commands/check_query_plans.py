@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.query_plans import check_plans
+
+
+class Command(BaseCommand):
+    help = ("EXPLAIN the hot VTPassTransaction queries on a seeded dataset (rolled back afterwards) "
+            "and fail if any of them scans a whole table or loses its index order")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help="Transactions to seed (default 20000)")
+        parser.add_argument('--users', type=int, default=200, help="Users to spread them over (default 200)")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the dataset (default 0)")
+        parser.add_argument('--show-plans', action='store_true', help="Print every plan, not only failing ones")
+
+    def handle(self, *args, **options):
+        try:
+            results = check_plans(rows=options['rows'], users=options['users'], seed_value=options['seed'])
+        except NotImplementedError as e:
+            raise CommandError(str(e))
+
+        failures = 0
+        for name, plan, problems in results:
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {name}: {'; '.join(problems)}"))
+            else:
+                self.stdout.write(f"ok   {name}")
+            if problems or options['show_plans']:
+                self.stdout.write(f"{plan}\n")
+
+        if failures:
+            self.stdout.write(self.style.ERROR(f"{failures} of {len(results)} queries have a bad plan"))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS(f"All {len(results)} queries use an index"))
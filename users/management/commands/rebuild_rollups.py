@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from users.rollups import find_mismatches, rebuild
+
+
+class Command(BaseCommand):
+    help = "Backfill or repair the dashboard's spending rollups from the successful transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Users rebuilt per database transaction (default 500)")
+        parser.add_argument('--check', action='store_true',
+                            help="Only report rollups that disagree with the transactions, changing nothing")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = find_mismatches(batch_size=options['batch_size'])
+            for user_id, period, transaction_type, (total, count), (expected_total, expected_count) in mismatches:
+                self.stdout.write(self.style.ERROR(
+                    f"{user_id} {period} {transaction_type}: stored {total} ({count}), "
+                    f"transactions {expected_total} ({expected_count})"
+                ))
+            if mismatches:
+                raise SystemExit(1)
+            self.stdout.write(self.style.SUCCESS("All spending rollups match the transactions"))
+            return
+
+        fixed = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {fixed} spending rollups"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from users.reconcile import run_reconciler
+
+
+class Command(BaseCommand):
+    help = "Requery pending VTPass transactions and finalize the ones VTPass has completed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Transactions leased per batch (default VTPASS_RECONCILE_BATCH_SIZE)")
+        parser.add_argument('--concurrency', type=int, help="Concurrent requeries (default VTPASS_RECONCILE_CONCURRENCY)")
+        parser.add_argument('--rate-limit', type=float, help="Max requeries per second (default VTPASS_RECONCILE_RATE_LIMIT)")
+        parser.add_argument('--interval', type=float, help="Seconds between passes once caught up (default VTPASS_RECONCILE_INTERVAL)")
+        parser.add_argument('--once', action='store_true', help="Reconcile everything that is due and exit")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling pending VTPass transactions...")
+        try:
+            totals = run_reconciler(
+                interval=options['interval'],
+                once=options['once'],
+                batch_size=options['batch_size'],
+                concurrency=options['concurrency'],
+                rate_limit=options['rate_limit'],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {totals.get('checked', 0)} transactions: "
+            f"{totals.get('successful', 0)} successful, {totals.get('failed', 0)} failed"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from users.idempotency import purge_expired_keys
+from users.tasks import TASK_HANDLERS, purge_finished_tasks, run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks (purchases, retries, requeries)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help="Tasks run at once by this process (default TASK_CONCURRENCY)")
+        parser.add_argument('--batch-size', type=int, help="Tasks claimed per poll (default TASK_BATCH_SIZE)")
+        parser.add_argument('--poll-interval', type=float, help="Seconds between polls when idle (default TASK_POLL_INTERVAL)")
+        parser.add_argument('--task', action='append', choices=sorted(TASK_HANDLERS), dest='names',
+                            help="Only run these tasks (repeatable)")
+        parser.add_argument('--once', action='store_true', help="Run the tasks that are due and exit")
+
+    def handle(self, *args, **options):
+        purged = purge_finished_tasks()
+        if purged:
+            self.stdout.write(f"Purged {purged} finished tasks")
+        expired = purge_expired_keys()
+        if expired:
+            self.stdout.write(f"Purged {expired} expired idempotency keys")
+
+        self.stdout.write("Running background tasks...")
+        try:
+            processed = run_worker(
+                concurrency=options['concurrency'],
+                batch_size=options['batch_size'],
+                poll_interval=options['poll_interval'],
+                names=options['names'],
+                once=options['once'],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Ran {processed} tasks"))
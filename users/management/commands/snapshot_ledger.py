@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from users.ledger import find_mismatches, run_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot wallet ledger balances, and optionally check them against the wallet balance columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help="Seconds between snapshot passes (default LEDGER_SNAPSHOT_INTERVAL)")
+        parser.add_argument('--once', action='store_true', help="Take one snapshot pass and exit")
+        parser.add_argument('--verify', action='store_true',
+                            help="Take one pass, then report wallets whose balance columns disagree with the ledger")
+
+    def handle(self, *args, **options):
+        if not options['once'] and not options['verify']:
+            self.stdout.write("Taking ledger snapshots...")
+            try:
+                run_snapshots(interval=options['interval'])
+            except KeyboardInterrupt:
+                self.stdout.write("Stopped")
+            return
+
+        written = run_snapshots(once=True)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} snapshots"))
+
+        if options['verify']:
+            mismatches = find_mismatches()
+            for user_id, column, stored, ledger_value in mismatches:
+                self.stdout.write(self.style.ERROR(f"{user_id} {column}: stored {stored}, ledger {ledger_value}"))
+            if mismatches:
+                raise SystemExit(1)
+            self.stdout.write(self.style.SUCCESS("All wallet balances match the ledger"))
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_has_pin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vtpasstransaction',
+            name='next_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='VTPassTransactionAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_number', models.PositiveIntegerField()),
+                ('request_id', models.CharField(max_length=100)),
+                ('request_data', models.JSONField()),
+                ('response_code', models.CharField(blank=True, max_length=20, null=True)),
+                ('response_data', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='users.vtpasstransaction')),
+            ],
+            options={
+                'ordering': ['attempt_number'],
+                'unique_together': {('transaction', 'attempt_number')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_vtpasstransaction_retries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VTPassPurchaseOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_data', models.JSONField()),
+                ('auto_retry', models.BooleanField(default=False)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('claimed_until', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='users.vtpasstransaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['processed_at', 'created_at'], name='outbox_unprocessed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_backgroundtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vtpasstransaction',
+            name='last_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='vtpasstransaction',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['last_checked_at', 'created_at'], name='txn_pending_reconcile_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_vtpasstransaction_last_checked_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VTPassCallback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=20)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('batch_id', models.UUIDField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['received_at'], name='callback_unprocessed_idx')],
+                'unique_together': {('request_id', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_vtpasscallback'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vtpasstransaction',
+            index=models.Index(fields=['user', 'updated_at'], name='txn_user_updated_idx'),
+        ),
+    ]
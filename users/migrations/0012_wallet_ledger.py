@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_wallet_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('journal_id', models.UUIDField()),
+                ('account', models.CharField(choices=[('available', 'Available'), ('held', 'Held'), ('funding', 'Funding'), ('purchases', 'Purchases')], max_length=20)),
+                ('entry_type', models.CharField(choices=[('opening', 'Opening balance'), ('funding', 'Funding'), ('hold', 'Hold'), ('release', 'Hold release'), ('capture', 'Hold capture'), ('debit', 'Direct debit'), ('reversal', 'Reversal')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='users.vtpasstransaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'account', 'id'], name='ledger_user_account_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('available', 'Available'), ('held', 'Held'), ('funding', 'Funding'), ('purchases', 'Purchases')], max_length=20)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'account', '-last_entry_id'], name='ledger_snapshot_latest_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:50
+
+import uuid
+
+from django.db import migrations
+
+
+def record_opening_balances(apps, schema_editor):
+    """Start the ledger from the wallet balances that exist today"""
+    User = apps.get_model('users', 'User')
+    VTPassTransaction = apps.get_model('users', 'VTPassTransaction')
+    LedgerEntry = apps.get_model('users', 'LedgerEntry')
+
+    def legs(entry_type, user_id, amount, source, destination, transaction_id=None):
+        journal_id = uuid.uuid4()
+        return [
+            LedgerEntry(journal_id=journal_id, user_id=user_id, transaction_id=transaction_id,
+                        account=account, entry_type=entry_type, amount=signed)
+            for account, signed in ((source, -amount), (destination, amount))
+        ]
+
+    entries = []
+    for user_id, balance in User.objects.exclude(vtpass_balance=0).values_list('pk', 'vtpass_balance').iterator():
+        entries += legs('opening', user_id, balance, 'funding', 'available')
+    held = VTPassTransaction.objects.filter(held_amount__isnull=False).values_list('pk', 'user_id', 'held_amount')
+    for transaction_id, user_id, amount in held.iterator():
+        entries += legs('hold', user_id, amount, 'available', 'held', transaction_id)
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_wallet_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
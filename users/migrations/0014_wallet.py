@@ -0,0 +1,75 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+WALLET_FIELDS = {
+    'balance': 'vtpass_balance',
+    'held_balance': 'vtpass_held_balance',
+    'account_status': 'account_status',
+    'pin': 'pin',
+    'has_pin': 'has_pin',
+}
+
+
+def create_wallets(apps, schema_editor):
+    """Move each user's balances, status and PIN to their new wallet row"""
+    User = apps.get_model('users', 'User')
+    Wallet = apps.get_model('users', 'Wallet')
+    users = User.objects.values('pk', *WALLET_FIELDS.values())
+    Wallet.objects.bulk_create(
+        (Wallet(user_id=row['pk'], **{field: row[column] for field, column in WALLET_FIELDS.items()})
+         for row in users.iterator()),
+        batch_size=1000,
+    )
+
+
+def restore_user_columns(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Wallet = apps.get_model('users', 'Wallet')
+    for wallet in Wallet.objects.iterator():
+        User.objects.filter(pk=wallet.user_id).update(
+            **{column: getattr(wallet, field) for field, column in WALLET_FIELDS.items()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_ledger_opening_balances'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Wallet',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='wallet', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('held_balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('account_status', models.CharField(choices=[('active', 'Active'), ('suspended', 'Suspended'), ('inactive', 'Inactive')], default='active', max_length=20)),
+                ('pin', models.CharField(blank=True, max_length=6, null=True)),
+                ('has_pin', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(create_wallets, restore_user_columns),
+        migrations.RemoveField(
+            model_name='user',
+            name='account_status',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='has_pin',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='pin',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='vtpass_balance',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='vtpass_held_balance',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:56
+
+import users.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_wallet'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=models.UUIDField(default=users.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='vtpasstransaction',
+            name='id',
+            field=models.UUIDField(default=users.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
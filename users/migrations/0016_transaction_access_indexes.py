@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_time_ordered_ids'),
+    ]
+
+    operations = [
+        # Build the composite indexes before dropping the user-only one they replace
+        migrations.AddIndex(
+            model_name='vtpasstransaction',
+            index=models.Index(fields=['user', 'created_at'], name='txn_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vtpasstransaction',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='txn_user_status_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='vtpasstransaction',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='vtpasstransactionattempt',
+            name='request_id',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_transaction_access_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vtpasstransaction',
+            name='txn_user_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='vtpasstransaction',
+            name='txn_user_status_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='vtpasstransaction',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='txn_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vtpasstransaction',
+            index=models.Index(fields=['user', 'status', 'created_at', 'id'], name='txn_user_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vtpasstransaction',
+            index=models.Index(fields=['user', 'transaction_type', 'created_at', 'id'], name='txn_user_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vtpasstransaction',
+            index=models.Index(fields=['user', 'service_id', 'created_at', 'id'], name='txn_user_service_created_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_idempotency_key_lease'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vtpasstransaction',
+            name='txn_user_updated_idx',
+        ),
+        migrations.AddIndex(
+            model_name='vtpasstransaction',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='txn_user_updated_idx'),
+        ),
+    ]
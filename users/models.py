@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-import uuid
+from django.utils import timezone
+
+from .ids import uuid7
 
 
 class User(AbstractUser):
@@ -8,29 +10,21 @@ class User(AbstractUser):
     Custom user model that extends Django's AbstractUser and includes
     additional fields for VTPass integration.
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)  # Time-ordered, see users.ids
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     date_of_birth = models.DateField(blank=True, null=True)
     address = models.TextField(blank=True, null=True)
     state = models.CharField(max_length=100, blank=True, null=True)
-    pin = models.CharField(max_length=6, blank=True, null=True)
     
     # VTPass related fields
     vtpass_account_id = models.CharField(max_length=100, blank=True, null=True)
-    vtpass_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     preferred_network = models.CharField(max_length=50, blank=True, null=True)
     bank_name = models.CharField(max_length=100, blank=True, null=True)
     account_number = models.CharField(max_length=20, blank=True, null=True)
     account_name = models.CharField(max_length=200, blank=True, null=True)
     bvn = models.CharField(max_length=20, blank=True, null=True)
     occupation = models.CharField(max_length=100, blank=True, null=True)
-    has_pin = models.BooleanField(default=False)
-    account_status = models.CharField(max_length=20, default='active', choices=[
-        ('active', 'Active'),
-        ('suspended', 'Suspended'),
-        ('inactive', 'Inactive')
-    ])
     
     # Make email the username field
     USERNAME_FIELD = 'email'
@@ -51,12 +45,34 @@ class User(AbstractUser):
         return 1
 
 
+class Wallet(models.Model):
+    """
+    The frequently written state of a user's account: balances, status and PIN.
+    Kept out of the wide User row, so balance updates lock a narrow row and
+    don't contend with profile edits.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='wallet')
+    balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    held_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)  # Reserved by purchases awaiting VTPass; spendable = balance - held
+    account_status = models.CharField(max_length=20, default='active', choices=[
+        ('active', 'Active'),
+        ('suspended', 'Suspended'),
+        ('inactive', 'Inactive')
+    ])
+    pin = models.CharField(max_length=6, blank=True, null=True)
+    has_pin = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"Wallet of {self.user_id}"
+
+
 class VTPassTransaction(models.Model):
     """
     Model to store VTPass transactions for each user
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)  # Time-ordered, see users.ids
+    # Not indexed on its own: the composite indexes below all lead with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions', db_index=False)
     transaction_type = models.CharField(max_length=50)  # e.g., 'airtime', 'data', 'electricity', etc.
     service_id = models.CharField(max_length=50)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -64,10 +80,217 @@ class VTPassTransaction(models.Model):
     email = models.EmailField(blank=True, null=True)
     request_id = models.CharField(max_length=100, unique=True)  # VTPass request ID
     vtpass_reference = models.CharField(max_length=100, blank=True, null=True)  # VTPass reference
-    status = models.CharField(max_length=20, default='pending')  # pending, successful, failed
+    status = models.CharField(max_length=20, default='pending')  # pending, successful, failed, reversed
     response_data = models.JSONField(blank=True, null=True)  # Store the complete response from VTPass
+    next_retry_at = models.DateTimeField(blank=True, null=True)  # When the next background retry is due
+    last_checked_at = models.DateTimeField(blank=True, null=True)  # Last reconciler requery; leases the row until the next recheck
+    held_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # Wallet hold placed for this purchase until it is captured or released
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Partial index: the reconciler only ever scans pending rows
+            models.Index(fields=['last_checked_at', 'created_at'], name='txn_pending_reconcile_idx',
+                         condition=models.Q(status='pending')),
+            # Change feed for the status stream: a user's rows by last change
+            models.Index(fields=['user', 'updated_at', 'id'], name='txn_user_updated_idx'),
+            # Transaction history pages, keyed on (created_at, id), and recent transactions
+            models.Index(fields=['user', 'created_at', 'id'], name='txn_user_created_idx'),
+            # History filtered by status, and dashboard spending over a date range
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='txn_user_status_created_idx'),
+            # History filtered by type or by service
+            models.Index(fields=['user', 'transaction_type', 'created_at', 'id'], name='txn_user_type_created_idx'),
+            models.Index(fields=['user', 'service_id', 'created_at', 'id'], name='txn_user_service_created_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.email} - {self.transaction_type} - {self.amount}"
+
+
+class VTPassTransactionAttempt(models.Model):
+    """
+    Model to record each VTPass `pay` call made for a transaction,
+    including background retries
+    """
+    transaction = models.ForeignKey(VTPassTransaction, on_delete=models.CASCADE, related_name='attempts')
+    attempt_number = models.PositiveIntegerField()
+    request_id = models.CharField(max_length=100, db_index=True)  # request_id sent to VTPass for this attempt; callbacks are matched on it
+    request_data = models.JSONField()  # Payload sent to VTPass, reused for retries
+    response_code = models.CharField(max_length=20, blank=True, null=True)
+    response_data = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['attempt_number']
+        unique_together = ('transaction', 'attempt_number')
+    
+    def __str__(self):
+        return f"{self.transaction.request_id} - attempt {self.attempt_number}"
+
+
+
+class BackgroundTask(models.Model):
+    """
+    Unit of background work run by `manage.py run_tasks`.
+    Enqueued in the caller's database transaction, so it only runs if that commits.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)  # Key in users.tasks.TASK_HANDLERS
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)  # Times a worker has claimed this task
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)  # Not claimed before this time
+    locked_until = models.DateTimeField(blank=True, null=True)  # Visibility timeout of a running task
+    locked_by = models.CharField(max_length=100, blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='task_claim_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} - {self.status}"
+
+
+class VTPassCallback(models.Model):
+    """
+    Transaction update pushed by VTPass to the webhook endpoint.
+    Unique per (request_id, status), so replayed callbacks are stored once.
+    """
+    request_id = models.CharField(max_length=100)  # request_id VTPass knows the purchase by
+    status = models.CharField(max_length=20)  # Delivery status reported, e.g. delivered or failed
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    batch_id = models.UUIDField(blank=True, null=True)  # Set when a worker claims the callback
+    processed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        unique_together = ('request_id', 'status')
+        indexes = [
+            models.Index(fields=['received_at'], name='callback_unprocessed_idx',
+                         condition=models.Q(processed_at__isnull=True)),
+        ]
+    
+    def __str__(self):
+        return f"{self.request_id} - {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a request made with an Idempotency-Key header.
+    Holds the rendered response, so retries with the same key get the same bytes.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=50)  # e.g. purchase, fund-wallet
+    request_hash = models.CharField(max_length=64)  # SHA-256 of the request body
+    status = models.CharField(max_length=20, default='in_progress', choices=[
+        ('in_progress', 'In progress'),
+        ('completed', 'Completed'),
+    ])
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_headers = models.JSONField(blank=True, null=True)
+    response_body = models.BinaryField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(default=timezone.now)  # Start of the current holder's lease, see users.idempotency
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('user', 'key')
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.endpoint} {self.key} - {self.status}"
+
+
+class LedgerEntry(models.Model):
+    """
+    One leg of a wallet movement. Append-only: entries are never updated or deleted.
+    Every movement writes two legs with the same journal_id whose amounts sum to zero.
+    """
+    ACCOUNT_CHOICES = [
+        ('available', 'Available'),  # Spendable wallet funds
+        ('held', 'Held'),  # Wallet funds reserved by pending purchases
+        ('funding', 'Funding'),  # Counter account for money paid into wallets
+        ('purchases', 'Purchases'),  # Counter account for money spent with VTPass
+    ]
+    ENTRY_TYPE_CHOICES = [
+        ('opening', 'Opening balance'),
+        ('funding', 'Funding'),
+        ('hold', 'Hold'),
+        ('release', 'Hold release'),
+        ('capture', 'Hold capture'),
+        ('debit', 'Direct debit'),
+        ('reversal', 'Reversal'),
+    ]
+    id = models.BigAutoField(primary_key=True)
+    journal_id = models.UUIDField()  # Shared by the legs of one movement
+    user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='ledger_entries')
+    transaction = models.ForeignKey(VTPassTransaction, on_delete=models.PROTECT, blank=True, null=True,
+                                    related_name='ledger_entries')
+    account = models.CharField(max_length=20, choices=ACCOUNT_CHOICES)
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # Signed change to the account
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # Balance since snapshot and wallet history: a user's entries by id
+            models.Index(fields=['user', 'account', 'id'], name='ledger_user_account_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.entry_type} {self.account} {self.amount}"
+
+
+class LedgerSnapshot(models.Model):
+    """Balance of one user's ledger account as of entry `last_entry_id`"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_snapshots')
+    account = models.CharField(max_length=20, choices=LedgerEntry.ACCOUNT_CHOICES)
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'account', '-last_entry_id'], name='ledger_snapshot_latest_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.account} {self.balance} @ {self.last_entry_id}"
+
+
+class SpendingRollup(models.Model):
+    """
+    Total and count of a user's successful transactions of one type over one
+    period: a calendar month ('YYYY-MM') or all time ('all'). Kept in step
+    with the transactions by users.rollups.
+    """
+    LIFETIME = 'all'
+    
+    # Not indexed on its own: the unique constraint leads with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='spending_rollups', db_index=False)
+    period = models.CharField(max_length=7)  # 'YYYY-MM' in TIME_ZONE, or 'all'
+    transaction_type = models.CharField(max_length=50)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        # Also the dashboard's lookup: a user's rows for this month and all time
+        unique_together = ('user', 'period', 'transaction_type')
+    
+    def __str__(self):
+        return f"{self.user_id} {self.period} {self.transaction_type}: {self.total} ({self.count})"
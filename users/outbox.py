@@ -0,0 +1,87 @@
+"""
+Transactional outbox for purchases made in 202 Accepted mode.
+
+The purchase view saves the VTPassTransaction and a `vtpass.purchase`
+background task in one database transaction and returns immediately. The
+task worker (`manage.py run_tasks`) calls VTPass and finalizes status and
+balance through the same code as synchronous purchases.
+"""
+from django.db import transaction as db_transaction
+import logging
+
+from .purchases import (
+    DUPLICATE_REQUEST_CODE, UNKNOWN_REQUEST_CODE, complete_purchase_attempt, delivery_status, record_attempt
+)
+from .tasks import RetryTask, enqueue
+
+logger = logging.getLogger(__name__)
+
+# Fast-fail responses that mean "not sent"; the task is retried later instead
+DEFERRED_ERROR_TYPES = ('CIRCUIT_OPEN', 'CONCURRENCY_LIMITED')
+
+# Delivery statuses a requery can finalize the transaction with
+FINAL_DELIVERY_STATUSES = ('delivered', 'failed', 'reversed')
+
+
+def enqueue_purchase(transaction, request_data, auto_retry=False):
+    """Save a new purchase transaction together with the task that sends it"""
+    with db_transaction.atomic():
+        transaction.save()
+        return enqueue('vtpass.purchase', {
+            'transaction_id': str(transaction.pk),
+            'request_data': request_data,
+            'auto_retry': bool(auto_retry),
+        })
+
+
+def process_purchase(task):
+    """Task handler: send a queued purchase to VTPass and finalize its transaction"""
+    from .models import VTPassTransaction
+    from .vtpass import VTPassService
+
+    transaction = VTPassTransaction.objects.get(pk=task.payload['transaction_id'])
+    data = task.payload['request_data']
+
+    if transaction.status != 'pending' or transaction.attempts.exists():
+        # Already sent by an earlier claim; later changes belong to retries/reconciliation
+        return
+
+    vtpass_service = VTPassService()
+    reclaimed = task.attempts > 1
+    response = None
+    if reclaimed:
+        # An earlier worker may have sent it before dying; only send again if VTPass has never seen it
+        status_response = vtpass_service.verify_transaction(data.get('request_id'))
+        _defer_if_not_called(status_response)
+        if delivery_status(status_response) in FINAL_DELIVERY_STATUSES:
+            response = status_response
+        elif status_response.get('code') != UNKNOWN_REQUEST_CODE:
+            _leave_for_reconciler(transaction, data, status_response)
+            return
+
+    if response is None:
+        response = vtpass_service.send_purchase(data)
+        _defer_if_not_called(response)
+        if reclaimed and response.get('code') == DUPLICATE_REQUEST_CODE:
+            # The earlier send reached VTPass after the requery: it is in flight, not failed
+            _leave_for_reconciler(transaction, data, response)
+            return
+
+    complete_purchase_attempt(transaction, 1, data, response, auto_retry=task.payload.get('auto_retry', False))
+
+
+def _defer_if_not_called(response):
+    if response.get('error_type') in DEFERRED_ERROR_TYPES:
+        # VTPass was never called; try again once the guard may let it through
+        raise RetryTask(max(1, response.get('retry_after') or 1), response.get('error_type'),
+                        count_attempt=False)
+
+
+def _leave_for_reconciler(transaction, data, response):
+    """
+    Record that the purchase may have been sent and keep it pending: VTPass
+    can still deliver it, so only the reconciler's requeries finalize it.
+    """
+    record_attempt(transaction, 1, data, response)
+    logger.info("Purchase %s may already be with VTPass (code %s); leaving it pending for the reconciler",
+                data.get('request_id'), response.get('code'))
@@ -0,0 +1,121 @@
+"""
+Keyset (cursor) pagination on (created_at, id), newest first.
+
+Each page is read with `WHERE (created_at, id) < cursor ORDER BY created_at
+DESC, id DESC LIMIT n`, which an index on (..., created_at, id) answers by
+reading just the rows of the page, however deep the client has scrolled.
+The cursor is the position of the last row sent, encoded as an opaque
+URL-safe string. Rows created while a client pages never shift the pages
+it hasn't read yet.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+import uuid
+
+
+def encode_cursor(created_at, pk):
+    return urlsafe_b64encode(f'{created_at.isoformat()}|{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """(created_at, id) from a cursor string, or None if it isn't one"""
+    try:
+        decoded = urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+        created_at, pk = decoded.split('|')
+        position = parse_datetime(created_at), uuid.UUID(pk)
+    except (BinasciiError, UnicodeDecodeError, ValueError):
+        return None
+    return position if position[0] is not None else None
+
+
+def after(queryset, created_at, pk):
+    """Rows that come after (created_at, pk) in newest-first order"""
+    # The created_at__lte bound lets the index range scan start at the cursor
+    return queryset.filter(Q(created_at__lt=created_at) | Q(id__lt=pk), created_at__lte=created_at)
+
+
+class KeysetPagination(BasePagination):
+    """Newest-first cursor pagination on (created_at, id)"""
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    ordering = ('-created_at', '-id')
+
+    def get_page_size(self, request):
+        try:
+            return min(max(int(request.query_params[self.page_size_query_param]), 1), self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None:
+                raise NotFound('Invalid cursor')
+            queryset = after(queryset, *position)
+
+        # One extra row tells whether there is a next page
+        rows = list(queryset[:page_size + 1])
+        self.page = rows[:page_size]
+        self.has_next = len(rows) > page_size
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        # Pages are model instances, or dicts from a .values() queryset
+        if isinstance(last, dict):
+            position = last['created_at'], last['id']
+        else:
+            position = last.created_at, last.pk
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(*position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['next', 'results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'description': 'URL of the next (older) page; null on the last page',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Position to continue from, taken from the `next` link',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Number of results per page (default {self.page_size}, at most {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
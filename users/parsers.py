@@ -0,0 +1,24 @@
+"""
+JSON parsing with orjson. Like DRF's JSONParser, it rejects NaN and
+Infinity and returns JSON numbers with a fraction as floats.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+import orjson
+
+
+class ORJSONParser(BaseParser):
+    """Drop-in for DRF's JSONParser"""
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        body = stream.read()
+        try:
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except (ValueError, LookupError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
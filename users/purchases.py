@@ -0,0 +1,254 @@
+"""
+Shared handling of VTPass purchase responses.
+
+Used by the sync and async purchase views and by background retries so a
+transaction is always finalized the same way regardless of how the VTPass
+call was made.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+import logging
+
+from .balance_cache import platform_balance
+from .retries import retry_delay, should_retry
+from .tasks import enqueue
+from .vtpass_logging import payload_logger, redacted
+from .wallet import capture_hold, release_hold
+
+logger = logging.getLogger(__name__)
+
+# Statuses that no later VTPass answer can change
+TERMINAL_STATUSES = ('successful', 'failed', 'reversed')
+
+# Requery answer for a request_id VTPass has never seen
+UNKNOWN_REQUEST_CODE = '015'
+
+# Pay answer for a request_id VTPass has already seen
+DUPLICATE_REQUEST_CODE = '009'
+
+
+def is_successful_purchase(response):
+    """Check for successful transaction: VTPass success codes include '000' and 'success'"""
+    # Also consider 'delivered' status in the transaction content
+    return (response.get('code') == 'success' or
+            response.get('code') == '000' or
+            response.get('code') == '01' or
+            (response.get('content', {}).get('transactions', {}).get('status') == 'delivered'))
+
+
+def extract_vtpass_reference(response):
+    """Get reference ID from appropriate location in response"""
+    if 'data' in response:
+        return response.get('data', {}).get('reference_id')
+    elif 'content' in response and 'transactions' in response.get('content', {}):
+        return response.get('content', {}).get('transactions', {}).get('product_name')
+    return None
+
+
+def describe_purchase_error(response, request_id):
+    """Add more context to a failed purchase response for the frontend"""
+    # Enhanced error handling for specific VTPass error codes
+    error_code = response.get('code')
+    if error_code == '016':
+        logger.warning("VTPass transaction failed with code 016. Request ID: %s", request_id)
+        payload_logger.warning("Failed purchase %s response: %s", request_id, redacted(response))
+        response['error_message'] = 'Transaction failed on the provider side. This could be due to network issues, invalid recipient number, or the service being temporarily unavailable.'
+        response['suggested_action'] = 'Please try again after a few minutes or contact support if the issue persists.'
+    elif error_code == '014':
+        logger.warning("VTPass insufficient funds error. Request ID: %s", request_id)
+        payload_logger.warning("Failed purchase %s response: %s", request_id, redacted(response))
+        response['error_message'] = 'Insufficient funds in the VTPass account.'
+        response['suggested_action'] = 'Please contact support to top up the VTPass account.'
+    elif response.get('error_type') in ('CIRCUIT_OPEN', 'CONCURRENCY_LIMITED'):
+        logger.warning("VTPass call fast-failed (%s). Request ID: %s", response.get('error_type'), request_id)
+        response['error_message'] = 'This service is temporarily unavailable. Your wallet has not been charged.'
+        response['suggested_action'] = 'Please try again in a few moments.'
+    elif error_code == '009':
+        logger.warning("VTPass duplicate request error. Request ID: %s", request_id)
+        payload_logger.warning("Failed purchase %s response: %s", request_id, redacted(response))
+        response['error_message'] = 'This appears to be a duplicate transaction request.'
+        response['suggested_action'] = 'Please check if the previous transaction was successful before trying again.'
+    else:
+        logger.warning("VTPass unknown error. Code: %s, Request ID: %s", error_code, request_id)
+        payload_logger.warning("Failed purchase %s response: %s", request_id, redacted(response))
+        response['error_message'] = 'An error occurred while processing your transaction.'
+        response['suggested_action'] = 'Please try again or contact support for assistance.'
+    return response
+
+
+def apply_purchase_response(transaction, response, request_id):
+    """
+    Update an unsaved transaction from a VTPass purchase response.
+
+    Returns True when the purchase succeeded and the user's balance should
+    be debited. The caller is responsible for saving the transaction.
+    """
+    transaction.response_data = response
+
+    if delivery_status(response) in ('pending', 'initiated'):
+        # Accepted but not delivered yet; the reconciler finalizes it later
+        transaction.status = 'pending'
+        return False
+
+    if is_successful_purchase(response):
+        transaction.status = 'successful'
+        reference = extract_vtpass_reference(response)
+        if reference is not None:
+            transaction.vtpass_reference = reference
+        return True
+
+    transaction.status = 'failed'
+    # Don't deduct balance for failed transactions
+    describe_purchase_error(response, request_id)
+    return False
+
+
+def record_attempt(transaction, attempt_number, request_data, response):
+    """Record one VTPass `pay` call made for a transaction"""
+    from .models import VTPassTransactionAttempt
+    return VTPassTransactionAttempt.objects.create(
+        transaction=transaction,
+        attempt_number=attempt_number,
+        request_id=request_data.get('request_id'),
+        request_data=request_data,
+        response_code=str(response.get('code'))[:20],
+        response_data=response
+    )
+
+
+def _still_pending(transaction):
+    """
+    Lock the transaction's row if it is still pending; call inside the atomic
+    block that finalizes it. The conditional UPDATE takes the row lock (the
+    write lock on SQLite), so only one path finalizes each transaction. When a
+    callback batch, the reconciler or a status check finalized it meanwhile,
+    reload its stored outcome and return False.
+    """
+    from .models import VTPassTransaction
+
+    if VTPassTransaction.objects.filter(pk=transaction.pk, status='pending').update(updated_at=timezone.now()):
+        return True
+    logger.info("Transaction %s was already finalized; keeping its stored outcome", transaction.request_id)
+    transaction.refresh_from_db()
+    return False
+
+
+def handle_purchase_response(transaction, response, request_id, attempt_number, auto_retry=False):
+    """
+    Finalize a transaction from a VTPass `pay` response, or leave it pending
+    and schedule a background retry when the response is retryable.
+
+    Returns True when the purchase succeeded. If another path finalized the
+    transaction first, it is reloaded and its stored outcome returned.
+    """
+    if should_retry(response, attempt_number, auto_retry):
+        delay = retry_delay(attempt_number)
+        with db_transaction.atomic():
+            if not _still_pending(transaction):
+                return transaction.status == 'successful'
+            transaction.next_retry_at = timezone.now() + timedelta(seconds=delay)
+            response['retry_scheduled'] = True
+            response['next_retry_at'] = transaction.next_retry_at.isoformat()
+            transaction.response_data = response
+            transaction.save()
+            enqueue('vtpass.retry_purchase', {'transaction_id': str(transaction.pk)}, delay=delay)
+        return False
+
+    with db_transaction.atomic():
+        if not _still_pending(transaction):
+            return transaction.status == 'successful'
+        successful = apply_purchase_response(transaction, response, request_id)
+        transaction.next_retry_at = None
+        if successful:
+            # Deduct amount from user's balance by capturing the purchase's hold
+            capture_hold(transaction)
+        elif transaction.status == 'failed':
+            release_hold(transaction)
+        transaction.save()
+    
+    if successful:
+        # The purchase moved the platform balance
+        platform_balance.invalidate()
+    return successful
+
+
+def complete_purchase_attempt(transaction, attempt_number, request_data, response, auto_retry=False):
+    """Record a `pay` attempt and apply its response to the transaction"""
+    record_attempt(transaction, attempt_number, request_data, response)
+    return handle_purchase_response(transaction, response, request_data.get('request_id'),
+                                    attempt_number, auto_retry=auto_retry)
+
+
+def delivery_status(response):
+    """The transaction status VTPass reports (e.g. delivered, pending, failed, reversed)"""
+    content = response.get('content') or {}
+    transactions = content.get('transactions') if isinstance(content, dict) else None
+    return (transactions or {}).get('status')
+
+
+def apply_requery_response(transaction, response):
+    """
+    Finalize a pending transaction from a VTPass requery response.
+
+    Only a terminal VTPass status changes the transaction: delivered debits the
+    balance like a successful purchase, failed or reversed marks it failed and
+    releases its hold. A transaction another path finalized meanwhile is
+    reloaded and left as it is.
+    Returns True when the transaction was finalized.
+    """
+    if transaction.status != 'pending':
+        return False
+
+    status = delivery_status(response)
+    if status == 'delivered' or response.get('code') == 'success':
+        return handle_purchase_response(transaction, response, transaction.request_id, attempt_number=0)
+    if status in ('failed', 'reversed'):
+        with db_transaction.atomic():
+            if not _still_pending(transaction):
+                return False
+            transaction.status = 'failed'
+            transaction.response_data = response
+            transaction.next_retry_at = None
+            release_hold(transaction)
+            transaction.save()
+        return True
+    return False
+
+
+def vtpass_request_id(transaction):
+    """The request_id of the latest VTPass `pay` call for a transaction"""
+    attempts = list(transaction.attempts.all())
+    if attempts:
+        return max(attempts, key=lambda attempt: attempt.attempt_number).request_id
+    return transaction.request_id
+
+
+def claim_status_check(transaction):
+    """
+    Decide whether a status read should requery VTPass, and claim the check.
+
+    Only pending transactions that were actually sent, have no retry queued
+    and were last checked longer ago than VTPASS_STATUS_REQUERY_AGE qualify.
+    The claim moves `last_checked_at` with a conditional update, so concurrent
+    pollers (and the reconciler) make a single requery between them.
+    """
+    from .models import VTPassTransaction
+
+    if transaction.status in TERMINAL_STATUSES or transaction.next_retry_at is not None:
+        return False
+    now = timezone.now()
+    previous_check = transaction.last_checked_at
+    if previous_check and now - previous_check < timedelta(seconds=settings.VTPASS_STATUS_REQUERY_AGE):
+        return False
+    if not transaction.attempts.exists():
+        # Not sent to VTPass yet, so there is nothing to ask about
+        return False
+
+    claimed = VTPassTransaction.objects.filter(
+        pk=transaction.pk, status='pending', last_checked_at=previous_check
+    ).update(last_checked_at=now)
+    if claimed:
+        transaction.last_checked_at = now
+    return bool(claimed)
@@ -0,0 +1,183 @@
+"""
+Query-plan regression checks for the hot VTPassTransaction access paths.
+
+`check_plans()` seeds a realistic dataset inside a database transaction,
+refreshes the planner statistics, EXPLAINs each hot query and rolls
+everything back. A query whose plan reads a watched table end to end (a
+sequential scan on Postgres, a SCAN on SQLite), or sorts rows it should
+read in index order, means an index it relies on is missing or unusable.
+
+Run it against a scratch database (`manage.py check_query_plans`); the
+seeded rows are never committed, but they do take locks while it runs.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+import random
+import re
+
+# Tables that must never be read end to end by a hot query
+WATCHED_TABLES = ('users_vtpasstransaction', 'users_vtpasstransactionattempt', 'users_spendingrollup')
+
+# Matches (table, index) for each full read of a table or of one of its indexes
+SEQUENTIAL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)()'),
+    # "SCAN t" and "SCAN t USING INDEX i" visit every row (of t or of i); indexed lookups are "SEARCH"
+    'sqlite': re.compile(r'\bSCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?'),
+}
+
+# A sort step in the plan
+SORT = {
+    'postgresql': re.compile(r'\bSort\s+\('),
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF |LAST \d+ TERMS OF )?ORDER BY'),
+}
+
+# Share of seeded transactions in each status
+STATUS_WEIGHTS = {'successful': 85, 'failed': 10, 'pending': 5}
+
+# Seeded services and their transaction types
+SERVICES = {
+    'mtn': 'airtime', 'glo': 'airtime', 'airtel': 'airtime', 'mtn-data': 'data',
+    'glo-data': 'data', 'dstv': 'tv', 'gotv': 'tv', 'ikeja-electric': 'electricity', 'waec': 'education',
+}
+
+
+def hot_queries(probe, now):
+    """
+    (name, queryset, ordered) for each hot query, filtered the way the views
+    and workers filter, for the user of the `probe` transaction. `ordered`
+    queries must read rows in index order.
+    """
+    from .filters import filter_transactions
+    from .models import SpendingRollup, VTPassTransaction
+    from .pagination import KeysetPagination, after
+    from .reconcile import due_for_requery
+    from .rollups import LIFETIME, month_period
+    from .serializers import TransactionListSerializer
+
+    user, request_id = probe.user_id, probe.request_id
+    transactions = VTPassTransaction.objects
+    mine = transactions.filter(user_id=user)
+    page = KeysetPagination.page_size + 1
+
+    def history(**params):
+        return (filter_transactions(mine, params).order_by(*KeysetPagination.ordering)
+                .values(*TransactionListSerializer.FIELDS)[:page])
+
+    return [
+        ('transaction history (UserTransactionsView)', history(), True),
+        ('transaction history, later page (UserTransactionsView)',
+         after(mine, probe.created_at, probe.pk).order_by(*KeysetPagination.ordering)[:page], True),
+        ('history by status (UserTransactionsView)', history(status='failed'), True),
+        ('history by type (UserTransactionsView)', history(transaction_type=probe.transaction_type), True),
+        ('history by service (UserTransactionsView)', history(service_id=probe.service_id), True),
+        ('history by date range (UserTransactionsView)',
+         history(date_from=(now - timedelta(days=30)).date().isoformat()), True),
+        ('recent transactions (DashboardStatsView)',
+         mine.order_by('-created_at').values(*TransactionListSerializer.FIELDS)[:5], True),
+        ('spending rollups (DashboardStatsView)', SpendingRollup.objects.filter(
+            user_id=user, period__in=(LIFETIME, month_period(now))).values_list('period', 'total'), False),
+        ('payment status (CheckPaymentStatusView)',
+         transactions.filter(request_id=request_id, user_id=user), False),
+        ('status change feed (transaction events)',
+         mine.filter(updated_at__gt=now - timedelta(minutes=5)).order_by('updated_at', 'id')[:100], True),
+        ('pending due for requery (reconciler)',
+         due_for_requery(now)[:settings.VTPASS_RECONCILE_BATCH_SIZE], False),
+        ('callback matching (VTPass webhook)',
+         transactions.filter(status='pending', next_retry_at__isnull=True,
+                             attempts__request_id__in=[request_id]).distinct(), False),
+    ]
+
+
+def seed(rows, users, rng):
+    """Insert `users` users with `rows` transactions between them, spread over the past year, and their rollups"""
+    from .models import User, VTPassTransaction, VTPassTransactionAttempt
+    from .rollups import rebuild
+
+    now = timezone.now()
+    tag = now.strftime('%Y%m%d%H%M%S%f')
+    seeded_users = User.objects.bulk_create([
+        User(username=f'plan-{tag}-{number}', email=f'plan-{tag}-{number}@example.com', password='!')
+        for number in range(users)
+    ], batch_size=1000)
+
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+    services = list(SERVICES)
+    transactions = []
+    for number in range(rows):
+        service_id = rng.choice(services)
+        transactions.append(VTPassTransaction(
+            user=rng.choice(seeded_users), transaction_type=SERVICES[service_id], service_id=service_id,
+            amount=Decimal(rng.randrange(50, 5000)), request_id=f'plan-{tag}-{number}',
+            status=rng.choices(statuses, weights)[0],
+        ))
+    VTPassTransaction.objects.bulk_create(transactions, batch_size=1000)
+
+    # created_at is set on insert, so spread it out afterwards, one UPDATE per day
+    by_day = defaultdict(list)
+    for transaction in transactions:
+        by_day[rng.randrange(365)].append(transaction.pk)
+    for days_ago, pks in by_day.items():
+        created_at = now - timedelta(days=days_ago, seconds=rng.randrange(86400))
+        VTPassTransaction.objects.filter(pk__in=pks).update(created_at=created_at, updated_at=created_at)
+
+    VTPassTransactionAttempt.objects.bulk_create([
+        VTPassTransactionAttempt(transaction=transaction, attempt_number=1,
+                                 request_id=transaction.request_id, request_data={})
+        for transaction in transactions
+    ], batch_size=1000)
+    rebuild(user_ids=[user.pk for user in seeded_users])
+    return seeded_users, transactions
+
+
+def partial_indexes():
+    """Names of the partial indexes on watched tables; reading one whole only reads the rows it covers"""
+    from .models import VTPassTransaction, VTPassTransactionAttempt
+
+    return {
+        index.name
+        for model in (VTPassTransaction, VTPassTransactionAttempt)
+        for index in model._meta.indexes if index.condition is not None
+    }
+
+
+def plan_problems(plan, ordered):
+    """What is wrong with a hot query's plan, as a list of messages"""
+    partial = partial_indexes()
+    scanned = sorted({
+        table for table, index in SEQUENTIAL_SCAN[connection.vendor].findall(plan)
+        if table in WATCHED_TABLES and index not in partial
+    })
+    problems = [f"full scan of {table}" for table in scanned]
+    if ordered and SORT[connection.vendor].search(plan):
+        problems.append("sorts rows instead of reading them in index order")
+    return problems
+
+
+def check_plans(rows=20000, users=200, seed_value=0):
+    """
+    EXPLAIN every hot query on a seeded dataset that is rolled back afterwards.
+    Returns (name, plan, problems) per query.
+    """
+    if connection.vendor not in SEQUENTIAL_SCAN:
+        raise NotImplementedError(f"Query plans can't be checked on {connection.vendor}")
+
+    rng = random.Random(seed_value)
+    results = []
+    with db_transaction.atomic():
+        seeded_users, transactions = seed(rows, users, rng)
+        with connection.cursor() as cursor:
+            for table in WATCHED_TABLES:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+        probe = transactions[len(transactions) // 2]
+        probe.refresh_from_db()
+        for name, queryset, ordered in hot_queries(probe, timezone.now()):
+            plan = queryset.explain()
+            results.append((name, plan, plan_problems(plan, ordered)))
+        db_transaction.set_rollback(True)
+    return results
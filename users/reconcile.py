@@ -0,0 +1,221 @@
+"""
+Reconciliation of pending VTPass transactions.
+
+The reconciler leases a batch of pending transactions that are old enough
+and haven't been checked recently, requeries them on a small thread pool
+under a requests-per-second limit, and applies the terminal results in bulk.
+
+Leasing sets `last_checked_at`, which hides the row from every reconciler
+until the recheck interval passes, so several nodes can run side by side
+without polling the same rows. On Postgres the lease is taken with
+SELECT ... FOR UPDATE SKIP LOCKED; elsewhere with a conditional UPDATE.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+import logging
+import threading
+import time
+
+from .balance_cache import platform_balance
+from .purchases import (
+    UNKNOWN_REQUEST_CODE, apply_requery_response, delivery_status, extract_vtpass_reference, vtpass_request_id
+)
+from .transaction_events import mark_changed
+from .wallet import settle_finalized
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket shared by the requery threads"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def due_for_requery(now):
+    """Pending transactions due for a requery at `now`, in the order they are leased"""
+    from .models import VTPassTransaction
+
+    return (
+        VTPassTransaction.objects
+        .filter(status='pending', next_retry_at__isnull=True,
+                created_at__lt=now - timedelta(seconds=settings.VTPASS_RECONCILE_MIN_AGE))
+        .filter(Q(last_checked_at__isnull=True) |
+                Q(last_checked_at__lt=now - timedelta(seconds=settings.VTPASS_RECONCILE_RECHECK_INTERVAL)))
+        .order_by(F('last_checked_at').asc(nulls_first=True), 'created_at')
+    )
+
+
+def lease_pending(batch_size=None):
+    """Lease up to `batch_size` pending transactions due for a requery"""
+    from .models import VTPassTransaction
+
+    batch_size = batch_size or settings.VTPASS_RECONCILE_BATCH_SIZE
+    now = timezone.now()
+    due = due_for_requery(now)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with db_transaction.atomic():
+            leased = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+            VTPassTransaction.objects.filter(pk__in=leased).update(last_checked_at=now)
+    else:
+        # No row locks: lease each row only if nobody leased it since we read it
+        leased = []
+        for pk, last_checked_at in due.values_list('pk', 'last_checked_at')[:batch_size]:
+            if VTPassTransaction.objects.filter(
+                pk=pk, status='pending', last_checked_at=last_checked_at
+            ).update(last_checked_at=now):
+                leased.append(pk)
+
+    return list(VTPassTransaction.objects.filter(pk__in=leased).prefetch_related('attempts'))
+
+
+def requery_all(transactions, concurrency=None, rate_limit=None):
+    """Requery transactions concurrently under the rate limit. Returns {pk: response}"""
+    from .vtpass import VTPassService
+
+    if not transactions:
+        return {}
+
+    limiter = RateLimiter(rate_limit or settings.VTPASS_RECONCILE_RATE_LIMIT)
+    vtpass_service = VTPassService()
+
+    def _requery(transaction):
+        limiter.acquire()
+        return transaction.pk, vtpass_service.verify_transaction(vtpass_request_id(transaction))
+
+    with ThreadPoolExecutor(max_workers=concurrency or settings.VTPASS_RECONCILE_CONCURRENCY,
+                            thread_name_prefix='vtpass-reconcile') as executor:
+        return dict(executor.map(_requery, transactions))
+
+
+def apply_results(transactions, responses):
+    """
+    Apply terminal requery results in bulk. Returns (successful, failed) counts.
+    Non-terminal answers leave the transaction pending until its next recheck.
+    """
+    from .models import VTPassTransaction
+
+    now = timezone.now()
+    give_up_before = now - timedelta(seconds=settings.VTPASS_RECONCILE_GIVE_UP_AFTER)
+    outcomes = {}
+    for transaction in transactions:
+        response = responses.get(transaction.pk)
+        if not response or response.get('code') == 'error':
+            continue
+        status = delivery_status(response)
+        if status == 'delivered' or response.get('code') == 'success':
+            outcomes[transaction.pk] = ('successful', response)
+        elif status in ('failed', 'reversed'):
+            outcomes[transaction.pk] = ('failed', response)
+        elif (status is None and transaction.created_at < give_up_before
+              and (not transaction.attempts.all() or response.get('code') == UNKNOWN_REQUEST_CODE)):
+            # Never sent, or sent but still unknown to VTPass long after: it can't complete any more
+            outcomes[transaction.pk] = ('failed', response)
+
+    if not outcomes:
+        return 0, 0
+
+    with db_transaction.atomic():
+        # Re-read under lock: a retry or status check may have finalized some meanwhile
+        still_pending = list(
+            VTPassTransaction.objects.select_for_update()
+            .filter(pk__in=outcomes.keys(), status='pending')
+        )
+        finalized = []
+        for transaction in still_pending:
+            status, response = outcomes[transaction.pk]
+            transaction.status = status
+            transaction.response_data = response
+            transaction.last_checked_at = now
+            transaction.updated_at = now
+            if status == 'successful':
+                reference = extract_vtpass_reference(response)
+                if reference is not None:
+                    transaction.vtpass_reference = reference
+            # The row lock keeps the hold from being settled twice
+            finalized.append((transaction, status == 'successful', transaction.held_amount))
+            transaction.held_amount = None
+
+        VTPassTransaction.objects.bulk_update(
+            still_pending,
+            ['status', 'response_data', 'vtpass_reference', 'held_amount', 'last_checked_at', 'updated_at']
+        )
+        settle_finalized(finalized)
+        # bulk_update sends no post_save, so wake status streams here
+        mark_changed(transaction.user_id for transaction in still_pending)
+
+    successful = sum(1 for t in still_pending if t.status == 'successful')
+    if successful:
+        platform_balance.invalidate()
+    return successful, len(still_pending) - successful
+
+
+def reconcile_pending(batch_size=None, concurrency=None, rate_limit=None):
+    """Run one reconciliation batch. Returns a summary dict"""
+    transactions = lease_pending(batch_size)
+    responses = requery_all(transactions, concurrency, rate_limit)
+    successful, failed = apply_results(transactions, responses)
+    if transactions:
+        logger.info("Reconciled %d pending transactions: %d successful, %d failed",
+                    len(transactions), successful, failed)
+    return {'checked': len(transactions), 'successful': successful, 'failed': failed}
+
+
+def run_reconciler(interval=None, once=False, **options):
+    """Reconcile batches until interrupted; sleep between passes once caught up"""
+    interval = interval if interval is not None else settings.VTPASS_RECONCILE_INTERVAL
+    totals = defaultdict(int)
+    while True:
+        result = reconcile_pending(**options)
+        for key, value in result.items():
+            totals[key] += value
+        if not result['checked']:
+            if once:
+                return dict(totals)
+            close_old_connections()
+            time.sleep(interval)
+
+
+def reconcile_task(task):
+    """Task handler: run one reconciliation batch"""
+    reconcile_pending()
+
+
+def requery_transaction(task):
+    """Task handler: requery one pending transaction by id"""
+    from .models import VTPassTransaction
+    from .vtpass import VTPassService
+
+    transaction = VTPassTransaction.objects.filter(
+        pk=task.payload['transaction_id'], status='pending'
+    ).first()
+    if transaction is None:
+        return
+
+    response = VTPassService().verify_transaction(vtpass_request_id(transaction))
+    if apply_requery_response(transaction, response):
+        logger.info("Requery finalized transaction %s as %s", transaction.request_id, transaction.status)
@@ -0,0 +1,70 @@
+"""
+JSON rendering with orjson.
+
+Encodes UUIDs, dates and times natively, and Decimals as fixed-point
+strings, the way serializers' DecimalFields already render money
+("1000.00"), so a view can return Decimals without converting them.
+"""
+from decimal import Decimal
+import datetime
+
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer
+import orjson
+
+CENT = Decimal('0.01')
+
+# Naive datetimes render as they are; UTC ones end in "Z", as with DRF's encoder
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def money(value):
+    """An amount as a two-place Decimal, which renders like a serializer's DecimalField"""
+    return Decimal(str(value)).quantize(CENT)
+
+
+def default(obj):
+    """Types orjson doesn't encode itself, handled as DRF's JSONEncoder does (except Decimal)"""
+    if isinstance(obj, Decimal):
+        return format(obj, 'f')
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, QuerySet):
+        return tuple(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__getitem__'):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            return list(obj)
+    if hasattr(obj, '__iter__'):
+        return tuple(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data, indent=False):
+    return orjson.dumps(data, default=default, option=OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+
+
+class ORJSONRenderer(BaseRenderer):
+    """Drop-in for DRF's JSONRenderer; `; indent=N` in the Accept header gives 2-space indentation"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = False
+        if accepted_media_type:
+            indent = 'indent' in dict(
+                param.strip().split('=', 1) for param in accepted_media_type.split(';')[1:] if '=' in param
+            )
+        return dumps(data, indent=indent)
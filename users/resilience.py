@@ -0,0 +1,252 @@
+"""
+Outbound resilience for VTPass calls.
+
+Every call is guarded by a circuit breaker and an adaptive (AIMD) limit on
+in-flight calls, kept per VTPass endpoint and, where the call names one, per
+serviceID. When VTPass or a single telco degrades, its breaker opens and its
+limit shrinks, so calls to it fail fast instead of piling up while calls to
+healthy services keep their capacity. State is kept per worker process.
+"""
+from django.conf import settings
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with half-open probing.
+
+    closed: calls flow; `failure_threshold` consecutive failures open it.
+    open: calls are rejected until `reset_timeout` seconds have passed.
+    half_open: a limited number of probe calls are let through; a success
+    closes the breaker and a failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold, reset_timeout, half_open_probes=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may be made now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self.probes_in_flight = 0
+                logger.info("Circuit %s half-open, probing", self.name)
+
+            if self.state == self.HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    return False
+                self.probes_in_flight += 1
+            return True
+
+    def record(self, failed):
+        """Record the outcome of a call that allow() let through"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                if failed:
+                    self._open()
+                else:
+                    logger.info("Circuit %s closed", self.name)
+                    self.state = self.CLOSED
+                    self.failures = 0
+                return
+
+            if not failed:
+                self.failures = 0
+                return
+
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def cancel(self):
+        """Give back a slot from allow() for a call that was never made"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def retry_after(self):
+        """Seconds until an open breaker will allow a probe"""
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def _open(self):
+        logger.warning("Circuit %s opened after %d failures", self.name, self.failures)
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD limit on in-flight calls.
+
+    Each successful, fast call raises the limit by 1/limit (about +1 per
+    round of calls); a failed or slow call halves it. Calls beyond the
+    current limit are rejected.
+    """
+
+    def __init__(self, name, initial, minimum, maximum, slow_call_seconds, backoff=0.5):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.slow_call_seconds = slow_call_seconds
+        self.backoff = backoff
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def cancel(self):
+        """Give back a slot for a call that was never made"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def release(self, failed, elapsed):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if failed or elapsed > self.slow_call_seconds:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+
+class Permit:
+    """A granted call slot; release it exactly once with the call's outcome"""
+
+    def __init__(self, guards):
+        self._guards = guards
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self, failed, service_only=False):
+        """
+        Record the call's outcome. With `service_only`, the failure is blamed
+        on the serviceID (e.g. a telco answering 016) and not the endpoint.
+        """
+        if self._released:
+            return
+        self._released = True
+        elapsed = time.monotonic() - self._started
+        for breaker, limiter in self._guards:
+            key_failed = failed and (not service_only or breaker.name.startswith('service:'))
+            breaker.record(key_failed)
+            limiter.release(key_failed, elapsed)
+
+
+class ResilienceRegistry:
+    """Holds the breaker and concurrency limit for each guarded key"""
+
+    def __init__(self):
+        self._guards = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        guard = self._guards.get(key)
+        if guard is None:
+            with self._lock:
+                guard = self._guards.get(key)
+                if guard is None:
+                    guard = (
+                        CircuitBreaker(
+                            key,
+                            failure_threshold=settings.VTPASS_BREAKER_FAILURE_THRESHOLD,
+                            reset_timeout=settings.VTPASS_BREAKER_RESET_TIMEOUT,
+                        ),
+                        AdaptiveConcurrencyLimit(
+                            key,
+                            initial=settings.VTPASS_CONCURRENCY_INITIAL,
+                            minimum=settings.VTPASS_CONCURRENCY_MIN,
+                            maximum=settings.VTPASS_CONCURRENCY_MAX,
+                            slow_call_seconds=settings.VTPASS_CONCURRENCY_SLOW_CALL,
+                        ),
+                    )
+                    self._guards[key] = guard
+        return guard
+
+    def acquire(self, keys):
+        """
+        Acquire a call slot for every key.
+        Returns (permit, None) or (None, fast_fail_response).
+        """
+        acquired = []
+        for key in keys:
+            breaker, limiter = self._get(key)
+            if not breaker.allow():
+                self._abandon(acquired)
+                return None, self._rejection(
+                    key, 'CIRCUIT_OPEN',
+                    f"VTPass {key} is temporarily unavailable. Please try again shortly.",
+                    retry_after=breaker.retry_after(),
+                )
+            if not limiter.try_acquire():
+                breaker.cancel()
+                self._abandon(acquired)
+                return None, self._rejection(
+                    key, 'CONCURRENCY_LIMITED',
+                    f"Too many in-flight requests to VTPass {key}. Please try again shortly.",
+                )
+            acquired.append((breaker, limiter))
+        return Permit(acquired), None
+
+    def snapshot(self):
+        """Current breaker state and limit for each key, for diagnostics"""
+        return {
+            key: {
+                'state': breaker.state,
+                'limit': int(limiter.limit),
+                'in_flight': limiter.in_flight,
+            }
+            for key, (breaker, limiter) in list(self._guards.items())
+        }
+
+    def _abandon(self, acquired):
+        # Release slots taken for earlier keys without counting a call outcome
+        for breaker, limiter in acquired:
+            breaker.cancel()
+            limiter.cancel()
+
+    def _rejection(self, key, error_type, description, retry_after=None):
+        logger.warning("Fast-failing VTPass call to %s: %s", key, error_type)
+        response = {
+            "code": "error",
+            "response_description": description,
+            "error_type": error_type,
+            "retry_recommended": True,
+            "data": {}
+        }
+        if retry_after is not None:
+            response['retry_after'] = round(retry_after, 1)
+        return response
+
+
+vtpass_resilience = ResilienceRegistry()
+
+
+def resilience_keys(endpoint, service_id=None):
+    """Keys guarding a call: the endpoint, plus the serviceID when there is one"""
+    keys = [f"endpoint:{endpoint}"]
+    if service_id:
+        keys.append(f"service:{service_id}")
+    return keys
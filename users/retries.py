@@ -0,0 +1,57 @@
+"""
+Background retries for VTPass purchases that fail with code 016.
+
+Instead of sleeping inside the request, the purchase is left `pending` with
+`next_retry_at` set and a `vtpass.retry_purchase` background task is queued
+for that time (see users.tasks). Delays use exponential backoff with full
+jitter. Every attempt is recorded as a VTPassTransactionAttempt so clients
+can follow progress by polling the transaction status.
+"""
+from django.conf import settings
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempt_number):
+    """Seconds to wait before the retry following `attempt_number` (full jitter)"""
+    cap = min(settings.VTPASS_RETRY_MAX_DELAY,
+              settings.VTPASS_RETRY_BASE_DELAY * (2 ** (attempt_number - 1)))
+    return random.uniform(0, cap)
+
+
+def should_retry(response, attempt_number, auto_retry):
+    """Whether a purchase response should get another background attempt"""
+    return (bool(auto_retry) and
+            response.get('code') == '016' and
+            attempt_number <= settings.VTPASS_RETRY_MAX_RETRIES)
+
+
+def run_retry(task):
+    """Task handler: make the next VTPass attempt for a pending transaction"""
+    from .models import VTPassTransaction
+    from .purchases import complete_purchase_attempt
+    from .vtpass import VTPassService
+
+    transaction_id = task.payload['transaction_id']
+
+    # Claim the retry so it runs once even if it was queued twice
+    claimed = VTPassTransaction.objects.filter(
+        pk=transaction_id, status='pending', next_retry_at__isnull=False
+    ).update(next_retry_at=None)
+    if not claimed:
+        return
+
+    transaction = VTPassTransaction.objects.get(pk=transaction_id)
+    last_attempt = transaction.attempts.order_by('-attempt_number').first()
+    attempt_number = last_attempt.attempt_number + 1
+
+    # Generate a new request_id to avoid duplicate transaction errors
+    data = dict(last_attempt.request_data)
+    base_request_id = transaction.attempts.order_by('attempt_number').first().request_id
+    data['request_id'] = f"{base_request_id}-retry-{attempt_number - 1}"
+
+    logger.info("Background retry attempt %d for transaction %s", attempt_number, transaction_id)
+    response = VTPassService().send_purchase(data)
+    complete_purchase_attempt(transaction, attempt_number, data, response, auto_retry=True)
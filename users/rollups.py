@@ -0,0 +1,200 @@
+"""
+Per-user spending rollups for the dashboard.
+
+A SpendingRollup row holds the total and count of a user's successful
+transactions of one type over one period: a calendar month, and all time.
+The rows change in the database transaction that makes a transaction
+successful or reverses it, next to its wallet update (see users.wallet), so
+the dashboard reads a few rows instead of summing the user's history.
+
+`rebuild()` recomputes the rows from the transactions, to backfill them or
+repair drift; `find_mismatches()` only reports the differences.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+LIFETIME = 'all'
+
+
+def month_period(moment):
+    """The period of the month `moment` falls in, as 'YYYY-MM' in TIME_ZONE"""
+    return timezone.localtime(moment).strftime('%Y-%m')
+
+
+def _deltas(transactions, sign):
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for transaction in transactions:
+        for period in (LIFETIME, month_period(transaction.created_at)):
+            delta = deltas[(transaction.user_id, period, transaction.transaction_type)]
+            delta[0] += sign * Decimal(str(transaction.amount))
+            delta[1] += sign
+    return deltas
+
+
+def _apply(deltas):
+    from .models import SpendingRollup
+
+    # Sorted, so finalizers touching the same rows lock them in the same order
+    for (user_id, period, transaction_type), (total, count) in sorted(deltas.items(), key=lambda item: str(item[0])):
+        rows = SpendingRollup.objects.filter(user_id=user_id, period=period, transaction_type=transaction_type)
+        if rows.update(total=F('total') + total, count=F('count') + count):
+            continue
+        try:
+            # A savepoint, so the finalizing transaction survives losing the race to create the row
+            with db_transaction.atomic():
+                SpendingRollup.objects.create(user_id=user_id, period=period, transaction_type=transaction_type,
+                                              total=total, count=count)
+        except IntegrityError:
+            rows.update(total=F('total') + total, count=F('count') + count)
+
+
+def add_successful(transactions):
+    """Count transactions that just became successful. Call inside the atomic block that finalizes them."""
+    _apply(_deltas(transactions, 1))
+
+
+def remove_successful(transactions):
+    """Uncount successful transactions that were reversed. Call inside the atomic block that reverses them."""
+    _apply(_deltas(transactions, -1))
+
+
+def _dashboard_rows(user_id, now):
+    from .models import SpendingRollup
+
+    period = month_period(now or timezone.now())
+    return period, SpendingRollup.objects.filter(
+        user_id=user_id, period__in=(LIFETIME, period)
+    ).values_list('period', 'total')
+
+
+def _spending(period, rows):
+    totals = {LIFETIME: Decimal('0'), period: Decimal('0')}
+    for row_period, total in rows:
+        totals[row_period] += total
+    return totals[period], totals[LIFETIME]
+
+
+def spending_totals(user_id, now=None):
+    """(spent this month, spent all time) by a user, from their rollups"""
+    period, rows = _dashboard_rows(user_id, now)
+    return _spending(period, rows)
+
+
+async def aspending_totals(user_id, now=None):
+    """Async variant of spending_totals()"""
+    period, rows = _dashboard_rows(user_id, now)
+    return _spending(period, [row async for row in rows])
+
+
+def expected_rollups(user_ids):
+    """{(user_id, period, transaction_type): (total, count)} summed from the users' successful transactions"""
+    from .models import VTPassTransaction
+
+    expected = defaultdict(lambda: [Decimal('0'), 0])
+    months = (
+        VTPassTransaction.objects.filter(user_id__in=user_ids, status='successful')
+        .annotate(month=TruncMonth('created_at'))
+        .values('user_id', 'transaction_type', 'month')
+        .annotate(total=Sum('amount'), count=Count('id')).order_by()
+    )
+    for row in months:
+        for period in (LIFETIME, month_period(row['month'])):
+            rollup = expected[(row['user_id'], period, row['transaction_type'])]
+            rollup[0] += Decimal(str(row['total']))
+            rollup[1] += row['count']
+    return {key: tuple(rollup) for key, rollup in expected.items()}
+
+
+def _stored_rollups(user_ids, for_update=False):
+    from .models import SpendingRollup
+
+    rows = SpendingRollup.objects.filter(user_id__in=user_ids)
+    if for_update:
+        rows = rows.select_for_update()
+    return {(row.user_id, row.period, row.transaction_type): row for row in rows}
+
+
+def _differences(expected, stored):
+    """(key, stored (total, count), expected (total, count)) for each rollup that is off"""
+    differences = []
+    for key in expected.keys() | stored.keys():
+        row = stored.get(key)
+        have = (Decimal(str(row.total)), row.count) if row is not None else (Decimal('0'), 0)
+        want = expected.get(key, (Decimal('0'), 0))
+        if have != want:
+            differences.append((key, have, want))
+    return differences
+
+
+def _user_batches(batch_size, user_ids=None):
+    from .models import User
+
+    if user_ids is not None:
+        user_ids = sorted(user_ids, key=str)
+        for start in range(0, len(user_ids), batch_size):
+            yield user_ids[start:start + batch_size]
+        return
+
+    users = User.objects.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        batch = list((users.filter(pk__gt=last) if last is not None else users)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def find_mismatches(user_ids=None, batch_size=500):
+    """(user_id, period, transaction_type, stored, expected) for every rollup that disagrees with the transactions"""
+    mismatches = []
+    for batch in _user_batches(batch_size, user_ids):
+        for key, have, want in _differences(expected_rollups(batch), _stored_rollups(batch)):
+            mismatches.append((*key, have, want))
+    return mismatches
+
+
+def rebuild(user_ids=None, batch_size=500):
+    """
+    Recompute rollups from the transactions, one batch of users at a time.
+    Returns the number of rows fixed.
+
+    Each batch locks its users' wallets first: finalizing a transaction
+    updates its wallet before its rollups, so no finalization can land
+    between reading the transactions and writing the rollups.
+    """
+    from .models import SpendingRollup, Wallet
+
+    fixed = 0
+    for batch in _user_batches(batch_size, user_ids):
+        with db_transaction.atomic():
+            list(Wallet.objects.select_for_update().filter(user_id__in=batch).order_by('user_id')
+                 .values_list('user_id', flat=True))
+            stored = _stored_rollups(batch, for_update=True)
+            differences = _differences(expected_rollups(batch), stored)
+            created, updated, emptied = [], [], []
+            for key, have, (total, count) in differences:
+                row = stored.get(key)
+                if row is None:
+                    user_id, period, transaction_type = key
+                    created.append(SpendingRollup(user_id=user_id, period=period, transaction_type=transaction_type,
+                                                  total=total, count=count))
+                elif count == 0 and total == 0:
+                    emptied.append(row.pk)
+                else:
+                    row.total, row.count = total, count
+                    updated.append(row)
+            SpendingRollup.objects.bulk_create(created, batch_size=1000)
+            SpendingRollup.objects.bulk_update(updated, ['total', 'count'], batch_size=1000)
+            SpendingRollup.objects.filter(pk__in=emptied).delete()
+        fixed += len(differences)
+    if fixed:
+        logger.info("Rebuilt %d spending rollups", fixed)
+    return fixed
@@ -2,7 +2,8 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework.validators import UniqueValidator
 from django.contrib.auth.password_validation import validate_password
-from .models import VTPassTransaction
+from datetime import timezone as dt_timezone
+from .models import LedgerEntry, VTPassTransaction, VTPassTransactionAttempt, Wallet
 
 User = get_user_model()
 
@@ -68,16 +69,21 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for retrieving user information"""
     kyc_level = serializers.ReadOnlyField()
+    # Kept on the user's Wallet row; load users with select_related('wallet')
+    vtpass_balance = serializers.DecimalField(source='wallet.balance', max_digits=10, decimal_places=2, read_only=True)
+    vtpass_held_balance = serializers.DecimalField(source='wallet.held_balance', max_digits=10, decimal_places=2,
+                                                   read_only=True)
+    account_status = serializers.CharField(source='wallet.account_status', read_only=True)
+    has_pin = serializers.BooleanField(source='wallet.has_pin', read_only=True)
     
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 
                   'phone_number', 'date_of_birth', 'address', 'state',
-                  'vtpass_account_id', 'vtpass_balance', 'preferred_network',
+                  'vtpass_account_id', 'vtpass_balance', 'vtpass_held_balance', 'preferred_network',
                   'bank_name', 'account_number', 'account_name', 'bvn', 'occupation',
                   'account_status', 'kyc_level', 'date_joined', 'has_pin')
-        read_only_fields = ('id', 'email', 'vtpass_account_id', 'vtpass_balance',
-                           'kyc_level', 'date_joined', 'has_pin')
+        read_only_fields = ('id', 'email', 'vtpass_account_id', 'kyc_level', 'date_joined')
 
 
 class UserPinSerializer(serializers.ModelSerializer):
@@ -86,7 +92,7 @@ class UserPinSerializer(serializers.ModelSerializer):
     pin_confirm = serializers.CharField(required=True, min_length=4, max_length=6)
     
     class Meta:
-        model = User
+        model = Wallet
         fields = ('pin', 'pin_confirm')
     
     def validate(self, attrs):
@@ -97,16 +103,83 @@ class UserPinSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         instance.pin = validated_data['pin']
         instance.has_pin = True
-        instance.save()
+        instance.save(update_fields=['pin', 'has_pin'])
         return instance
 
 
 class VTPassTransactionSerializer(serializers.ModelSerializer):
-    """Serializer for VTPass transactions"""
+    """
+    Serializer for VTPass transactions. The raw VTPass response
+    (response_data) is left out unless the context has expand_response=True.
+    """
     class Meta:
         model = VTPassTransaction
         fields = ('id', 'transaction_type', 'service_id', 'amount', 'phone_number',
                   'email', 'request_id', 'vtpass_reference', 'status', 
-                  'response_data', 'created_at')
+                  'response_data', 'next_retry_at', 'created_at')
         read_only_fields = ('id', 'request_id', 'vtpass_reference', 'status', 
-                           'response_data', 'created_at')
+                           'response_data', 'next_retry_at', 'created_at')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('expand_response'):
+            self.fields.pop('response_data')
+
+
+def _utc_datetime(value):
+    # Same output as DRF's DateTimeField with USE_TZ and a UTC time zone
+    return value.astimezone(dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class TransactionListSerializer(serializers.Serializer):
+    """
+    Compact, read-only transaction for lists: the fields of
+    VTPassTransactionSerializer without response_data. It serializes rows
+    from `.values(*TransactionListSerializer.FIELDS)` with one precompiled
+    converter per field, skipping DRF's per-field machinery. The declared
+    fields only describe the output for the API schema.
+    """
+    id = serializers.UUIDField(read_only=True)
+    transaction_type = serializers.CharField(read_only=True)
+    service_id = serializers.CharField(read_only=True)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    phone_number = serializers.CharField(read_only=True, allow_null=True)
+    email = serializers.EmailField(read_only=True, allow_null=True)
+    request_id = serializers.CharField(read_only=True)
+    vtpass_reference = serializers.CharField(read_only=True, allow_null=True)
+    status = serializers.CharField(read_only=True)
+    next_retry_at = serializers.DateTimeField(read_only=True, allow_null=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    
+    # (field, converter) in output order; None keeps the value as it is
+    CONVERTERS = (
+        ('id', str), ('transaction_type', None), ('service_id', None), ('amount', str),
+        ('phone_number', None), ('email', None), ('request_id', None), ('vtpass_reference', None),
+        ('status', None), ('next_retry_at', _utc_datetime), ('created_at', _utc_datetime),
+    )
+    FIELDS = tuple(field for field, _ in CONVERTERS)
+    
+    def to_representation(self, row):
+        data = {}
+        for field, convert in self.CONVERTERS:
+            value = row[field]
+            data[field] = convert(value) if convert is not None and value is not None else value
+        return data
+
+
+class VTPassTransactionAttemptSerializer(serializers.ModelSerializer):
+    """Serializer for the VTPass calls made for a transaction"""
+    class Meta:
+        model = VTPassTransactionAttempt
+        fields = ('attempt_number', 'request_id', 'response_code', 'created_at')
+        read_only_fields = fields
+
+
+class LedgerEntrySerializer(serializers.ModelSerializer):
+    """Serializer for a user's wallet ledger entries"""
+    request_id = serializers.CharField(source='transaction.request_id', default=None, read_only=True)
+    
+    class Meta:
+        model = LedgerEntry
+        fields = ('id', 'journal_id', 'account', 'entry_type', 'amount', 'request_id', 'created_at')
+        read_only_fields = fields
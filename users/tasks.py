@@ -0,0 +1,189 @@
+"""
+Durable background tasks stored in the Django database.
+
+enqueue() writes a BackgroundTask row in the caller's database transaction,
+so work is only queued if the surrounding change commits. `manage.py
+run_tasks` claims due tasks in batches and runs them on a thread pool:
+
+- On Postgres, claiming uses SELECT ... FOR UPDATE SKIP LOCKED, so workers on
+  any number of nodes never block on or double-claim the same rows.
+- Elsewhere (SQLite in development) each row is claimed with a conditional
+  UPDATE on the attempt count it was read with.
+- A claimed task is hidden for a visibility timeout; if its worker dies the
+  task is claimed again once the timeout passes.
+- A handler that raises is retried with exponential backoff and full jitter
+  until max_attempts, then marked failed. Raising RetryTask reschedules it.
+
+Handlers are listed in TASK_HANDLERS and called with the claimed task.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+import logging
+import os
+import random
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+TASK_HANDLERS = {
+    'vtpass.purchase': 'users.outbox.process_purchase',
+    'vtpass.retry_purchase': 'users.retries.run_retry',
+    'vtpass.requery': 'users.reconcile.requery_transaction',
+    'vtpass.reconcile': 'users.reconcile.reconcile_task',
+    'vtpass.apply_callbacks': 'users.webhooks.apply_callbacks_task',
+}
+
+
+class RetryTask(Exception):
+    """
+    Raised by a handler to run the task again after `delay` seconds.
+    With count_attempt=False the claim doesn't count towards max_attempts,
+    e.g. when VTPass was never called because a circuit breaker was open.
+    """
+
+    def __init__(self, delay, reason='', count_attempt=True):
+        super().__init__(reason or f"retry in {delay}s")
+        self.delay = delay
+        self.count_attempt = count_attempt
+
+
+def enqueue(name, payload, delay=0, max_attempts=None):
+    """Queue a task; call inside the database transaction it belongs to"""
+    from .models import BackgroundTask
+
+    if name not in TASK_HANDLERS:
+        raise ValueError(f"Unknown task: {name}")
+    return BackgroundTask.objects.create(
+        name=name,
+        payload=payload,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )
+
+
+def task_backoff(attempts):
+    """Seconds to wait before re-running a task that failed `attempts` times (full jitter)"""
+    cap = min(settings.TASK_RETRY_MAX_DELAY, settings.TASK_RETRY_BASE_DELAY * (2 ** (attempts - 1)))
+    return random.uniform(0, cap)
+
+
+def _claimable(now):
+    return Q(status='queued', run_after__lte=now) | Q(status='running', locked_until__lt=now)
+
+
+def claim_tasks(worker_id, batch_size, names=None):
+    """Claim up to `batch_size` due tasks for `worker_id` and return them"""
+    from .models import BackgroundTask
+
+    if batch_size <= 0:
+        return []
+
+    now = timezone.now()
+    claim = dict(
+        status='running',
+        locked_by=worker_id,
+        locked_until=now + timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT),
+        attempts=F('attempts') + 1,
+    )
+    due = BackgroundTask.objects.filter(_claimable(now))
+    if names:
+        due = due.filter(name__in=names)
+    due = due.order_by('run_after')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with db_transaction.atomic():
+            claimed = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+            BackgroundTask.objects.filter(pk__in=claimed).update(**claim)
+    else:
+        # No row locks: claim each row only if nobody claimed it since we read it
+        claimed = []
+        for pk, attempts in due.values_list('pk', 'attempts')[:batch_size]:
+            if BackgroundTask.objects.filter(_claimable(now), pk=pk, attempts=attempts).update(**claim):
+                claimed.append(pk)
+
+    return list(BackgroundTask.objects.filter(pk__in=claimed).order_by('run_after'))
+
+
+def execute_task(task):
+    """Run one claimed task and record its outcome"""
+    from .models import BackgroundTask
+
+    close_old_connections()
+    # Only update the row while this worker still holds the claim
+    owned = BackgroundTask.objects.filter(pk=task.pk, locked_by=task.locked_by, attempts=task.attempts)
+    try:
+        import_string(TASK_HANDLERS[task.name])(task)
+    except RetryTask as retry:
+        logger.info("Task %s #%s rescheduled in %ss: %s", task.name, task.pk, retry.delay, retry)
+        owned.update(
+            status='queued',
+            run_after=timezone.now() + timedelta(seconds=retry.delay),
+            locked_until=None,
+            last_error=str(retry),
+            attempts=F('attempts') if retry.count_attempt else F('attempts') - 1,
+        )
+    except Exception as e:
+        if task.attempts < task.max_attempts:
+            delay = task_backoff(task.attempts)
+            logger.warning("Task %s #%s failed (attempt %d of %d), retrying in %.1fs: %s",
+                           task.name, task.pk, task.attempts, task.max_attempts, delay, e)
+            owned.update(status='queued', run_after=timezone.now() + timedelta(seconds=delay),
+                         locked_until=None, last_error=str(e)[:2000])
+        else:
+            logger.exception("Task %s #%s failed permanently", task.name, task.pk)
+            owned.update(status='failed', locked_until=None, finished_at=timezone.now(),
+                         last_error=str(e)[:2000])
+    else:
+        owned.update(status='done', locked_until=None, finished_at=timezone.now(), last_error=None)
+    finally:
+        close_old_connections()
+
+
+def purge_finished_tasks(older_than_days=None):
+    """Delete done tasks older than the retention period"""
+    from .models import BackgroundTask
+
+    days = older_than_days if older_than_days is not None else settings.TASK_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = BackgroundTask.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def run_worker(concurrency=None, batch_size=None, poll_interval=None, names=None, once=False):
+    """
+    Claim and run tasks until interrupted. With `once`, return when no task
+    is due and none is running. Returns the number of tasks run.
+    """
+    concurrency = concurrency or settings.TASK_CONCURRENCY
+    batch_size = batch_size or settings.TASK_BATCH_SIZE
+    poll_interval = poll_interval if poll_interval is not None else settings.TASK_POLL_INTERVAL
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    processed = 0
+    running = set()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='task-worker') as executor:
+        while True:
+            running = {future for future in running if not future.done()}
+            free = concurrency - len(running)
+            claimed = claim_tasks(worker_id, min(batch_size, free), names) if free else []
+            for task in claimed:
+                running.add(executor.submit(execute_task, task))
+            processed += len(claimed)
+
+            if once and not claimed and not running:
+                return processed
+
+            if claimed and len(running) < concurrency:
+                continue
+            if running:
+                # Wake up as soon as a slot frees, or on the next poll
+                _, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            else:
+                close_old_connections()
+                time.sleep(poll_interval)
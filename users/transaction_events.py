@@ -0,0 +1,197 @@
+"""
+Change feed of a user's transactions for the status stream and long-poll.
+
+Every committed change to a VTPassTransaction bumps a per-user version in the
+Django cache. Waiting clients check that version every
+TRANSACTION_EVENTS_POLL_INTERVAL seconds and only query the database when it
+moved. With a per-process cache (LocMem) a change made by another process is
+invisible, so the database is also checked every
+TRANSACTION_EVENTS_RECHECK_INTERVAL seconds.
+
+Changes are read in (updated_at, id) order. `updated_at` is stamped before
+the change commits, so a change can commit after a later-stamped one was
+already sent. Each read therefore goes back TRANSACTION_EVENTS_OVERLAP
+seconds behind the newest change sent, and skips the changes in that window
+that were already sent. The cursor a client resumes from (the SSE event id)
+carries both: the newest `updated_at` sent and the (id, updated_at) of each
+change sent within the window.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import namedtuple
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from asgiref.sync import sync_to_async
+import asyncio
+import json
+import time
+import uuid
+
+from .serializers import VTPassTransactionSerializer
+
+# Changes sent per database read; the rest follow on the next read
+CHANGES_PER_READ = 100
+
+# Newest updated_at sent, and {(transaction id, updated_at)} sent within the overlap window behind it
+Cursor = namedtuple('Cursor', 'watermark seen')
+
+
+def version_key(user_id):
+    return f'txn-events:user:{user_id}'
+
+
+def _bump_versions(user_ids):
+    for user_id in user_ids:
+        key = version_key(user_id)
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.set(key, 1, timeout=None)
+
+
+def mark_changed(user_ids):
+    """Wake the waiting clients of these users once the current transaction commits"""
+    user_ids = set(user_ids)
+    if user_ids:
+        db_transaction.on_commit(lambda: _bump_versions(user_ids))
+
+
+def transaction_saved(sender, instance, **kwargs):
+    """post_save receiver for VTPassTransaction"""
+    mark_changed([instance.user_id])
+
+
+def format_time(value):
+    """`updated_at` as sent to clients (UTC, URL-safe)"""
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _parse_time(value):
+    try:
+        parsed = parse_datetime(value or '')
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def _overlap():
+    return timedelta(seconds=settings.TRANSACTION_EVENTS_OVERLAP)
+
+
+def format_cursor(cursor):
+    """Opaque, URL-safe string for a cursor"""
+    # Seen changes as (id hex, microseconds before the watermark), to keep Last-Event-ID short
+    seen = sorted([uuid.UUID(pk).hex, (cursor.watermark - updated_at) // timedelta(microseconds=1)]
+                  for pk, updated_at in cursor.seen)
+    payload = json.dumps({'t': format_time(cursor.watermark), 's': seen}, separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def parse_cursor(value):
+    """Cursor from its string form, or from a bare timestamp as older clients send; None if it is neither"""
+    if not value:
+        return None
+    watermark = _parse_time(value)
+    if watermark is not None:
+        return Cursor(watermark, frozenset())
+    try:
+        payload = json.loads(urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+        watermark = _parse_time(payload['t'])
+        if watermark is None:
+            return None
+        seen = frozenset(
+            (str(uuid.UUID(pk)), watermark - timedelta(microseconds=int(behind)))
+            for pk, behind in payload['s']
+        )
+    except (BinasciiError, KeyError, TypeError, ValueError):
+        return None
+    return Cursor(watermark, seen)
+
+
+def start_cursor(user_id):
+    """Cursor for changes made from now on: the changes already in the overlap window count as sent"""
+    from .models import VTPassTransaction
+
+    now = timezone.now()
+    recent = VTPassTransaction.objects.filter(user_id=user_id, updated_at__gt=now - _overlap())
+    return Cursor(now, frozenset((str(pk), updated_at) for pk, updated_at in recent.values_list('id', 'updated_at')))
+
+
+def _change(transaction):
+    return str(transaction.pk), transaction.updated_at
+
+
+def advance(cursor, transactions):
+    """The cursor once `transactions` have been sent"""
+    watermark = max([cursor.watermark, *(transaction.updated_at for transaction in transactions)])
+    horizon = watermark - _overlap()
+    seen = {change for change in cursor.seen if change[1] > horizon}
+    seen.update(_change(transaction) for transaction in transactions if transaction.updated_at > horizon)
+    return Cursor(watermark, frozenset(seen))
+
+
+def changes_since(user_id, cursor):
+    """A user's transaction changes not yet sent as of `cursor`, in (updated_at, id) order"""
+    from .models import VTPassTransaction
+
+    # Enough rows to get past the already-sent changes in the overlap window
+    window = (
+        VTPassTransaction.objects.filter(user_id=user_id, updated_at__gt=cursor.watermark - _overlap())
+        .defer('response_data').order_by('updated_at', 'id')[:CHANGES_PER_READ + len(cursor.seen)]
+    )
+    return [transaction for transaction in window if _change(transaction) not in cursor.seen][:CHANGES_PER_READ]
+
+
+async def wait_for_changes(user_id, cursor, timeout):
+    """
+    Wait up to `timeout` seconds for transaction changes not yet sent as of
+    `cursor`. Returns (transactions, new_cursor); transactions is empty on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    seen_version = object()  # Forces a database read on the first pass
+    last_read = 0.0
+    while True:
+        # Read the version before the rows, so a change made during the read bumps it again
+        version = await cache.aget(version_key(user_id))
+        now = time.monotonic()
+        if version != seen_version or now - last_read >= settings.TRANSACTION_EVENTS_RECHECK_INTERVAL:
+            seen_version, last_read = version, now
+            changed = await sync_to_async(changes_since)(user_id, cursor)
+            if changed:
+                return changed, advance(cursor, changed)
+        if now >= deadline:
+            return [], cursor
+        await asyncio.sleep(min(settings.TRANSACTION_EVENTS_POLL_INTERVAL, deadline - now))
+
+
+def serialize_change(transaction):
+    data = VTPassTransactionSerializer(transaction).data
+    data['updated_at'] = format_time(transaction.updated_at)
+    return data
+
+
+async def event_stream(user_id, cursor):
+    """Server-Sent Events for a user's transaction changes, ending after the stream max age"""
+    # Clients reconnect after 3s and resume from the last event id they received
+    yield 'retry: 3000\n\n'
+    closes_at = time.monotonic() + settings.TRANSACTION_EVENTS_STREAM_MAX_AGE
+    while time.monotonic() < closes_at:
+        timeout = min(settings.TRANSACTION_EVENTS_HEARTBEAT, max(0.0, closes_at - time.monotonic()))
+        transactions, _ = await wait_for_changes(user_id, cursor, timeout)
+        if not transactions:
+            yield ': keep-alive\n\n'
+            continue
+        for transaction in transactions:
+            # Each event's id resumes right after it
+            cursor = advance(cursor, [transaction])
+            yield (f'id: {format_cursor(cursor)}\n'
+                   f'event: transaction\n'
+                   f'data: {json.dumps(serialize_change(transaction))}\n\n')
@@ -16,10 +16,17 @@ from .views import (
     VTPassTransactionStatusView,
     UserTransactionsView,
     DashboardStatsView,
+    AsyncVTPassPurchaseView,
+    AsyncVTPassTransactionStatusView,
+    AsyncDashboardStatsView,
     UserKYCStatusView,
     UserSerializer,
     FundWalletView,
     CheckPaymentStatusView,
+    VTPassWebhookView,
+    TransactionEventStreamView,
+    TransactionChangesView,
+    WalletHistoryView,
 )
 from drf_spectacular.utils import extend_schema
 
@@ -84,8 +91,19 @@ urlpatterns = [
     path('purchase/', VTPassPurchaseView.as_view(), name='vtpass-purchase'),
     path('transaction-status/<str:request_id>/', VTPassTransactionStatusView.as_view(), name='vtpass-transaction-status'),
     path('transactions/', UserTransactionsView.as_view(), name='user-transactions'),
+    path('transactions/events/', TransactionEventStreamView.as_view(), name='transaction-events'),
+    path('transactions/changes/', TransactionChangesView.as_view(), name='transaction-changes'),
+    
+    # Async (ASGI) variants of the VTPass and dashboard endpoints
+    path('async/purchase/', AsyncVTPassPurchaseView.as_view(), name='vtpass-purchase-async'),
+    path('async/transaction-status/<str:request_id>/', AsyncVTPassTransactionStatusView.as_view(), name='vtpass-transaction-status-async'),
+    path('async/dashboard/stats/', AsyncDashboardStatsView.as_view(), name='dashboard-stats-async'),
     
     # Wallet funding endpoints
     path('fund-wallet/', FundWalletView.as_view(), name='fund-wallet'),
+    path('wallet/history/', WalletHistoryView.as_view(), name='wallet-history'),
     path('payment-status/<str:transaction_reference>/', CheckPaymentStatusView.as_view(), name='payment-status'),
+    
+    # VTPass callbacks
+    path('webhooks/vtpass/', VTPassWebhookView.as_view(), name='vtpass-webhook'),
 ]
@@ -4,27 +4,84 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from .serializers import (
     UserRegistrationSerializer, 
     UserSerializer, 
     UserPinSerializer,
-    VTPassTransactionSerializer
+    VTPassTransactionSerializer,
+    TransactionListSerializer,
+    VTPassTransactionAttemptSerializer,
+    LedgerEntrySerializer
 )
-from .models import VTPassTransaction
+from .models import LedgerEntry, VTPassTransaction, Wallet
 from .vtpass import VTPassService
+from .vtpass_async import AsyncVTPassService
+from .purchases import apply_requery_response, claim_status_check, complete_purchase_attempt, vtpass_request_id
+from .outbox import enqueue_purchase
+from .pagination import KeysetPagination
+from .filters import filter_transactions
+from .idempotency import idempotent
+from .ids import new_request_id
+from .renderers import money
+from .rollups import add_successful, aspending_totals, spending_totals
+from .wallet import credit, current_balance, place_hold, spendable_balance
+from .catalog import service_catalog, etag_matches
+from .balance_cache import platform_balance
+from .vtpass_logging import payload_logger, redacted
+from .webhooks import SIGNATURE_HEADER, callback_details, record_callback, valid_request_id, verify_signature
+from .transaction_events import (
+    event_stream, format_cursor, parse_cursor, serialize_change, start_cursor, wait_for_changes
+)
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
 from drf_spectacular.types import OpenApiTypes
-from django.db.models import Sum
-from datetime import datetime
+from django.db import transaction as db_transaction
 from dateutil.relativedelta import relativedelta
-import uuid
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
 from django.db.utils import IntegrityError
 import logging
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
 User = get_user_model()
+
+# Documented on the endpoints wrapped with @idempotent
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    name="Idempotency-Key",
+    description="Unique key for this operation; retries with the same key replay the first response "
+                "instead of repeating it",
+    required=False,
+    type=str,
+    location=OpenApiParameter.HEADER
+)
+# Documented on the transaction detail endpoints
+EXPAND_PARAMETER = OpenApiParameter(
+    name="expand",
+    description="Set to `response` to include the raw VTPass response (`response_data`) in the transaction",
+    required=False,
+    type=str,
+    location=OpenApiParameter.QUERY
+)
 logger = logging.getLogger(__name__)
 
+# Fetches the VTPass balance while DashboardStatsView reads the database
+_dashboard_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='dashboard-balance')
+
+
+def _expand_response(request):
+    """Whether the client asked for the raw VTPass response with ?expand=response"""
+    return 'response' in request.query_params.get('expand', '').split(',')
+
+
+def _profile(user):
+    """The full profile row of the authenticated user, which authentication leaves partly deferred"""
+    return User.objects.select_related('wallet').get(pk=user.pk)
+
 
 @extend_schema(
     tags=["Authentication"],
@@ -64,7 +121,7 @@ logger = logging.getLogger(__name__)
                         "last_name": {"type": "string"},
                         "phone_number": {"type": "string"},
                         "vtpass_account_id": {"type": "string"},
-                        "vtpass_balance": {"type": "number"}
+                        "vtpass_balance": {"type": "string", "format": "decimal"}
                     }
                 },
                 "tokens": {
@@ -78,7 +135,7 @@ logger = logging.getLogger(__name__)
                     "type": "object",
                     "properties": {
                         "account_id": {"type": "string"},
-                        "balance": {"type": "number"}
+                        "balance": {"type": "string", "format": "decimal"}
                     }
                 }
             }
@@ -124,7 +181,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     
     def get_object(self):
-        return self.request.user
+        return _profile(self.request.user)
 
 
 @extend_schema(
@@ -139,7 +196,8 @@ class SetPINView(generics.UpdateAPIView):
     serializer_class = UserPinSerializer
     
     def get_object(self):
-        return self.request.user
+        # The PIN lives on the wallet, so setting it doesn't rewrite the profile row
+        return Wallet.objects.get(user_id=self.request.user.pk)
     
     def update(self, request, *args, **kwargs):
         serializer = self.get_serializer(self.get_object(), data=request.data)
@@ -149,7 +207,7 @@ class SetPINView(generics.UpdateAPIView):
         return Response({
             'success': True,
             'message': 'PIN set successfully',
-            'user': UserSerializer(self.get_object()).data
+            'user': UserSerializer(_profile(request.user)).data
         }, status=status.HTTP_200_OK)
 
 
@@ -177,7 +235,7 @@ class UserKYCStatusView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        user = request.user
+        user = _profile(request.user)
         kyc_level = user.kyc_level
         
         # Determine missing fields for next level
@@ -188,7 +246,7 @@ class UserKYCStatusView(APIView):
         
         return Response({
             "kyc_level": kyc_level,
-            "account_status": user.account_status,
+            "account_status": user.wallet.account_status,
             "is_bvn_verified": bool(user.bvn),
             "requirements": {
                 "next_level": kyc_level + 1 if kyc_level < 2 else kyc_level,
@@ -211,7 +269,8 @@ class UserKYCStatusView(APIView):
                     "properties": {
                         "balance": {"type": "string", "description": "Current account balance"}
                     }
-                }
+                },
+                "snapshot_age": {"type": "number", "description": "Seconds since the balance was fetched from VTPass"}
             }
         },
         401: {"description": "Unauthorized, no valid token provided"},
@@ -223,10 +282,13 @@ class VTPassBalanceView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        vtpass_service = VTPassService()
-        balance = vtpass_service.get_user_balance()
+        # Served from the shared balance snapshot rather than a live VTPass call
+        snapshot = platform_balance.get()
+        snapshot_age = platform_balance.age(snapshot)
         
-        return Response(balance)
+        response = Response({**snapshot['response'], 'snapshot_age': round(snapshot_age, 1)})
+        response['Age'] = str(int(snapshot_age))
+        return response
 
 
 @extend_schema(
@@ -291,6 +353,7 @@ class VTPassBalanceView(APIView):
                 }
             }
         },
+        304: {"description": "Not modified, the ETag in If-None-Match is still current"},
         401: {"description": "Unauthorized, no valid token provided"},
         404: {"description": "Service type not found"},
         500: {"description": "Internal server error or VTPass service error"}
@@ -301,15 +364,142 @@ class VTPassServicesView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request, service_type):
-        vtpass_service = VTPassService()
-        services = vtpass_service.get_services(service_type)
+        # Served from the service catalog cache rather than a live VTPass call
+        entry = service_catalog.get_services(service_type)
+        
+        if etag_matches(request.headers.get('If-None-Match'), entry['etag']):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        
+        response['ETag'] = entry['etag']
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+def _validate_purchase_request(request):
+    """
+    Validate a purchase request's fields and the user's PIN.
+    Returns (error_response, None) on failure or (None, amount_decimal).
+    The balance is checked when the purchase places its wallet hold.
+    """
+    service_id = request.data.get('service_id')
+    amount = request.data.get('amount')
+    phone = request.data.get('phone')
+    email = request.data.get('email')
+    
+    # Debug logging for JAMB-related fields; the PIN is redacted
+    payload_logger.debug("Purchase request data: %s", redacted(request.data))
+    
+    if not all([service_id, amount, phone, email]):
+        return Response({
+            'message': 'Missing required fields'
+        }, status=status.HTTP_400_BAD_REQUEST), None
+    
+    # Verify PIN
+    pin = request.data.get('pin')
+    if not pin or pin != request.user.wallet.pin:
+        return Response({
+            'success': False,
+            'message': 'Invalid PIN'
+        }, status=status.HTTP_400_BAD_REQUEST), None
+    
+    # Convert amount to decimal for proper comparison
+    try:
+        amount_decimal = Decimal(str(amount))
+    except (ValueError, TypeError, InvalidOperation):
+        return Response({
+            'success': False,
+            'message': 'Invalid amount'
+        }, status=status.HTTP_400_BAD_REQUEST), None
+    
+    return None, amount_decimal
+
+
+def _insufficient_balance_response(user, amount):
+    wallet = Wallet.objects.get(user_id=user.pk)
+    return Response({
+        'success': False,
+        'message': 'Insufficient balance for this transaction',
+        'required_amount': money(amount),
+        'available_balance': money(spendable_balance(wallet))
+    }, status=status.HTTP_402_PAYMENT_REQUIRED)
+
+
+def _start_purchase(request, transaction, purchase_data):
+    """
+    Hold the purchase amount in the wallet and save the transaction, queueing
+    it in async mode. Returns the response to send right away (402, or 202 in
+    async mode), or None when the caller should now call VTPass.
+    """
+    with db_transaction.atomic():
+        if not place_hold(transaction):
+            return _insufficient_balance_response(request.user, transaction.amount)
         
-        return Response(services)
+        # In async mode the outbox worker makes the VTPass call
+        if _wants_async_purchase(request):
+            enqueue_purchase(transaction, purchase_data, auto_retry=request.data.get('auto_retry', False))
+            return _accepted_purchase_response(request, transaction)
+        
+        transaction.save()
+    return None
+
+
+def _purchase_kwargs(request, request_id):
+    """Build the VTPassService.build_purchase_data arguments from a purchase request"""
+    return dict(
+        service_id=request.data.get('service_id'),
+        variation_code=request.data.get('variation_code'),
+        amount=request.data.get('amount'),
+        phone=request.data.get('phone'),
+        email=request.data.get('email'),
+        request_id=request_id,
+        # Add all service-specific parameters, especially for JAMB
+        billersCode=request.data.get('billersCode'),
+        # Also try alternative formats that might be in the request
+        billerscode=request.data.get('billerscode'),
+        billers_code=request.data.get('billers_code')
+    )
+
+
+def _new_purchase_transaction(request, request_id):
+    """Build (unsaved) the transaction record for a purchase request"""
+    # Store the request_id VTPass gets, so duplicates and requeries match
+    return VTPassTransaction(
+        user=request.user,
+        transaction_type=request.data.get('transaction_type', 'purchase'),
+        service_id=request.data.get('service_id'),
+        amount=request.data.get('amount'),
+        phone_number=request.data.get('phone'),
+        email=request.data.get('email'),
+        request_id=request_id
+    )
+
+
+def _wants_async_purchase(request):
+    """Whether the client opted into 202 Accepted mode"""
+    prefer = request.headers.get('Prefer', '')
+    return bool(request.data.get('async_mode')) or 'respond-async' in prefer
+
+
+def _accepted_purchase_response(request, transaction):
+    """202 response pointing the client at the transaction status endpoint"""
+    status_url = request.build_absolute_uri(
+        reverse('vtpass-transaction-status', args=[transaction.request_id]))
+    return Response({
+        'message': 'Purchase accepted for processing',
+        'transaction': VTPassTransactionSerializer(transaction).data,
+        'status_url': status_url
+    }, status=status.HTTP_202_ACCEPTED, headers={
+        'Location': status_url,
+        'Preference-Applied': 'respond-async'
+    })
 
 
 @extend_schema(
     tags=["VTPass"],
     description="Purchase a service through VTPass",
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
     request={
         "type": "object",
         "properties": {
@@ -321,6 +511,7 @@ class VTPassServicesView(APIView):
             "pin": {"type": "string", "description": "User's PIN for authorization"},
             "transaction_type": {"type": "string", "description": "Type of transaction"},
             "auto_retry": {"type": "boolean", "description": "Whether to auto-retry the transaction"},
+            "async_mode": {"type": "boolean", "description": "Queue the purchase and return 202 instead of waiting for VTPass (same as the `Prefer: respond-async` header)"},
             "billersCode": {"type": "string", "description": "Biller's code for the service"},
             "billerscode": {"type": "string", "description": "Alternative biller's code for the service"},
             "billers_code": {"type": "string", "description": "Another alternative biller's code for the service"}
@@ -337,7 +528,7 @@ class VTPassServicesView(APIView):
                         "id": {"type": "string"},
                         "transaction_type": {"type": "string"},
                         "service_id": {"type": "string"},
-                        "amount": {"type": "number"},
+                        "amount": {"type": "string", "format": "decimal"},
                         "phone_number": {"type": "string"},
                         "email": {"type": "string"},
                         "request_id": {"type": "string"},
@@ -356,6 +547,7 @@ class VTPassServicesView(APIView):
                 }
             }
         },
+        202: {"description": "Purchase queued (async mode); poll status_url for the outcome"},
         400: {"description": "Bad request, invalid data or insufficient balance"},
         401: {"description": "Unauthorized, no valid token provided"},
         402: {"description": "Payment required, insufficient balance"},
@@ -366,62 +558,22 @@ class VTPassPurchaseView(APIView):
     """View for purchasing a service through VTPass"""
     permission_classes = [permissions.IsAuthenticated]
     
+    @idempotent('purchase')
     def post(self, request):
-        service_id = request.data.get('service_id')
-        variation_code = request.data.get('variation_code')
-        amount = request.data.get('amount')
-        phone = request.data.get('phone')
-        email = request.data.get('email')
-        auto_retry = request.data.get('auto_retry', False)
-        
-        # Debug logging for JAMB-related fields
-        print("=== VTPASS PURCHASE VIEW ===")
-        print(f"All request data: {request.data}")
-        print(f"billersCode: {request.data.get('billersCode')}")
-        print(f"billerscode: {request.data.get('billerscode')}")
-        print(f"billers_code: {request.data.get('billers_code')}")
-        
-        if not all([service_id, amount, phone, email]):
-            return Response({
-                'message': 'Missing required fields'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Verify PIN
-        pin = request.data.get('pin')
-        if not pin or pin != request.user.pin:
-            return Response({
-                'success': False,
-                'message': 'Invalid PIN'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Convert amount to decimal for proper comparison
-        try:
-            amount_decimal = Decimal(str(amount))
-        except (ValueError, TypeError):
-            return Response({
-                'success': False,
-                'message': 'Invalid amount'
-            }, status=status.HTTP_400_BAD_REQUEST)
-            
-        # Check if user has sufficient balance
-        if Decimal(str(request.user.vtpass_balance)) < amount_decimal:
-            return Response({
-                'success': False,
-                'message': 'Insufficient balance for this transaction',
-                'required_amount': float(amount_decimal),
-                'available_balance': float(request.user.vtpass_balance)
-            }, status=status.HTTP_402_PAYMENT_REQUIRED)
+        error_response, amount_decimal = _validate_purchase_request(request)
+        if error_response:
+            return error_response
         
         vtpass_service = VTPassService()
         
         # Get or generate request_id
         request_id = request.data.get('request_id', '')
         if not request_id:
-            request_id = str(uuid.uuid4())
+            request_id = new_request_id()
         
         # Check if a transaction with this request_id already exists
         try:
-            existing_transaction = VTPassTransaction.objects.filter(request_id=request_id).first()
+            existing_transaction = VTPassTransaction.objects.filter(request_id=request_id, user=request.user).first()
             if existing_transaction:
                 # Return the existing transaction if it exists
                 return Response({
@@ -431,87 +583,79 @@ class VTPassPurchaseView(APIView):
                 })
         except Exception as e:
             # Log the error but continue
-            logger.error(f"Error checking for existing transaction: {str(e)}")
+            logger.error("Error checking for existing transaction: %s", e)
         
-        # Create a transaction record
-        transaction_type = request.data.get('transaction_type', 'purchase')
+        # Create a transaction record in our database
+        transaction = _new_purchase_transaction(request, request_id)
+        purchase_data = vtpass_service.build_purchase_data(**_purchase_kwargs(request, request_id))
         
-        # Generate a unique request ID
-        new_request_id = f"REQ-{uuid.uuid4().hex[:10].upper()}"
+        # The hold is committed before VTPass is called, so no lock is held meanwhile
+        early_response = _start_purchase(request, transaction, purchase_data)
+        if early_response:
+            return early_response
         
-        # Create a transaction record in our database
-        transaction = VTPassTransaction.objects.create(
-            user=request.user,
-            transaction_type=transaction_type,
-            service_id=service_id,
-            amount=amount,
-            phone_number=phone,
-            email=email,
-            request_id=new_request_id
-        )
+        # Make the purchase. Code 016 retries are scheduled in the background
+        # and leave the transaction pending instead of blocking this request.
+        response = vtpass_service.send_purchase(purchase_data)
+        complete_purchase_attempt(transaction, 1, purchase_data, response,
+                                  auto_retry=request.data.get('auto_retry', False))
         
-        # Make the purchase
-        response = vtpass_service.purchase_service(
-            service_id=service_id,
-            variation_code=variation_code,
-            amount=amount,
-            phone=phone,
-            email=email,
-            request_id=request_id,
-            auto_retry=auto_retry,
-            # Add all service-specific parameters, especially for JAMB
-            billersCode=request.data.get('billersCode'),
-            # Also try alternative formats that might be in the request
-            billerscode=request.data.get('billerscode'),
-            billers_code=request.data.get('billers_code')
-        )
+        return Response({
+            'transaction': VTPassTransactionSerializer(transaction).data,
+            'response': response
+        })
+
+
+@extend_schema(
+    tags=["VTPass"],
+    description="Purchase a service through VTPass using the asyncio-native client. "
+                "Accepts the same request body and returns the same response as /purchase/.",
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
+)
+class AsyncVTPassPurchaseView(AsyncAPIView):
+    """Async variant of VTPassPurchaseView for the ASGI deployment"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @idempotent('purchase')
+    async def post(self, request):
+        error_response, amount_decimal = _validate_purchase_request(request)
+        if error_response:
+            return error_response
         
-        # Update the transaction record with the response
-        transaction.response_data = response
+        vtpass_service = AsyncVTPassService()
         
-        # Check for successful transaction: VTPass success codes include '000' and 'success'
-        # Also consider 'delivered' status in the transaction content
-        if (response.get('code') == 'success' or 
-            response.get('code') == '000' or 
-            response.get('code') == '01' or 
-            (response.get('content', {}).get('transactions', {}).get('status') == 'delivered')):
-            
-            transaction.status = 'successful'
-            # Get reference ID from appropriate location in response
-            if 'data' in response:
-                transaction.vtpass_reference = response.get('data', {}).get('reference_id')
-            elif 'content' in response and 'transactions' in response.get('content', {}):
-                transaction.vtpass_reference = response.get('content', {}).get('transactions', {}).get('product_name')
-            
-            # Deduct amount from user's balance
-            request.user.vtpass_balance = Decimal(str(request.user.vtpass_balance)) - amount_decimal
-            request.user.save()
-        else:
-            transaction.status = 'failed'
-            
-            # Enhanced error handling for specific VTPass error codes
-            error_code = response.get('code')
-            if error_code == '016':
-                logger.warning(f"VTPass transaction failed with code 016. Request ID: {request_id}, Details: {response}")
-                # Don't deduct balance for failed transactions
-                
-                # Add more context to the response for the frontend
-                response['error_message'] = 'Transaction failed on the provider side. This could be due to network issues, invalid recipient number, or the service being temporarily unavailable.'
-                response['suggested_action'] = 'Please try again after a few minutes or contact support if the issue persists.'
-            elif error_code == '014':
-                logger.warning(f"VTPass insufficient funds error. Request ID: {request_id}, Details: {response}")
-                response['error_message'] = 'Insufficient funds in the VTPass account.'
-                response['suggested_action'] = 'Please contact support to top up the VTPass account.'
-            elif error_code == '009':
-                logger.warning(f"VTPass duplicate request error. Request ID: {request_id}, Details: {response}")
-                response['error_message'] = 'This appears to be a duplicate transaction request.'
-                response['suggested_action'] = 'Please check if the previous transaction was successful before trying again.'
-            else:
-                logger.warning(f"VTPass unknown error. Code: {error_code}, Request ID: {request_id}, Details: {response}")
-                response['error_message'] = 'An error occurred while processing your transaction.'
-                response['suggested_action'] = 'Please try again or contact support for assistance.'
+        # Get or generate request_id
+        request_id = request.data.get('request_id', '')
+        if not request_id:
+            request_id = new_request_id()
         
-        transaction.save()
+        # Check if a transaction with this request_id already exists
+        try:
+            existing_transaction = await VTPassTransaction.objects.filter(request_id=request_id, user=request.user).afirst()
+            if existing_transaction:
+                return Response({
+                    'message': 'Transaction already exists',
+                    'transaction': VTPassTransactionSerializer(existing_transaction).data,
+                    'response': existing_transaction.response_data
+                })
+        except Exception as e:
+            # Log the error but continue
+            logger.error("Error checking for existing transaction: %s", e)
+        
+        # Create a transaction record in our database
+        transaction = _new_purchase_transaction(request, request_id)
+        purchase_data = vtpass_service.build_purchase_data(**_purchase_kwargs(request, request_id))
+        
+        early_response = await sync_to_async(_start_purchase)(request, transaction, purchase_data)
+        if early_response:
+            return early_response
+        
+        # Make the purchase without holding a thread for the VTPass round trip
+        response = await vtpass_service.send_purchase(purchase_data)
+        await sync_to_async(complete_purchase_attempt)(
+            transaction, 1, purchase_data, response,
+            auto_retry=request.data.get('auto_retry', False)
+        )
         
         return Response({
             'transaction': VTPassTransactionSerializer(transaction).data,
@@ -521,7 +665,9 @@ class VTPassPurchaseView(APIView):
 
 @extend_schema(
     tags=["VTPass"],
-    description="Check the status of a VTPass transaction",
+    description="Check the status of a VTPass transaction. Successful and failed transactions are "
+                "answered from the database (`source: local`); pending ones are requeried from VTPass "
+                "(`source: live`) at most once every VTPASS_STATUS_REQUERY_AGE seconds.",
     parameters=[
         OpenApiParameter(
             name="request_id",
@@ -529,7 +675,8 @@ class VTPassPurchaseView(APIView):
             required=True,
             type=str,
             location=OpenApiParameter.PATH
-        )
+        ),
+        EXPAND_PARAMETER,
     ]
 )
 class VTPassTransactionStatusView(APIView):
@@ -544,33 +691,217 @@ class VTPassTransactionStatusView(APIView):
                 'message': 'Transaction not found'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        vtpass_service = VTPassService()
-        status_response = vtpass_service.verify_transaction(request_id)
+        # Terminal and recently checked transactions are answered from the database
+        source = 'local'
+        status_response = transaction.response_data or {}
+        if claim_status_check(transaction):
+            vtpass_service = VTPassService()
+            status_response = vtpass_service.verify_transaction(vtpass_request_id(transaction))
+            apply_requery_response(transaction, status_response)
+            source = 'live'
+        
+        context = {'expand_response': _expand_response(request)}
+        return Response({
+            'transaction': VTPassTransactionSerializer(transaction, context=context).data,
+            'attempts': VTPassTransactionAttemptSerializer(transaction.attempts.all(), many=True).data,
+            'status': status_response,
+            'source': source,
+            'last_checked_at': transaction.last_checked_at
+        })
+
+
+@extend_schema(
+    tags=["VTPass"],
+    description="Check the status of a VTPass transaction using the asyncio-native client",
+    parameters=[
+        OpenApiParameter(
+            name="request_id",
+            description="Transaction request ID",
+            required=True,
+            type=str,
+            location=OpenApiParameter.PATH
+        ),
+        EXPAND_PARAMETER,
+    ]
+)
+class AsyncVTPassTransactionStatusView(AsyncAPIView):
+    """Async variant of VTPassTransactionStatusView for the ASGI deployment"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    async def get(self, request, request_id):
+        try:
+            transaction = await VTPassTransaction.objects.aget(request_id=request_id, user=request.user)
+        except VTPassTransaction.DoesNotExist:
+            return Response({
+                'message': 'Transaction not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        # Terminal and recently checked transactions are answered from the database
+        source = 'local'
+        status_response = transaction.response_data or {}
+        if await sync_to_async(claim_status_check)(transaction):
+            vtpass_service = AsyncVTPassService()
+            vtpass_id = await sync_to_async(vtpass_request_id)(transaction)
+            status_response = await vtpass_service.verify_transaction(vtpass_id)
+            await sync_to_async(apply_requery_response)(transaction, status_response)
+            source = 'live'
         
-        # Update the transaction record with the latest status
-        if status_response.get('code') == 'success':
-            transaction.status = 'successful'
-            transaction.response_data = status_response
-            transaction.save()
+        attempts = [attempt async for attempt in transaction.attempts.all()]
         
+        context = {'expand_response': _expand_response(request)}
         return Response({
-            'transaction': VTPassTransactionSerializer(transaction).data,
-            'status': status_response
+            'transaction': VTPassTransactionSerializer(transaction, context=context).data,
+            'attempts': VTPassTransactionAttemptSerializer(attempts, many=True).data,
+            'status': status_response,
+            'source': source,
+            'last_checked_at': transaction.last_checked_at
         })
 
 
 @extend_schema(
     tags=["VTPass"],
-    description="List all transactions for the current user",
-    responses={200: VTPassTransactionSerializer(many=True)}
+    description="List the current user's transactions, newest first, a page at a time. Follow the `next` "
+                "link for older transactions; it is null on the last page. Filters are combined with AND.",
+    parameters=[
+        OpenApiParameter(name="transaction_type", description="Only this transaction type, e.g. airtime",
+                         required=False, type=str, location=OpenApiParameter.QUERY),
+        OpenApiParameter(name="status", description="Only this status: pending, successful, failed or reversed",
+                         required=False, type=str, location=OpenApiParameter.QUERY),
+        OpenApiParameter(name="service_id", description="Only this VTPass service, e.g. mtn",
+                         required=False, type=str, location=OpenApiParameter.QUERY),
+        OpenApiParameter(name="date_from", description="Created on or after this day (YYYY-MM-DD)",
+                         required=False, type=OpenApiTypes.DATE, location=OpenApiParameter.QUERY),
+        OpenApiParameter(name="date_to", description="Created on or before this day (YYYY-MM-DD)",
+                         required=False, type=OpenApiTypes.DATE, location=OpenApiParameter.QUERY),
+    ],
 )
 class UserTransactionsView(generics.ListAPIView):
     """View for listing a user's transactions"""
     permission_classes = [permissions.IsAuthenticated]
-    serializer_class = VTPassTransactionSerializer
+    serializer_class = TransactionListSerializer
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return VTPassTransaction.objects.filter(user=self.request.user).order_by('-created_at')
+        # KeysetPagination orders by (created_at, id), newest first
+        transactions = filter_transactions(VTPassTransaction.objects.filter(user=self.request.user),
+                                           self.request.query_params)
+        return transactions.values(*TransactionListSerializer.FIELDS)
+
+
+async def _events_cursor(request):
+    """Resume point from Last-Event-ID or ?since=, else only changes from now on"""
+    return (parse_cursor(request.headers.get('Last-Event-ID')) or
+            parse_cursor(request.query_params.get('since')) or
+            await sync_to_async(start_cursor)(request.user.pk))
+
+
+@extend_schema(
+    tags=["VTPass"],
+    description="Stream the current user's transaction changes as Server-Sent Events (ASGI deployment). "
+                "Each `transaction` event carries the changed transaction; its id is the opaque cursor to "
+                "resume from with the Last-Event-ID header or `since`. A change can be sent again after a "
+                "reconnect, so dedupe on (id, updated_at). The stream closes after "
+                "TRANSACTION_EVENTS_STREAM_MAX_AGE seconds and clients reconnect.",
+    parameters=[
+        OpenApiParameter(
+            name="since",
+            description="Cursor to resume from; defaults to changes made after connecting",
+            required=False,
+            type=str,
+            location=OpenApiParameter.QUERY
+        )
+    ],
+    responses={200: {"description": "text/event-stream of transaction events"}}
+)
+class TransactionEventStreamView(AsyncAPIView):
+    """Server-Sent Events stream of the user's transaction status changes"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    async def get(self, request):
+        response = StreamingHttpResponse(
+            event_stream(request.user.pk, await _events_cursor(request)),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx and similar proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+@extend_schema(
+    tags=["VTPass"],
+    description="Long-poll for the current user's transaction changes. Held until a transaction "
+                "changes after `since` or the timeout passes; pass the returned cursor as `since` "
+                "on the next request.",
+    parameters=[
+        OpenApiParameter(
+            name="since",
+            description="Cursor from the previous response; defaults to changes made after the request",
+            required=False,
+            type=str,
+            location=OpenApiParameter.QUERY
+        ),
+        OpenApiParameter(
+            name="timeout",
+            description="Seconds to wait for a change (capped at TRANSACTION_EVENTS_LONG_POLL_TIMEOUT)",
+            required=False,
+            type=float,
+            location=OpenApiParameter.QUERY
+        )
+    ],
+    responses={
+        200: {
+            "type": "object",
+            "properties": {
+                "transactions": {"type": "array", "items": {"type": "object"}},
+                "cursor": {"type": "string", "description": "Pass as `since` on the next request"}
+            }
+        },
+        401: {"description": "Unauthorized, no valid token provided"}
+    }
+)
+class TransactionChangesView(AsyncAPIView):
+    """Long-poll fallback for clients that can't hold an event stream open"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    async def get(self, request):
+        max_timeout = settings.TRANSACTION_EVENTS_LONG_POLL_TIMEOUT
+        try:
+            timeout = min(max(float(request.query_params.get('timeout', max_timeout)), 0), max_timeout)
+        except ValueError:
+            timeout = max_timeout
+        
+        transactions, cursor = await wait_for_changes(request.user.pk, await _events_cursor(request), timeout)
+        return Response({
+            'transactions': [serialize_change(transaction) for transaction in transactions],
+            'cursor': format_cursor(cursor)
+        })
+
+
+def _recent_transactions(user):
+    """A user's last 5 transactions, as rows for TransactionListSerializer"""
+    return VTPassTransaction.objects.filter(
+        user=user
+    ).order_by('-created_at').values(*TransactionListSerializer.FIELDS)[:5]
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
+def _extract_balance(vtpass_balance_response):
+    """Extract balance from VTPass response"""
+    balance = money(0)
+    if isinstance(vtpass_balance_response, dict):
+        # The live API returns the balance under 'contents'
+        balance_data = vtpass_balance_response.get('data') or vtpass_balance_response.get('contents', {})
+        if isinstance(balance_data, dict):
+            balance_str = balance_data.get('balance', '0.00')
+            try:
+                balance = money(balance_str)
+            except (ArithmeticError, ValueError, TypeError):
+                balance = money(0)
+    return balance
 
 
 @extend_schema(
@@ -580,9 +911,10 @@ class UserTransactionsView(generics.ListAPIView):
         200: {
             "type": "object",
             "properties": {
-                "balance": {"type": "number", "description": "Current wallet balance"},
-                "this_month_spent": {"type": "number", "description": "Total spent in current month"},
-                "total_spent": {"type": "number", "description": "Total amount spent all time"},
+                "balance": {"type": "string", "format": "decimal", "description": "Current wallet balance"},
+                "balance_age": {"type": "number", "description": "Seconds since the balance was fetched from VTPass"},
+                "this_month_spent": {"type": "string", "format": "decimal", "description": "Total spent in current month"},
+                "total_spent": {"type": "string", "format": "decimal", "description": "Total amount spent all time"},
                 "recent_transactions": {
                     "type": "array",
                     "items": {
@@ -591,7 +923,7 @@ class UserTransactionsView(generics.ListAPIView):
                             "id": {"type": "string", "description": "Transaction ID"},
                             "transaction_type": {"type": "string", "description": "Type of transaction"},
                             "service_id": {"type": "string", "description": "Service identifier"},
-                            "amount": {"type": "number", "description": "Transaction amount"},
+                            "amount": {"type": "string", "format": "decimal", "description": "Transaction amount"},
                             "phone_number": {"type": "string", "description": "Phone number if applicable"},
                             "email": {"type": "string", "description": "Email if applicable"},
                             "request_id": {"type": "string", "description": "Request ID"},
@@ -614,53 +946,67 @@ class DashboardStatsView(APIView):
     def get(self, request):
         user = request.user
         
-        # Get current date and first day of current month
-        today = datetime.now()
-        first_day_of_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
         try:
-            # Get real-time VTPass balance
-            vtpass_service = VTPassService()
-            vtpass_balance_response = vtpass_service.get_user_balance()
-            
-            # Extract balance from VTPass response
-            balance = 0.00
-            if isinstance(vtpass_balance_response, dict):
-                balance_data = vtpass_balance_response.get('data', {})
-                if isinstance(balance_data, dict):
-                    balance_str = balance_data.get('balance', '0.00')
-                    try:
-                        balance = float(balance_str)
-                    except (ValueError, TypeError):
-                        balance = 0.00
+            # The balance may need a VTPass call; read the database meanwhile
+            balance_future = _dashboard_executor.submit(platform_balance.get)
             
-            # Calculate this month's spending
-            this_month_transactions = VTPassTransaction.objects.filter(
-                user=user,
-                created_at__gte=first_day_of_month,
-                status='successful'  # This matches our model's status field values
-            )
-            this_month_spent = this_month_transactions.aggregate(Sum('amount'))['amount__sum'] or 0
-            
-            # Calculate total spending (all time)
-            all_transactions = VTPassTransaction.objects.filter(
-                user=user,
-                status='successful'  # This matches our model's status field values
-            )
-            total_spent = all_transactions.aggregate(Sum('amount'))['amount__sum'] or 0
+            # Spending this month and all time, from the user's rollups
+            this_month_spent, total_spent = spending_totals(user.pk)
             
             # Get recent transactions (last 5)
-            recent_transactions = VTPassTransaction.objects.filter(
-                user=user
-            ).order_by('-created_at')[:5]
+            recent_transactions = _recent_transactions(user)
             
             # Serialize transactions
-            transaction_serializer = VTPassTransactionSerializer(recent_transactions, many=True)
+            transaction_serializer = TransactionListSerializer(recent_transactions, many=True)
+            
+            balance_snapshot = balance_future.result()
+            balance = _extract_balance(balance_snapshot['response'])
             
             response_data = {
-                'balance': float(balance),  # Convert Decimal to float for JSON serialization
-                'this_month_spent': float(this_month_spent),  # Convert Decimal to float
-                'total_spent': float(total_spent),  # Convert Decimal to float
+                'balance': balance,
+                'balance_age': round(platform_balance.age(balance_snapshot), 1),
+                'this_month_spent': money(this_month_spent),
+                'total_spent': money(total_spent),
+                'recent_transactions': transaction_serializer.data
+            }
+            
+            return Response(response_data, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+@extend_schema(
+    tags=["Dashboard"],
+    description="Get financial statistics for the dashboard using the async ORM and VTPass client. "
+                "Returns the same response as /dashboard/stats/.",
+)
+class AsyncDashboardStatsView(AsyncAPIView):
+    """Async variant of DashboardStatsView for the ASGI deployment"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    async def get(self, request):
+        user = request.user
+        
+        try:
+            # The balance, the spending rollups and the recent transactions are independent
+            balance_snapshot, (this_month_spent, total_spent), recent_transactions = await asyncio.gather(
+                platform_balance.aget(),
+                aspending_totals(user.pk),
+                _alist(_recent_transactions(user)),
+            )
+            balance = _extract_balance(balance_snapshot['response'])
+            
+            transaction_serializer = TransactionListSerializer(recent_transactions, many=True)
+            
+            response_data = {
+                'balance': balance,
+                'balance_age': round(platform_balance.age(balance_snapshot), 1),
+                'this_month_spent': money(this_month_spent),
+                'total_spent': money(total_spent),
                 'recent_transactions': transaction_serializer.data
             }
             
@@ -676,6 +1022,7 @@ class DashboardStatsView(APIView):
 @extend_schema(
     tags=["Wallet"],
     description="Fund user wallet",
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
     request={
         "type": "object",
         "properties": {
@@ -699,12 +1046,12 @@ class DashboardStatsView(APIView):
                     "type": "object",
                     "properties": {
                         "id": {"type": "string", "description": "Transaction ID"},
-                        "amount": {"type": "number", "description": "Transaction amount"},
+                        "amount": {"type": "string", "format": "decimal", "description": "Transaction amount"},
                         "status": {"type": "string", "description": "Transaction status"},
                         "created_at": {"type": "string", "format": "date-time", "description": "Transaction timestamp"}
                     }
                 },
-                "updated_balance": {"type": "number", "description": "New wallet balance after funding"}
+                "updated_balance": {"type": "string", "format": "decimal", "description": "New wallet balance after funding"}
             }
         },
         400: {"description": "Bad request, invalid data"},
@@ -716,10 +1063,11 @@ class FundWalletView(APIView):
     """View for funding user wallet"""
     permission_classes = [permissions.IsAuthenticated]
     
+    @idempotent('fund-wallet')
     def post(self, request):
         amount = request.data.get('amount')
         payment_method = request.data.get('payment_method')
-        transaction_reference = request.data.get('transaction_reference', str(uuid.uuid4()))
+        transaction_reference = request.data.get('transaction_reference') or new_request_id()
         
         if not amount or not payment_method:
             return Response({
@@ -736,6 +1084,23 @@ class FundWalletView(APIView):
                 'message': 'Invalid amount format'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        # A reference that was already used is answered with its transaction, not credited twice
+        existing_transaction = VTPassTransaction.objects.filter(
+            request_id=transaction_reference, user=request.user, transaction_type='wallet_funding'
+        ).first()
+        if existing_transaction:
+            return Response({
+                'success': existing_transaction.status == 'successful',
+                'message': 'Transaction already exists',
+                'transaction': {
+                    'id': existing_transaction.id,
+                    'amount': money(existing_transaction.amount),
+                    'status': existing_transaction.status,
+                    'created_at': existing_transaction.created_at
+                },
+                'updated_balance': money(current_balance(request.user.pk))
+            }, status=status.HTTP_200_OK)
+        
         # For demo purposes:
         # - Bank transfer payments always succeed
         # - Other payment methods always fail
@@ -743,44 +1108,83 @@ class FundWalletView(APIView):
             transaction_status = 'successful'
             success = True
             message = 'Wallet funded successfully'
-            
-            # Update user's balance - properly handle Decimal types
-            user = request.user
-            user.vtpass_balance = Decimal(str(user.vtpass_balance)) + amount
-            user.save()
         else:
             transaction_status = 'failed'
             success = False
             message = 'Payment failed. Please try bank transfer instead.'
         
-        # Create transaction record
-        transaction = VTPassTransaction.objects.create(
-            user=request.user,
-            transaction_type='wallet_funding',
-            service_id='wallet',
-            amount=amount,
-            email=request.user.email,
-            request_id=transaction_reference,
-            status=transaction_status,
-            response_data={
-                'payment_method': payment_method,
-                'transaction_reference': transaction_reference
-            }
-        )
+        user = request.user
+        try:
+            # Record the transaction and credit the balance together, so a
+            # duplicate reference can't credit without a transaction row
+            with db_transaction.atomic():
+                transaction = VTPassTransaction.objects.create(
+                    user=user,
+                    transaction_type='wallet_funding',
+                    service_id='wallet',
+                    amount=amount,
+                    email=user.email,
+                    request_id=transaction_reference,
+                    status=transaction_status,
+                    response_data={
+                        'payment_method': payment_method,
+                        'transaction_reference': transaction_reference
+                    }
+                )
+                if success:
+                    credit(user.pk, amount, transaction.pk)
+                    add_successful([transaction])
+        except IntegrityError:
+            return Response({
+                'success': False,
+                'message': 'Transaction reference already used'
+            }, status=status.HTTP_409_CONFLICT)
         
         return Response({
             'success': success,
             'message': message,
             'transaction': {
-                'id': str(transaction.id),
-                'amount': float(transaction.amount),
+                'id': transaction.id,
+                'amount': money(transaction.amount),
                 'status': transaction.status,
-                'created_at': transaction.created_at.isoformat()
+                'created_at': transaction.created_at
             },
-            'updated_balance': float(user.vtpass_balance)
+            'updated_balance': money(current_balance(user.pk))
         }, status=status.HTTP_200_OK)
 
 
+@extend_schema(
+    tags=["Wallet"],
+    description="List the current user's wallet movements from the ledger, newest first. Each movement "
+                "of the available or held balance is one entry: funding, hold, release, capture, debit "
+                "or reversal.",
+    parameters=[
+        OpenApiParameter(
+            name="limit",
+            description="Number of entries to return (default 50, at most 200)",
+            required=False,
+            type=int,
+            location=OpenApiParameter.QUERY
+        )
+    ],
+    responses={200: LedgerEntrySerializer(many=True)}
+)
+class WalletHistoryView(generics.ListAPIView):
+    """View for listing a user's wallet ledger entries"""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = LedgerEntrySerializer
+    
+    def get_queryset(self):
+        try:
+            limit = min(max(int(self.request.query_params.get('limit', 50)), 1), 200)
+        except ValueError:
+            limit = 50
+        return (LedgerEntry.objects
+                .filter(user=self.request.user, account__in=('available', 'held'))
+                .select_related('transaction')
+                .order_by('-id')[:limit])
+
+
 @extend_schema(
     tags=["Wallet"],
     description="Check payment status",
@@ -791,7 +1195,8 @@ class FundWalletView(APIView):
             required=True,
             type=str,
             location=OpenApiParameter.PATH
-        )
+        ),
+        EXPAND_PARAMETER,
     ],
     responses={
         200: {
@@ -806,7 +1211,7 @@ class FundWalletView(APIView):
                         "id": {"type": "string", "description": "Transaction ID"},
                         "transaction_type": {"type": "string", "description": "Type of transaction"},
                         "service_id": {"type": "string", "description": "Service identifier"},
-                        "amount": {"type": "number", "description": "Transaction amount"},
+                        "amount": {"type": "string", "format": "decimal", "description": "Transaction amount"},
                         "phone_number": {"type": "string", "description": "Phone number if applicable"},
                         "email": {"type": "string", "description": "Email if applicable"},
                         "request_id": {"type": "string", "description": "Request ID"},
@@ -826,8 +1231,13 @@ class CheckPaymentStatusView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request, transaction_reference):
+        expand_response = _expand_response(request)
+        transactions = VTPassTransaction.objects.all()
+        if not expand_response:
+            # The raw VTPass response is the bulk of the row
+            transactions = transactions.defer('response_data')
         try:
-            transaction = VTPassTransaction.objects.get(
+            transaction = transactions.get(
                 request_id=transaction_reference,
                 user=request.user
             )
@@ -836,7 +1246,8 @@ class CheckPaymentStatusView(APIView):
                 'success': True,
                 'status': transaction.status,
                 'message': 'Transaction status retrieved successfully',
-                'transaction': VTPassTransactionSerializer(transaction).data
+                'transaction': VTPassTransactionSerializer(
+                    transaction, context={'expand_response': expand_response}).data
             })
         except VTPassTransaction.DoesNotExist:
             return Response({
@@ -846,6 +1257,52 @@ class CheckPaymentStatusView(APIView):
             }, status=status.HTTP_404_NOT_FOUND)
 
 
+@extend_schema(
+    tags=["VTPass"],
+    description="Receive a VTPass transaction-update callback. The raw body must be signed with "
+                "HMAC-SHA256 using the shared webhook secret, hex-encoded in the X-VTPass-Signature "
+                "header. Callbacks are stored and applied in batches; replays are acknowledged and ignored.",
+    request={
+        "type": "object",
+        "properties": {
+            "type": {"type": "string", "description": "Callback type, e.g. transaction-update"},
+            "data": {"type": "object", "description": "Transaction details as returned by requery"}
+        }
+    },
+    responses={
+        200: {"description": "Callback accepted"},
+        400: {"description": "Malformed callback body, or requestId missing or longer than 100 characters"},
+        403: {"description": "Missing or invalid signature"}
+    }
+)
+class VTPassWebhookView(APIView):
+    """View receiving VTPass transaction-update callbacks"""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    
+    def post(self, request):
+        # The signature covers the exact bytes VTPass sent, so check it before parsing
+        body = request.body
+        if not verify_signature(body, request.headers.get(SIGNATURE_HEADER)):
+            logger.warning("Rejected VTPass callback with missing or invalid signature")
+            return Response({"response": "invalid signature"}, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return Response({"response": "invalid body"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(payload, dict):
+            return Response({"response": "invalid body"}, status=status.HTTP_400_BAD_REQUEST)
+        if not valid_request_id(callback_details(payload)[0]):
+            logger.warning("Rejected VTPass callback with missing or invalid requestId")
+            return Response({"response": "invalid requestId"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        payload_logger.debug("VTPass callback: %s", redacted(payload))
+        record_callback(payload)
+        # VTPass stops resending once it gets this acknowledgement
+        return Response({"response": "success"})
+
+
 @extend_schema(
     tags=["Authentication"],
     description="Logout a user and blacklist their refresh token",
@@ -1,12 +1,87 @@
 import requests
+from requests.adapters import HTTPAdapter
 import uuid
+from decimal import Decimal
 from django.conf import settings
 import logging
 import json
-import time
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .resilience import resilience_keys, vtpass_resilience
+from .ids import new_request_id
+from .vtpass_logging import payload_logger, redacted
 
 logger = logging.getLogger(__name__)
 
+# Process-wide pooled transport shared by every VTPassService instance.
+# The session is rebuilt after a fork so workers never share sockets.
+_http_session = None
+_http_session_pid = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Return the pooled, keep-alive requests session used for VTPass calls.
+    One session is created per worker process and reused across requests,
+    so TCP and TLS handshakes are only paid when a pooled connection is opened.
+    """
+    global _http_session, _http_session_pid
+
+    pid = os.getpid()
+    if _http_session is not None and _http_session_pid == pid:
+        return _http_session
+
+    with _http_session_lock:
+        if _http_session is None or _http_session_pid != pid:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.VTPASS_POOL_CONNECTIONS,
+                pool_maxsize=settings.VTPASS_POOL_MAXSIZE,
+                max_retries=0,
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Connection': 'keep-alive'})
+            _http_session = session
+            _http_session_pid = pid
+    return _http_session
+
+
+def get_request_timeout():
+    """Return the (connect, read) timeout tuple for VTPass calls"""
+    return (settings.VTPASS_CONNECT_TIMEOUT, settings.VTPASS_READ_TIMEOUT)
+
+
+def prewarm_connections(count=None):
+    """
+    Open up to `count` pooled connections to VTPass ahead of the first request.
+    Failures are logged and ignored; the pool simply fills lazily instead.
+    """
+    count = count or settings.VTPASS_PREWARM_CONNECTIONS
+    if count <= 0:
+        return 0
+
+    session = get_http_session()
+    count = min(count, settings.VTPASS_POOL_MAXSIZE)
+
+    def _open_connection(_):
+        try:
+            session.head(settings.VTPASS_BASE_URL, timeout=get_request_timeout())
+            return True
+        except requests.RequestException as e:
+            logger.warning("VTPass connection prewarm failed: %s", e)
+            return False
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        opened = sum(executor.map(_open_connection, range(count)))
+
+    logger.info("Prewarmed %d of %d VTPass connections", opened, count)
+    return opened
+
+
 class VTPassService:
     """
     Service class to interact with the VTPass API.
@@ -17,6 +92,8 @@ class VTPassService:
         self.api_key = settings.VTPASS_API_KEY
         self.public_key = settings.VTPASS_PUBLIC_KEY
         self.secret_key = settings.VTPASS_SECRET_KEY
+        self.session = get_http_session()
+        self.timeout = get_request_timeout()
     
     def _get_headers(self, is_post=True):
         """Return the appropriate headers for VTPass API requests"""
@@ -33,13 +110,6 @@ class VTPassService:
         else:
             headers['public-key'] = self.public_key
             
-        # Add additional logging to debug header issues
-        logger.info(f"API Key: {self.api_key[:5]}...{self.api_key[-5:]}")
-        if is_post:
-            logger.info(f"Secret Key: {self.secret_key[:5]}...{self.secret_key[-5:]}")
-        else:
-            logger.info(f"Public Key: {self.public_key[:5]}...{self.public_key[-5:]}")
-            
         return headers
     
     def _make_get_request(self, endpoint, params=None):
@@ -47,175 +117,196 @@ class VTPassService:
         url = f"{self.base_url}/{endpoint}"
         headers = self._get_headers(is_post=False)
         
+        # Fail fast if this endpoint or service is tripped or saturated
+        permit, rejection = vtpass_resilience.acquire(
+            resilience_keys(endpoint, (params or {}).get('serviceID')))
+        if rejection:
+            return rejection
+        
+        failed = True
         try:
-            logger.info(f"Making GET request to VTPass API: {url}")
-            logger.info(f"Headers: {json.dumps(headers)}")
-            response = requests.get(url, headers=headers, params=params)
-            logger.info(f"VTPass API response status: {response.status_code}")
-            logger.info(f"VTPass API response: {response.text}")
-            
-            # Handle potential API errors
-            if response.status_code == 401:
-                return {
-                    "code": "error",
-                    "response_description": "Invalid VTPass API credentials. Please check your API keys.",
-                    "data": {}
-                }
-            elif response.status_code != 200:
-                return {
-                    "code": "error", 
-                    "response_description": f"VTPass API error: {response.status_code}", 
-                    "data": {}
-                }
-                
-            return response.json()
+            logger.info("VTPass GET %s params=%s", url, params)
+            response = self.session.get(url, headers=headers, params=params, timeout=self.timeout)
+            failed = response.status_code >= 500
+            return self._handle_get_response(response)
         except Exception as e:
-            logger.error(f"Error making GET request to VTPass API: {str(e)}")
+            logger.error("Error making GET request to VTPass API: %s", e)
             return {"code": "error", "response_description": str(e), "data": {}}
+        finally:
+            permit.release(failed)
+    
+    def _handle_get_response(self, response):
+        """Turn a raw GET response into the VTPass response dict"""
+        logger.info("VTPass API response status: %s", response.status_code)
+        
+        # Handle potential API errors
+        error_response = self._http_error_response(response.status_code)
+        if error_response:
+            return error_response
+            
+        response_data = response.json()
+        payload_logger.info("VTPass GET response: %s", redacted(response_data))
+        return response_data
     
-    def _make_post_request(self, endpoint, data, max_retries=0, current_retry=0):
+    def _http_error_response(self, status_code):
+        """Return an error response for non-200 HTTP statuses, or None"""
+        if status_code == 401:
+            return {
+                "code": "error",
+                "response_description": "Invalid VTPass API credentials. Please check your API keys.",
+                "data": {}
+            }
+        elif status_code != 200:
+            return {
+                "code": "error", 
+                "response_description": f"VTPass API error: {status_code}", 
+                "data": {}
+            }
+        return None
+    
+    def _log_post_request(self, url, data):
+        """Log the outgoing POST request; headers are never logged"""
+        logger.info("VTPass POST %s serviceID=%s request_id=%s",
+                    url, data.get('serviceID'), data.get('request_id'))
+        payload_logger.info("VTPass POST %s payload: %s", url, redacted(data))
+        
+        # JAMB purchases fail without a billersCode
+        if 'billersCode' not in data:
+            logger.debug("billersCode is not in the request data for %s", data.get('request_id'))
+    
+    def _make_post_request(self, endpoint, data):
         """
         Make a POST request to the VTPass API
         
         Args:
             endpoint: API endpoint to call
             data: Request data
-            max_retries: Maximum number of retries for error code 016 (default 0)
-            current_retry: Current retry attempt (used internally)
+        
+        Failed calls are never retried inline; code 016 retries are run in
+        the background by users.retries so no worker thread sleeps here.
         """
         url = f"{self.base_url}/{endpoint}"
         headers = self._get_headers(is_post=True)
         
+        # Fail fast if this endpoint or service is tripped or saturated
+        permit, rejection = vtpass_resilience.acquire(resilience_keys(endpoint, data.get('serviceID')))
+        if rejection:
+            return rejection
+        
+        failed, service_only = True, False
         try:
-            # Very detailed debug logging
-            print("=== VTPASS API REQUEST ===")
-            print(f"URL: {url}")
-            print(f"Headers: {headers}")
-            print(f"Data: {data}")
-            
-            # Check specifically for billersCode
-            if 'billersCode' in data:
-                print(f"billersCode is included: {data['billersCode']}")
-            else:
-                print("billersCode is NOT in the request data!")
-                
-            # Check for other formats
-            if 'billerscode' in data:
-                print(f"billerscode (lowercase) is included: {data['billerscode']}")
-            if 'billers_code' in data:
-                print(f"billers_code (snake_case) is included: {data['billers_code']}")
-                
-            logger.info(f"Making POST request to VTPass API: {url}")
-            logger.info(f"Headers: {json.dumps(headers)}")
-            logger.info(f"Data: {json.dumps(data)}")
-            response = requests.post(url, headers=headers, json=data)
-            logger.info(f"VTPass API response status: {response.status_code}")
-            logger.info(f"VTPass API response: {response.text}")
-            
-            # Handle potential API errors
-            if response.status_code == 401:
-                return {
-                    "code": "error",
-                    "response_description": "Invalid VTPass API credentials. Please check your API keys.",
-                    "data": {}
-                }
-            elif response.status_code != 200:
-                return {
-                    "code": "error", 
-                    "response_description": f"VTPass API error: {response.status_code}", 
-                    "data": {}
-                }
-                
-            # Try to parse the JSON response
-            response_data = response.json()
-            
-            # Enhanced handling for specific VTPass error codes
-            if response_data.get('code') == '016':
-                logger.warning(f"VTPass transaction failed with code 016: {response_data}")
-                # Code 016 is a transaction failure which can happen for various reasons:
-                # - Network connectivity issues with the telco
-                # - Invalid recipient number
-                # - Service temporarily unavailable
-                # - Transaction limits reached
-                
-                # If automatic retry is enabled and we haven't exceeded max retries
-                if max_retries > 0 and current_retry < max_retries:
-                    logger.info(f"Automatic retry attempt {current_retry + 1} of {max_retries} for error code 016")
-                    
-                    # Generate a new request_id to avoid duplicate transaction errors
-                    if 'request_id' in data:
-                        data['request_id'] = f"{data['request_id']}-retry-{current_retry + 1}"
-                    
-                    # Wait a short time before retrying (exponential backoff)
-                    time.sleep(2 ** current_retry)  # 1s, 2s, 4s, 8s for retries 0-3
-                    
-                    # Retry the request
-                    return self._make_post_request(endpoint, data, max_retries, current_retry + 1)
-                
-                # Add more context to the error for frontend handling
-                response_data['vtpass_error_code'] = '016'
-                response_data['error_type'] = 'TRANSACTION_FAILED'
-                response_data['possible_causes'] = [
-                    'Network connectivity issues with the mobile operator',
-                    'Invalid recipient number',
-                    'Service temporarily unavailable',
-                    'Transaction limits reached'
-                ]
-                response_data['retry_recommended'] = True
-            elif response_data.get('code') == '014':
-                logger.warning(f"VTPass API returned insufficient funds error: {response_data}")
-                # Code 014 is often used for insufficient funds
-                response_data['vtpass_error_code'] = '014'
-                response_data['error_type'] = 'INSUFFICIENT_FUNDS'
-                response_data['retry_recommended'] = False
-            elif response_data.get('code') == '009':
-                logger.warning(f"VTPass API returned duplicate request error: {response_data}")
-                # Code 009 is often used for duplicate requests
-                response_data['vtpass_error_code'] = '009'
-                response_data['error_type'] = 'DUPLICATE_REQUEST'
-                response_data['retry_recommended'] = True  # Can retry with a new request_id
-            
-            return response_data
+            self._log_post_request(url, data)
+            response = self.session.post(url, headers=headers, json=data, timeout=self.timeout)
+            response_data = self._handle_post_response(response)
+            failed, service_only = self._is_upstream_failure(response.status_code, response_data)
+            return self._annotate_post_response(response_data)
         except json.JSONDecodeError as e:
-            logger.error(f"Error decoding JSON response from VTPass API: {str(e)}, Response: {response.text}")
+            logger.error("Error decoding JSON response from VTPass API: %s, Response: %.500s", e, response.text)
             return {
                 "code": "error", 
                 "response_description": "Invalid JSON response from VTPass API", 
                 "raw_response": response.text
             }
         except Exception as e:
-            logger.error(f"Error making POST request to VTPass API: {str(e)}")
+            logger.error("Error making POST request to VTPass API: %s", e)
             return {"code": "error", "response_description": str(e), "data": {}}
+        finally:
+            permit.release(failed, service_only=service_only)
+    
+    def _is_upstream_failure(self, status_code, response_data):
+        """
+        Classify a POST outcome for the circuit breakers as (failed, service_only).
+        Code 016 means the telco behind a serviceID failed, not VTPass itself.
+        """
+        if status_code >= 500:
+            return True, False
+        if response_data.get('code') == '016':
+            return True, True
+        return False, False
+    
+    def _handle_post_response(self, response):
+        """Turn a raw POST response into the VTPass response dict"""
+        logger.info("VTPass API response status: %s", response.status_code)
+        
+        # Handle potential API errors
+        error_response = self._http_error_response(response.status_code)
+        if error_response:
+            return error_response
+            
+        # Try to parse the JSON response
+        response_data = response.json()
+        payload_logger.info("VTPass POST response: %s", redacted(response_data))
+        return response_data
+    
+    def _annotate_post_response(self, response_data):
+        """Add context for specific VTPass error codes for frontend handling"""
+        # Enhanced handling for specific VTPass error codes
+        if response_data.get('code') == '016':
+            logger.warning("VTPass transaction failed with code 016: request_id=%s", response_data.get('requestId'))
+            payload_logger.warning("VTPass code 016 response: %s", redacted(response_data))
+            # Code 016 is a transaction failure which can happen for various reasons:
+            # - Network connectivity issues with the telco
+            # - Invalid recipient number
+            # - Service temporarily unavailable
+            # - Transaction limits reached
+            
+            # Add more context to the error for frontend handling
+            response_data['vtpass_error_code'] = '016'
+            response_data['error_type'] = 'TRANSACTION_FAILED'
+            response_data['possible_causes'] = [
+                'Network connectivity issues with the mobile operator',
+                'Invalid recipient number',
+                'Service temporarily unavailable',
+                'Transaction limits reached'
+            ]
+            response_data['retry_recommended'] = True
+        elif response_data.get('code') == '014':
+            logger.warning("VTPass API returned insufficient funds error: request_id=%s", response_data.get('requestId'))
+            payload_logger.warning("VTPass code 014 response: %s", redacted(response_data))
+            # Code 014 is often used for insufficient funds
+            response_data['vtpass_error_code'] = '014'
+            response_data['error_type'] = 'INSUFFICIENT_FUNDS'
+            response_data['retry_recommended'] = False
+        elif response_data.get('code') == '009':
+            logger.warning("VTPass API returned duplicate request error: request_id=%s", response_data.get('requestId'))
+            payload_logger.warning("VTPass code 009 response: %s", redacted(response_data))
+            # Code 009 is often used for duplicate requests
+            response_data['vtpass_error_code'] = '009'
+            response_data['error_type'] = 'DUPLICATE_REQUEST'
+            response_data['retry_recommended'] = True  # Can retry with a new request_id
+        
+        return response_data
     
     def get_user_balance(self):
         """Get the current balance for the VTPass account"""
         try:
             # First try the real API
-            response = self._make_get_request('balance')
-            if response.get("code") == "error":
-                # If real API fails, return a mock balance for testing
-                return {
-                    "code": "success",
-                    "response_description": "Mock balance retrieved successfully",
-                    "data": {
-                        "balance": "1000.00"
-                    }
-                }
-            return response
+            return self._balance_or_mock(self._make_get_request('balance'))
         except Exception as e:
-            logger.error(f"Error getting VTPass balance: {str(e)}")
+            logger.error("Error getting VTPass balance: %s", e)
             # Return a mock balance for testing
-            return {
-                "code": "success",
-                "response_description": "Mock balance retrieved successfully",
-                "data": {
-                    "balance": "1000.00"
-                }
+            return self._mock_balance()
+    
+    def _balance_or_mock(self, response):
+        """Fall back to a mock balance when the real API fails"""
+        if response.get("code") == "error":
+            return self._mock_balance()
+        return response
+    
+    def _mock_balance(self):
+        """Return a mock balance for testing"""
+        return {
+            "code": "success",
+            "response_description": "Mock balance retrieved successfully",
+            "data": {
+                "balance": "1000.00"
             }
+        }
     
     def verify_service_available(self, service_id):
-        """Verify if a particular service is available"""
-        return self._make_get_request('service-variations', params={'serviceID': service_id})
+        """Verify if a particular service is available, using the cached service catalog"""
+        from .catalog import service_catalog
+        return service_catalog.get_variations(service_id)['data']
     
     def purchase_service(self, service_id, variation_code, amount, phone, email, request_id=None, auto_retry=False, **additional_params):
         """
@@ -228,14 +319,25 @@ class VTPassService:
             phone: The recipient's phone number
             email: The email address to receive receipt
             request_id: A unique request ID (generated if not provided)
-            auto_retry: Whether to automatically retry on error code 016 (default False)
+            auto_retry: Kept for compatibility; code 016 retries are scheduled
+                by the caller through users.retries instead of run inline
             **additional_params: Additional parameters like billersCode for specific services
         
         Returns:
             API response from VTPass
         """
+        data = self.build_purchase_data(service_id, variation_code, amount, phone, email,
+                                        request_id, **additional_params)
+        return self.send_purchase(data)
+    
+    def send_purchase(self, data):
+        """Send a payload built by build_purchase_data to the VTPass `pay` endpoint"""
+        return self._make_post_request('pay', data)
+    
+    def build_purchase_data(self, service_id, variation_code, amount, phone, email, request_id=None, **additional_params):
+        """Build the payload for a VTPass `pay` request"""
         if request_id is None:
-            request_id = str(uuid.uuid4())
+            request_id = new_request_id()
             
         data = {
             'serviceID': service_id,
@@ -262,20 +364,14 @@ class VTPassService:
                 data['billersCode'] = billers_code  # Exact format from docs
                 
                 # Log special handling for JAMB
-                print(f"Special handling for JAMB: Added billersCode={billers_code}")
+                logger.debug("Special handling for JAMB: added billersCode for %s", request_id)
         
         # Add any additional parameters needed for specific services (like billersCode for JAMB)
         for key, value in additional_params.items():
             if value:  # Only add non-empty values
                 data[key] = value
                 
-        # Log all parameters being sent to VTPass
-        logger.info(f"Sending to VTPass: {json.dumps(data)}")
-            
-        # Number of automatic retries to perform for error code 016
-        max_retries = 2 if auto_retry else 0
-            
-        return self._make_post_request('pay', data, max_retries=max_retries)
+        return data
     
     def verify_transaction(self, request_id):
         """Verify the status of a transaction using its request ID"""
@@ -293,23 +389,25 @@ class VTPassService:
         """
         try:
             # First try the real API
-            response = self._make_get_request(service_type)
-            if response.get("code") == "error":
-                # If real API fails, return mock services for testing
-                return {
-                    "code": "success",
-                    "response_description": f"Mock {service_type} services retrieved successfully",
-                    "content": self._get_mock_services(service_type)
-                }
-            return response
+            return self._services_or_mock(service_type, self._make_get_request(service_type))
         except Exception as e:
-            logger.error(f"Error getting {service_type} services: {str(e)}")
+            logger.error("Error getting %s services: %s", service_type, e)
             # Return mock services for testing
-            return {
-                "code": "success",
-                "response_description": f"Mock {service_type} services retrieved successfully",
-                "content": self._get_mock_services(service_type)
-            }
+            return self._mock_services_response(service_type)
+    
+    def _services_or_mock(self, service_type, response):
+        """Fall back to mock services when the real API fails"""
+        if response.get("code") == "error":
+            return self._mock_services_response(service_type)
+        return response
+    
+    def _mock_services_response(self, service_type):
+        """Wrap mock services in a VTPass-style response"""
+        return {
+            "code": "success",
+            "response_description": f"Mock {service_type} services retrieved successfully",
+            "content": self._get_mock_services(service_type)
+        }
     
     def _get_mock_services(self, service_type):
         """Return mock services for testing"""
@@ -356,8 +454,12 @@ class VTPassService:
         
         # Update the user with the mock VTPass account details
         user.vtpass_account_id = vtpass_account_id
-        user.vtpass_balance = 1000.00  # Start with initial balance
-        user.save()
+        user.save(update_fields=['vtpass_account_id'])
+        
+        # Start with initial balance, recorded in the ledger as an opening entry
+        from .wallet import credit
+        credit(user.pk, Decimal('1000.00'), entry_type='opening')
+        user.wallet.refresh_from_db(fields=['balance'])
         
         return {
             "code": "success",
@@ -0,0 +1,143 @@
+import asyncio
+import httpx
+from django.conf import settings
+import logging
+import json
+
+from .resilience import resilience_keys, vtpass_resilience
+from .vtpass import VTPassService
+
+logger = logging.getLogger(__name__)
+
+# One pooled AsyncClient per event loop. Under uvicorn each worker runs a
+# single loop, so this is effectively one keep-alive pool per worker.
+_async_clients = {}
+
+
+def get_async_http_client():
+    """Return the pooled httpx.AsyncClient bound to the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        # Drop clients whose loops have gone away
+        for stale_loop in [l for l in _async_clients if l.is_closed()]:
+            _async_clients.pop(stale_loop, None)
+
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.VTPASS_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.VTPASS_POOL_MAXSIZE,
+            ),
+            timeout=httpx.Timeout(
+                settings.VTPASS_READ_TIMEOUT,
+                connect=settings.VTPASS_CONNECT_TIMEOUT,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+class AsyncVTPassService(VTPassService):
+    """
+    asyncio-native variant of VTPassService.
+    Exposes the same methods as coroutines so async views can hold many
+    in-flight VTPass calls without tying up a thread each.
+    """
+    def __init__(self):
+        super().__init__()
+        self.client = get_async_http_client()
+
+    async def _make_get_request(self, endpoint, params=None):
+        """Make a GET request to the VTPass API"""
+        url = f"{self.base_url}/{endpoint}"
+        headers = self._get_headers(is_post=False)
+
+        permit, rejection = vtpass_resilience.acquire(
+            resilience_keys(endpoint, (params or {}).get('serviceID')))
+        if rejection:
+            return rejection
+
+        failed = True
+        try:
+            logger.info("VTPass GET %s params=%s", url, params)
+            response = await self.client.get(url, headers=headers, params=params)
+            failed = response.status_code >= 500
+            return self._handle_get_response(response)
+        except Exception as e:
+            logger.error("Error making GET request to VTPass API: %s", e)
+            return {"code": "error", "response_description": str(e), "data": {}}
+        finally:
+            permit.release(failed)
+
+    async def _make_post_request(self, endpoint, data):
+        """
+        Make a POST request to the VTPass API
+
+        Args:
+            endpoint: API endpoint to call
+            data: Request data
+        """
+        url = f"{self.base_url}/{endpoint}"
+        headers = self._get_headers(is_post=True)
+
+        permit, rejection = vtpass_resilience.acquire(resilience_keys(endpoint, data.get('serviceID')))
+        if rejection:
+            return rejection
+
+        failed, service_only = True, False
+        try:
+            self._log_post_request(url, data)
+            response = await self.client.post(url, headers=headers, json=data)
+            response_data = self._handle_post_response(response)
+            failed, service_only = self._is_upstream_failure(response.status_code, response_data)
+            return self._annotate_post_response(response_data)
+        except json.JSONDecodeError as e:
+            logger.error("Error decoding JSON response from VTPass API: %s, Response: %.500s", e, response.text)
+            return {
+                "code": "error",
+                "response_description": "Invalid JSON response from VTPass API",
+                "raw_response": response.text
+            }
+        except Exception as e:
+            logger.error("Error making POST request to VTPass API: %s", e)
+            return {"code": "error", "response_description": str(e), "data": {}}
+        finally:
+            permit.release(failed, service_only=service_only)
+
+    async def get_user_balance(self):
+        """Get the current balance for the VTPass account"""
+        try:
+            return self._balance_or_mock(await self._make_get_request('balance'))
+        except Exception as e:
+            logger.error("Error getting VTPass balance: %s", e)
+            return self._mock_balance()
+
+    async def verify_service_available(self, service_id):
+        """Verify if a particular service is available"""
+        return await self._make_get_request('service-variations', params={'serviceID': service_id})
+
+    async def purchase_service(self, service_id, variation_code, amount, phone, email, request_id=None, auto_retry=False, **additional_params):
+        """
+        Purchase a service through VTPass API
+
+        Takes the same arguments as VTPassService.purchase_service.
+        """
+        data = self.build_purchase_data(service_id, variation_code, amount, phone, email,
+                                        request_id, **additional_params)
+        return await self.send_purchase(data)
+
+    async def send_purchase(self, data):
+        """Send a payload built by build_purchase_data to the VTPass `pay` endpoint"""
+        return await self._make_post_request('pay', data)
+
+    async def verify_transaction(self, request_id):
+        """Verify the status of a transaction using its request ID"""
+        return await self._make_get_request('requery', params={'request_id': request_id})
+
+    async def get_services(self, service_type):
+        """Get all available services by type"""
+        try:
+            return self._services_or_mock(service_type, await self._make_get_request(service_type))
+        except Exception as e:
+            logger.error("Error getting %s services: %s", service_type, e)
+            return self._mock_services_response(service_type)
@@ -0,0 +1,133 @@
+"""
+Logging pipeline for the VTPass integration.
+
+- QueuedStreamHandler hands records to a background thread, so formatting
+  and stream I/O happen off the request thread.
+- redacted() wraps a payload so it is only serialized, with keys and PINs
+  masked, if and when the record is actually formatted.
+- PayloadSampler keeps a per-level share of records on the payload logger,
+  so full request/response bodies are logged for a sample of calls only.
+
+Log the call itself on the module logger and the body on `payload_logger`:
+    logger.info("VTPass POST %s request_id=%s", url, data.get('request_id'))
+    payload_logger.info("VTPass POST %s payload: %s", url, redacted(data))
+"""
+from logging.handlers import QueueHandler, QueueListener
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+
+payload_logger = logging.getLogger('users.vtpass.payloads')
+
+# Keys whose values never reach the logs (matched case-insensitively)
+REDACTED_FIELDS = {
+    'api-key', 'secret-key', 'public-key', 'api_key', 'secret_key', 'public_key',
+    'authorization', 'pin', 'pin_confirm', 'password', 'password_confirm', 'bvn',
+}
+REDACTED_VALUE = '[REDACTED]'
+
+
+def redact(value):
+    """Return a copy of `value` with sensitive fields masked"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED_VALUE if str(key).lower() in REDACTED_FIELDS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class RedactedPayload:
+    """Defers redaction and JSON serialization until the record is formatted"""
+    __slots__ = ('payload',)
+
+    def __init__(self, payload):
+        # Shallow copy so later changes by the caller (e.g. error annotations)
+        # can't race the background formatter
+        self.payload = dict(payload) if isinstance(payload, dict) else payload
+
+    def __str__(self):
+        try:
+            return json.dumps(redact(self.payload), default=str)
+        except (TypeError, ValueError):
+            return str(redact(self.payload))
+
+
+def redacted(payload):
+    """Wrap a request/response body for lazy, redacted logging"""
+    return RedactedPayload(payload)
+
+
+class PayloadSampler(logging.Filter):
+    """
+    Keep a share of records per level, e.g. {'DEBUG': 0.01, 'INFO': 0.05}.
+    Levels not listed are always kept.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = {
+            logging.getLevelName(level.upper()) if isinstance(level, str) else level: float(rate)
+            for level, rate in (rates or {}).items()
+        }
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        return rate is None or rate >= 1 or random.random() < rate
+
+
+class QueuedStreamHandler(QueueHandler):
+    """
+    Stream handler whose formatting and writes run on a background thread.
+
+    Records are queued unformatted (the queue is in-process, so nothing has
+    to be pickled) and dropped with a count, rather than blocking the
+    request, if the queue is full.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        # Threads don't survive a fork, so start the listener per worker process
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+        self.target.close()
+        super().close()
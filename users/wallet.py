@@ -0,0 +1,191 @@
+"""
+Wallet balance changes for purchases, as two-phase holds.
+
+A purchase first places a hold: one conditional UPDATE that raises the
+wallet's `held_balance` only while the spendable balance (balance minus held)
+covers the amount, so concurrent purchases can't overdraw the wallet. No row
+lock is held while VTPass is called. Once VTPass answers, the hold is
+captured (balance and held both go down) or released (held goes down).
+
+Capture and release first clear the transaction's `held_amount` with a
+conditional UPDATE, so each hold is settled exactly once however many
+workers finalize the same transaction. Purchases made before holds existed
+are debited only by the worker that moves them out of pending. Every write touches only the
+narrow Wallet row, never the User row, and appends the matching movement
+to the ledger (users.ledger) in the same database transaction. Captures,
+debits and reversals also update the user's spending rollups
+(users.rollups) there.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+import logging
+
+from .ledger import movement, record
+from .rollups import add_successful, remove_successful
+
+logger = logging.getLogger(__name__)
+
+
+def _decimal(amount):
+    return Decimal(str(amount))
+
+
+def create_wallet(sender, instance, created, **kwargs):
+    """post_save receiver for User: every user gets an empty wallet"""
+    from .models import Wallet
+
+    if created and not kwargs.get('raw'):
+        Wallet.objects.create(user=instance)
+
+
+def spendable_balance(wallet):
+    """Balance not reserved by holds"""
+    return _decimal(wallet.balance) - _decimal(wallet.held_balance)
+
+
+def current_balance(user_id):
+    """A user's wallet balance, read without loading the user"""
+    from .models import Wallet
+
+    return Wallet.objects.values_list('balance', flat=True).get(user_id=user_id)
+
+
+def place_hold(transaction):
+    """
+    Reserve the transaction's amount in its user's wallet.
+    Returns False, changing nothing, when the spendable balance is too low.
+    Call before the transaction is saved, inside the atomic block that saves it.
+    """
+    from .models import Wallet
+
+    amount = _decimal(transaction.amount)
+    with db_transaction.atomic():
+        reserved = Wallet.objects.filter(
+            user_id=transaction.user_id,
+            balance__gte=F('held_balance') + amount,
+        ).update(held_balance=F('held_balance') + amount)
+        if not reserved:
+            return False
+        transaction.held_amount = amount
+        # Foreign keys are checked at commit, so the transaction row may follow in the same block
+        record(movement('hold', transaction.user_id, amount, transaction.pk))
+    return True
+
+
+def _clear_hold(transaction):
+    """Detach the hold from the transaction; returns the held amount, or None if already settled"""
+    from .models import VTPassTransaction
+
+    held = transaction.held_amount
+    if held is None:
+        return None
+    cleared = VTPassTransaction.objects.filter(pk=transaction.pk, held_amount__isnull=False).update(held_amount=None)
+    transaction.held_amount = None
+    return _decimal(held) if cleared else None
+
+
+def capture_hold(transaction):
+    """Debit a successful purchase, settling its hold if it has one"""
+    from .models import VTPassTransaction, Wallet
+
+    amount = _decimal(transaction.amount)
+    with db_transaction.atomic():
+        if transaction.held_amount is None:
+            # Purchases made before holds existed are debited directly, once: only the
+            # worker that moves the row out of pending debits it
+            finalized = VTPassTransaction.objects.filter(pk=transaction.pk, status='pending').update(
+                status='successful', updated_at=timezone.now())
+            if not finalized:
+                logger.info("Transaction %s was already finalized", transaction.pk)
+                return False
+            Wallet.objects.filter(user_id=transaction.user_id).update(balance=F('balance') - amount)
+            record(movement('debit', transaction.user_id, amount, transaction.pk))
+            add_successful([transaction])
+            return True
+        held = _clear_hold(transaction)
+        if held is None:
+            logger.info("Hold for transaction %s was already settled", transaction.pk)
+            return False
+        Wallet.objects.filter(user_id=transaction.user_id).update(
+            balance=F('balance') - amount,
+            held_balance=F('held_balance') - held,
+        )
+        record(movement('capture', transaction.user_id, amount, transaction.pk))
+        add_successful([transaction])
+    return True
+
+
+def release_hold(transaction):
+    """Return a failed purchase's hold to the spendable balance"""
+    from .models import Wallet
+
+    with db_transaction.atomic():
+        held = _clear_hold(transaction)
+        if held is None:
+            return False
+        Wallet.objects.filter(user_id=transaction.user_id).update(held_balance=F('held_balance') - held)
+        record(movement('release', transaction.user_id, held, transaction.pk))
+    return True
+
+
+def settle_finalized(finalized):
+    """
+    Settle the wallets of transactions finalized in bulk, given as
+    (transaction, successful, held) with `held` the hold cleared from each
+    (None if it had none). One UPDATE per user and one ledger INSERT.
+    Call inside the atomic block that finalizes the transactions.
+    """
+    from .models import Wallet
+
+    debits = defaultdict(Decimal)
+    released = defaultdict(Decimal)
+    entries = []
+    spent = []
+    for transaction, successful, held in finalized:
+        amount = _decimal(transaction.amount)
+        if successful:
+            debits[transaction.user_id] += amount
+            spent.append(transaction)
+            entries += movement('capture' if held is not None else 'debit', transaction.user_id, amount,
+                                transaction.pk)
+        elif held is not None:
+            entries += movement('release', transaction.user_id, held, transaction.pk)
+        if held is not None:
+            released[transaction.user_id] += held
+
+    for user_id in debits.keys() | released.keys():
+        Wallet.objects.filter(user_id=user_id).update(
+            balance=F('balance') - debits[user_id],
+            held_balance=F('held_balance') - released[user_id],
+        )
+    record(entries)
+    add_successful(spent)
+
+
+def reverse_purchase(transaction):
+    """Refund a successful purchase that VTPass reversed. Returns False if it wasn't successful"""
+    from .models import VTPassTransaction, Wallet
+
+    amount = _decimal(transaction.amount)
+    with db_transaction.atomic():
+        reversed_ = VTPassTransaction.objects.filter(pk=transaction.pk, status='successful').update(
+            status='reversed', updated_at=timezone.now())
+        if not reversed_:
+            return False
+        Wallet.objects.filter(user_id=transaction.user_id).update(balance=F('balance') + amount)
+        record(movement('reversal', transaction.user_id, amount, transaction.pk))
+        remove_successful([transaction])
+    transaction.status = 'reversed'
+    return True
+
+
+def credit(user_id, amount, transaction_id=None, entry_type='funding'):
+    """Add funds to a wallet"""
+    from .models import Wallet
+
+    with db_transaction.atomic():
+        Wallet.objects.filter(user_id=user_id).update(balance=F('balance') + _decimal(amount))
+        record(movement(entry_type, user_id, amount, transaction_id))
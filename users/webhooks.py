@@ -0,0 +1,168 @@
+"""
+Ingestion of VTPass transaction-update callbacks.
+
+The webhook view verifies the HMAC signature, stores the callback (unique
+per request_id and status, so replays are no-ops) and makes sure a
+`vtpass.apply_callbacks` task is queued, then acknowledges. The queued task
+is locked while the callback is stored, so a worker can't claim it and miss a
+callback that hasn't committed yet. The task applies
+stored callbacks to their transactions in batches through the same bulk
+path as the reconciler, and refunds successful purchases reported as
+reversed. A batch claims and applies its callbacks in one database
+transaction, so a batch that fails or whose worker dies leaves them
+unclaimed for the next one.
+"""
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction as db_transaction
+from django.utils import timezone
+import hashlib
+import hmac
+import logging
+import uuid
+
+from .purchases import delivery_status, vtpass_request_id
+from .reconcile import apply_results
+from .tasks import enqueue
+from .transaction_events import mark_changed
+from .wallet import reverse_purchase
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-VTPass-Signature'
+
+
+def sign_payload(body, secret):
+    """Hex HMAC-SHA256 of a raw callback body"""
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, signature):
+    """Check a callback body against its signature header"""
+    secret = settings.VTPASS_WEBHOOK_SECRET
+    if not secret or not signature:
+        return False
+    if signature.startswith('sha256='):
+        signature = signature[len('sha256='):]
+    return hmac.compare_digest(sign_payload(body, secret), signature)
+
+
+def callback_details(payload):
+    """(request_id, status, response) from a VTPass callback body"""
+    response = payload.get('data') if isinstance(payload.get('data'), dict) else payload
+    request_id = response.get('requestId') or response.get('request_id')
+    status = delivery_status(response) or str(response.get('code') or '')
+    return request_id, status, response
+
+
+def valid_request_id(request_id):
+    """Whether a callback's request_id can be stored (VTPassCallback.request_id is 100 characters)"""
+    return isinstance(request_id, str) and 0 < len(request_id) <= 100
+
+
+def record_callback(payload):
+    """
+    Store a callback and queue a batch to apply it.
+    Returns False when the same update was already received.
+    """
+    from .models import BackgroundTask, VTPassCallback
+
+    request_id, status, response = callback_details(payload)
+    try:
+        with db_transaction.atomic():
+            VTPassCallback.objects.create(request_id=request_id, status=status[:20], payload=response)
+            # One queued batch picks up every callback received meanwhile. Locking it keeps workers
+            # (which skip locked tasks) from claiming it until this callback commits; a task claimed
+            # while we waited no longer matches, and a new one is queued.
+            queued = BackgroundTask.objects.select_for_update().filter(
+                name='vtpass.apply_callbacks', status='queued')
+            if not queued.values_list('pk', flat=True)[:1]:
+                enqueue('vtpass.apply_callbacks', {}, delay=settings.VTPASS_WEBHOOK_BATCH_DELAY)
+    except IntegrityError:
+        logger.info("Duplicate VTPass callback for %s (%s) ignored", request_id, status)
+        return False
+    return True
+
+
+def claim_callbacks(batch_size):
+    """
+    Claim up to `batch_size` unprocessed callbacks for this batch.
+    Call inside the atomic block that applies them, so a failed batch is
+    rolled back and its callbacks are claimed again by the next one.
+    """
+    from .models import VTPassCallback
+
+    batch_id = uuid.uuid4()
+    unprocessed = VTPassCallback.objects.filter(processed_at__isnull=True).order_by('received_at')
+    if connection.features.has_select_for_update_skip_locked:
+        unprocessed = unprocessed.select_for_update(skip_locked=True)
+    pending = list(unprocessed.values_list('pk', flat=True)[:batch_size])
+    # Without row locks, a batch that committed meanwhile has set processed_at on the rows it took
+    VTPassCallback.objects.filter(pk__in=pending, processed_at__isnull=True).update(batch_id=batch_id)
+    return list(VTPassCallback.objects.filter(batch_id=batch_id).order_by('received_at'))
+
+
+def apply_callback_batch(batch_size=None):
+    """Apply one batch of callbacks. Returns (claimed, successful, failed)"""
+    with db_transaction.atomic():
+        callbacks = claim_callbacks(batch_size or settings.VTPASS_WEBHOOK_BATCH_SIZE)
+        if not callbacks:
+            return 0, 0, 0
+        successful, failed = _apply_callbacks(callbacks)
+    logger.info("Applied %d VTPass callbacks: %d successful, %d failed", len(callbacks), successful, failed)
+    return len(callbacks), successful, failed
+
+
+def _apply_callbacks(callbacks):
+    """Apply claimed callbacks to their transactions and mark them processed. Returns (successful, failed)"""
+    from .models import VTPassCallback, VTPassTransaction
+
+    request_ids = {callback.request_id for callback in callbacks}
+    # VTPass knows a purchase by the request_id of its latest pay attempt
+    transactions = {
+        vtpass_request_id(transaction): transaction
+        for transaction in VTPassTransaction.objects.filter(
+            status='pending', next_retry_at__isnull=True, attempts__request_id__in=request_ids
+        ).distinct().prefetch_related('attempts')
+    }
+
+    responses = {}
+    matched = []
+    for callback in callbacks:
+        transaction = transactions.get(callback.request_id)
+        if transaction is None:
+            continue
+        if transaction.pk not in responses:
+            matched.append(transaction)
+        responses[transaction.pk] = callback.payload
+
+    successful, failed = apply_results(matched, responses)
+    reverse_refunded(callbacks)
+    VTPassCallback.objects.filter(pk__in=[callback.pk for callback in callbacks]).update(
+        processed_at=timezone.now())
+    return successful, failed
+
+
+def reverse_refunded(callbacks):
+    """Refund successful purchases that a callback reports as reversed"""
+    from .models import VTPassTransaction
+
+    request_ids = {callback.request_id for callback in callbacks if callback.status == 'reversed'}
+    if not request_ids:
+        return 0
+    refunded = [
+        transaction for transaction in VTPassTransaction.objects.filter(
+            status='successful', attempts__request_id__in=request_ids
+        ).distinct().prefetch_related('attempts')
+        if vtpass_request_id(transaction) in request_ids and reverse_purchase(transaction)
+    ]
+    # .update() sends no post_save, so wake status streams here
+    mark_changed(transaction.user_id for transaction in refunded)
+    for transaction in refunded:
+        logger.info("Refunded reversed transaction %s", transaction.request_id)
+    return len(refunded)
+
+
+def apply_callbacks_task(task):
+    """Task handler: apply stored callbacks until none are left"""
+    while apply_callback_batch()[0]:
+        pass